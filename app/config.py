@@ -1,6 +1,11 @@
-from pydantic import BaseSettings
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from pydantic import BaseSettings, Field
 from typing_extensions import Literal
 
+from app.ver import __version__
+
 REGIONS = Literal["dev", "qa", "stg", "prod"]
 
 AWX_URLS = {
@@ -73,3 +78,107 @@ class Settings(BaseSettings):
     app_version: str
     docs_url: str
     openapi_tags = tags_metadata
+
+    # AWX REST client, profile 별로 하나씩 생성되어 공유된다.
+    awx_pool_maxsize: int = 10
+    awx_async_max_connections: int = 100
+    awx_connect_timeout: float = 3.05
+    awx_read_timeout: float = 30
+    awx_max_retries: int = 3
+    awx_backoff_factor: float = 0.5
+    # AWX list API 기본 page_size (AWX 기본 최대값 200)
+    awx_page_size: int = 200
+    # 모든 region 동시 업데이트 시 전체 응답 제한 시간(초)
+    awx_fanout_deadline: float = 10
+
+    # AWX 이름 -> id 조회 cache
+    # redis url 이 주어지면 worker 간 공유 (e.g. celery 와 같은 redis://localhost:6379/0)
+    awx_cache_maxsize: int = 1024
+    awx_cache_ttl: float = 600
+    awx_cache_negative_ttl: float = 30
+    awx_cache_redis_url: Optional[str] = None
+
+    # 중복 생성 요청 방지, redis 는 awx_cache_redis_url 이 없으면 celery broker 사용
+    # ttl: 완료된 결과 보관(초), pending_ttl: 실행 중 기록 만료(초), wait: 실행 중인 요청을 기다리는 시간(초)
+    awx_idempotency_ttl: float = 600
+    awx_idempotency_pending_ttl: float = 300
+    awx_idempotency_wait: float = 30
+
+    # 일괄 생성 시 AWX host 별 동시 요청 수
+    awx_bulk_concurrency: int = 8
+
+    # inventory sync job 상태 조회 간격(초) 과 종료된 job 보관 시간(초)
+    # 조회가 max_failures 번 연속 실패한 job 은 error 로 끝낸다.
+    # max_wait: GET /awx/jobs/{id} 의 wait(초) 최대값
+    awx_job_poll_min_interval: float = 1
+    awx_job_poll_max_interval: float = 15
+    awx_job_poll_max_failures: int = 5
+    awx_job_retention: float = 3600
+    awx_job_max_wait: float = 60
+
+    # AWX project / inventory source in-memory index 동기화
+    # 켜면 API process 마다 기동 시 모든 AWX 를 전체 조회하므로 필요한 process 에서만 켠다.
+    # full_sync_every: 몇 번의 동기화마다 전체를 다시 읽을지 (1 이상)
+    awx_index_enabled: bool = False
+    awx_index_interval: float = 60
+    awx_index_full_sync_every: int = Field(10, ge=1)
+
+    # celery
+    celery_broker_url: str = "redis://localhost:6379/0"
+    celery_result_backend: str = "redis://localhost:6379/0"
+    celery_concurrency: int = 4
+    celery_prefetch_multiplier: int = 1
+    # AWX 작업은 profile 별 queue (awx.dev, awx.prod, ...) 로 전달된다.
+    # queue 별 worker autoscale 범위 [max, min], run_celery_awx 에서 사용
+    celery_awx_autoscale: Dict[str, List[int]] = {
+        "dev": [2, 1],
+        "qa": [2, 1],
+        "stg": [2, 1],
+        "prod": [4, 1],
+    }
+    # redis broker 에서는 숫자가 작을수록 먼저 처리된다.
+    celery_priority_interactive: int = 0
+    celery_priority_bulk: int = 9
+
+    # BIG-IP iControl REST session pool
+    # pool 크기는 uvicorn(anyio) threadpool 기본값 40 에 맞춘다.
+    # BIG-IP token 기본 유효 시간은 1200초, 만료 refresh_margin 초 전에 새 session 을 만든다.
+    bigip_session_pool_size: int = 40
+    bigip_token_ttl: float = 1200
+    bigip_token_refresh_margin: float = 120
+    # node -> pool 역색인 갱신 주기(초)
+    bigip_node_index_interval: float = 60
+    # 조회 API 가 사용하는 BIG-IP 사본, interval(초) 동안 partition 별 node/pool/virtual 을 한번씩 다시 읽고
+    # max_staleness(초) 보다 오래된 사본은 조회 시점에 다시 읽는다.
+    bigip_snapshot_partitions: List[str] = ["Common"]
+    bigip_snapshot_interval: float = 30
+    bigip_snapshot_max_staleness: float = 120
+    # BIG-IP 변경 작업(job) 을 동시에 실행하는 thread 수, 끝난 job 보관 시간(초)
+    # kubernetes pool job 은 80, 443 pool 을 동시에 처리하므로 F5 동시 변경 수는 최대 workers x 2
+    bigip_job_workers: int = 4
+    bigip_job_retention: float = 3600
+    # /vipaddr/stats 집계 결과 보관 시간(초), VIP 할당/해제 시 바로 지운다.
+    # 소진 예측은 최근 window 일 동안의 할당 수로 계산
+    vipaddr_stats_ttl: float = 60
+    vipaddr_forecast_window_days: int = 30
+
+    # celery worker 가 AWX host 별로 초당 시작할 수 있는 작업 수 (0 이면 제한 없음)
+    # awx_host_rate_limits 에 없는 profile 은 awx_host_rate_limit 를 사용
+    awx_host_rate_limit: int = 5
+    awx_host_rate_limits: Dict[str, int] = {"prod": 2}
+
+    # celery worker process 별 selenium chrome session pool
+    crawler_pool_size: int = 2
+    crawler_max_uses: int = 50
+    # crawler 는 API 로 생성할 수 없는 경우에만 사용하므로 기본적으로 처음 사용할 때 session 을 만든다.
+    # crawler_warm_on_start 이면 worker process 기동 시 crawler_warm_profiles 에 미리 로그인
+    crawler_warm_on_start: bool = False
+    crawler_warm_profiles: List[str] = ["dev", "qa", "stg", "prod"]
+    # crawler 단계별 최대 대기 시간(초), e.g. {"login": 20, "save": 15}
+    crawler_step_timeout: float = 10
+    crawler_step_timeouts: Dict[str, float] = {}
+
+
+@lru_cache()
+def get_settings() -> Settings:
+    return Settings(app_version=__version__, docs_url="/")
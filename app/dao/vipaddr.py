@@ -1,11 +1,15 @@
 from typing import List, Optional
+from sqlalchemy import case, delete, func, literal_column
+from sqlalchemy.dialects.mysql import insert
 from sqlalchemy.orm import Session
-import ipaddress
-from ..schemas.vipaddr import VIPAddrSchema, UseYN
+from ..schemas.vipaddr import VIPAddrSchema, VIPAllocSchema, AllocAction, UseYN
 from ..models.vipaddr import VIPAddrParams
+from ..services.ipranges import IPRange, chunks, network_range, numbered_addresses, subnet_of, to_number
+from ..services.vipaddr_stats import vipaddr_stats
 
 RESERVED_PRE_HOSTS = 1
 RESERVED_POST_HOSTS = 0
+INSERT_CHUNK_SIZE = 1000
 
 
 def find_by_addr(db: Session, addr: str) -> VIPAddrSchema:
@@ -20,11 +24,79 @@ def find_by_flag(db: Session, use_yn: UseYN) -> VIPAddrSchema:
     return db.query(VIPAddrSchema).filter_by(use_yn=use_yn.value).first()
 
 
+def claim(db: Session, hostname: str, addr: Optional[str] = None) -> Optional[VIPAddrSchema]:
+    """
+    사용 가능한(use_yn=N) VIP 하나를 hostname 에 할당하고 바로 commit
+    - addr 지정: 조건부 UPDATE 의 변경된 row 수로 할당 여부 확인
+    - addr 미지정: 다른 transaction 이 잠근 row 는 건너뛰고(SKIP LOCKED) 가장 낮은 주소의 row 를 잠근 뒤 변경
+    동시에 요청해도 같은 VIP 가 두번 할당되지 않는다. 할당할 VIP 가 없으면 None
+    할당 이력(vipaddr_alloc_tb)을 같은 transaction 에서 기록한다.
+    """
+    if addr:
+        updated = (
+            db.query(VIPAddrSchema)
+            .filter_by(vip_addr=addr, use_yn=UseYN.N.value)
+            .update(
+                {"domain_name": hostname, "use_yn": UseYN.Y.value},
+                synchronize_session=False,
+            )
+        )
+        if updated == 1:
+            _record_alloc(db=db, vip_num=to_number(addr), hostname=hostname, action=AllocAction.CLAIM)
+        db.commit()
+        if updated != 1:
+            return None
+
+        vipaddr_stats.invalidate()
+        return find_by_addr(db=db, addr=addr)
+
+    row = (
+        db.query(VIPAddrSchema)
+        .filter_by(use_yn=UseYN.N.value)
+        .order_by(VIPAddrSchema.vip_num)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not row:
+        db.rollback()
+        return None
+
+    row.domain_name = hostname
+    row.use_yn = UseYN.Y.value
+    _record_alloc(db=db, vip_num=row.vip_num, hostname=hostname, action=AllocAction.CLAIM)
+    db.commit()
+    vipaddr_stats.invalidate()
+    db.refresh(row)
+    return row
+
+
+def unclaim(db: Session, row: VIPAddrSchema, hostname: str) -> bool:
+    """
+    claim 한 VIP 를 다시 사용 가능하게 변경, 그 사이 다른 hostname 으로 바뀌었다면 변경하지 않는다.
+    """
+    vip_num = row.vip_num
+    updated = (
+        db.query(VIPAddrSchema)
+        .filter_by(id=row.id, domain_name=hostname, use_yn=UseYN.Y.value)
+        .update({"domain_name": None, "use_yn": UseYN.N.value}, synchronize_session=False)
+    )
+    if updated == 1:
+        _record_alloc(db=db, vip_num=vip_num, hostname=hostname, action=AllocAction.UNCLAIM)
+    db.commit()
+    vipaddr_stats.invalidate()
+    return updated == 1
+
+
+def _record_alloc(db: Session, vip_num: int, hostname: str, action: AllocAction):
+    db.add(VIPAllocSchema(vip_num=vip_num, domain_name=hostname, action=action.value))
+
+
 def update(db: Session, row: VIPAddrSchema, params: VIPAddrParams) -> VIPAddrSchema:
     row.vip_addr = params.vip_addr
     row.domain_name = params.domain_name
     row.use_yn = params.use_yn.value
     db.commit()
+    vipaddr_stats.invalidate()
     db.refresh(row)
     return row
 
@@ -33,6 +105,7 @@ def reset(db: Session, row: VIPAddrSchema) -> VIPAddrSchema:
     row.domain_name = None
     row.use_yn = UseYN.N.value
     db.commit()
+    vipaddr_stats.invalidate()
     db.refresh(row)
     return row
 
@@ -50,26 +123,141 @@ def create(db: Session, params: VIPAddrParams) -> VIPAddrSchema:
 
     db.add(row)
     db.commit()
+    vipaddr_stats.invalidate()
     db.refresh(row)
     return row
 
 
-def add_all(db: Session, ipaddrs: List[ipaddress.IPv4Address]):
-    vipaddrs = list()
-    for addr in ipaddrs:
-        vipaddrs.append(
-            VIPAddrSchema(vip_addr=str(addr), domain_name=None, use_yn=UseYN.N.value)
+def add_ranges(db: Session, ranges: List[IPRange], chunk_size: int = INSERT_CHUNK_SIZE):
+    """
+    주소 범위의 VIP 를 chunk_size 개씩 multi-row INSERT
+    이미 있는 주소는 그대로 둔다. (ON DUPLICATE KEY UPDATE, 할당 정보 유지)
+    """
+    table = VIPAddrSchema.__table__
+    for chunk in chunks(numbered_addresses(ranges), chunk_size):
+        stmt = insert(table).values(
+            [{"vip_addr": addr, "vip_num": number, "domain_name": None, "use_yn": UseYN.N.value}
+             for number, addr in chunk]
         )
+        db.execute(stmt.on_duplicate_key_update(vip_addr=stmt.inserted.vip_addr))
 
-    db.add_all(vipaddrs)
     db.commit()
+    vipaddr_stats.invalidate()
 
 
-def delete_all(db: Session, ipaddrs: List[ipaddress.IPv4Address]):
-    for addr in ipaddrs:
-        db.query(VIPAddrSchema).filter_by(vip_addr=str(addr)).delete()
+def delete_ranges(db: Session, ranges: List[IPRange]):
+    """
+    주소 범위마다 DELETE 한번 (vip_num BETWEEN start AND end)
+    """
+    table = VIPAddrSchema.__table__
+    for start, end in ranges:
+        db.execute(delete(table).where(table.c.vip_num.between(start, end)))
 
     db.commit()
+    vipaddr_stats.invalidate()
+
+
+def find_free_in_cidr(db: Session, cidr: str, limit: int = 100) -> List[VIPAddrSchema]:
+    """
+    cidr 대역의 사용 가능한 VIP 를 주소 순서로 limit 개 ((use_yn, vip_num) index range scan)
+    """
+    start, end = network_range(cidr)
+    return (
+        db.query(VIPAddrSchema)
+        .filter(VIPAddrSchema.use_yn == UseYN.N.value, VIPAddrSchema.vip_num.between(start, end))
+        .order_by(VIPAddrSchema.vip_num)
+        .limit(limit)
+        .all()
+    )
+
+
+def find_lowest_free(db: Session, cidr: Optional[str] = None) -> Optional[VIPAddrSchema]:
+    """
+    (cidr 대역에서) 주소가 가장 낮은 사용 가능한 VIP
+    """
+    query = db.query(VIPAddrSchema).filter(VIPAddrSchema.use_yn == UseYN.N.value)
+    if cidr:
+        query = query.filter(VIPAddrSchema.vip_num.between(*network_range(cidr)))
+
+    return query.order_by(VIPAddrSchema.vip_num).first()
+
+
+def utilization_by_subnet(db: Session, cidr: str, prefixlen: int = 24) -> List[dict]:
+    """
+    cidr 대역의 VIP 를 /prefixlen subnet 단위로 묶은 전체/사용/미사용 수 (subnet 순서)
+    전체 수는 vip_num index, 미사용 수는 (use_yn, vip_num) index 만 읽어서 센다.
+    """
+    start, end = network_range(cidr)
+    vip_num = VIPAddrSchema.vip_num
+    subnet = vip_num.op("DIV")(2 ** (32 - prefixlen)).label("subnet")
+
+    def count_by_subnet(*criteria) -> dict:
+        rows = (
+            db.query(subnet, func.count())
+            .filter(vip_num.between(start, end), *criteria)
+            .group_by(subnet)
+            .all()
+        )
+        return {int(block): count for block, count in rows}
+
+    totals = count_by_subnet()
+    frees = count_by_subnet(VIPAddrSchema.use_yn == UseYN.N.value)
+
+    return [
+        {
+            "subnet": subnet_of(block, prefixlen),
+            "total": total,
+            "used": total - frees.get(block, 0),
+            "free": frees.get(block, 0),
+        }
+        for block, total in sorted(totals.items())
+    ]
+
+
+def count_in_cidr(db: Session, cidr: str) -> dict:
+    """
+    cidr 대역의 전체/사용/미사용 VIP 수 (vip_num, (use_yn, vip_num) index 만 읽는다.)
+    """
+    start, end = network_range(cidr)
+    in_cidr = VIPAddrSchema.vip_num.between(start, end)
+    total = db.query(func.count(VIPAddrSchema.vip_num)).filter(in_cidr).scalar()
+    free = (
+        db.query(func.count(VIPAddrSchema.vip_num))
+        .filter(in_cidr, VIPAddrSchema.use_yn == UseYN.N.value)
+        .scalar()
+    )
+    return {"cidr": cidr, "total": total, "used": total - free, "free": free}
+
+
+def count_used_by_domain_suffix(db: Session, labels: int = 2) -> List[dict]:
+    """
+    할당된 VIP 를 domain_name 의 마지막 labels 개 label 로 묶은 수 (많은 순서)
+    e.g. labels=2: foo.k8s-a.wmp.dev -> wmp.dev
+    """
+    suffix = func.substring_index(VIPAddrSchema.domain_name, ".", -labels).label("suffix")
+    rows = (
+        db.query(suffix, func.count())
+        .filter(VIPAddrSchema.use_yn == UseYN.Y.value)
+        .group_by(suffix)
+        .order_by(func.count().desc())
+        .all()
+    )
+    return [{"suffix": name, "used": used} for name, used in rows]
+
+
+def count_allocated_since(db: Session, days: int, cidr: Optional[str] = None) -> int:
+    """
+    최근 days 일 동안 claim 으로 할당된 VIP 수 (vipaddr_alloc_tb 의 claim - 되돌린 unclaim)
+    update, take_and_release 처럼 할당을 옮기는 변경은 세지 않는다.
+    """
+    delta = case((VIPAllocSchema.action == AllocAction.CLAIM.value, 1), else_=-1)
+    query = db.query(func.coalesce(func.sum(delta), 0)).filter(
+        VIPAllocSchema.create_dt >= func.date_sub(func.now(), literal_column(f"INTERVAL {int(days)} DAY")),
+    )
+    if cidr:
+        query = query.filter(VIPAllocSchema.vip_num.between(*network_range(cidr)))
+
+    return max(int(query.scalar()), 0)
 
 
 # old.domain_name 을 new.domain_name 으로 할당하고,
@@ -20,6 +20,13 @@ class AWXProjectNotCreatedException(Exception):
     pass
 
 
+class IdempotentRequestInProgressException(Exception):
+    """
+    같은 요청이 다른 곳에서 실행 중이고 기다리는 시간 안에 끝나지 않은 경우
+    """
+    pass
+
+
 class PoolNotFoundException(Exception):
     pass
 
@@ -36,5 +43,12 @@ class NodeNotFoundException(Exception):
     pass
 
 
+class BigipUnavailableException(Exception):
+    """
+    BIG-IP 에 접속할 수 없거나 사용하지 않도록 설정된 경우
+    """
+    pass
+
+
 def raise_error(code: int, msg: str):
     raise HTTPException(status_code=code, detail=msg)
@@ -6,6 +6,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import Settings
 from app.routers import (awx,
                          )
+from app.services.awx import close_awx_clients
+from app.services.awx_async import close_async_awx_clients, awx_index
 from app.ver import __version__ as version
 
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +32,18 @@ app.add_middleware(
 app.include_router(awx.router)
 
 
+@app.on_event("startup")
+async def startup():
+    if settings.awx_index_enabled:
+        awx_index.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    close_awx_clients()
+    await close_async_awx_clients()
+
+
 @app.get("/info")
 async def info():
     return {
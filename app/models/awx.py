@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from app.config import (AWX_URLS,
+from app.config import (REGIONS,
+                        AWX_URLS,
                         OAUTH2_TOKENS,
                         AWX_PROJECT_IDX,
                         AWX_HOST_FILTER,
@@ -29,3 +30,11 @@ class AWXModel(BaseModel):
     inventory_idx = AWX_INVENTORY_IDX['dev']
     host_filter = AWX_HOST_FILTER['dev']
 
+
+class InventorySourceItem(BaseModel):
+    """
+    sourced inventory 일괄 생성 요청 항목
+    """
+    app_name: str
+    profile: REGIONS
+    project: str
@@ -34,6 +34,7 @@ class VirtualServerModel(BaseModel):
 class VirtualServiceModel(BaseModel):
     hostname: str
     vip: Optional[str] = None
+    partition: str = "Common"
 
 
 class VirtualServerUpdateParams(BaseModel):
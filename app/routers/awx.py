@@ -1,62 +1,198 @@
-from typing import Optional
+import json
+import httpx
+from typing import List, Optional
+from typing_extensions import Literal
 
 from fastapi import (APIRouter,
                      status,
                      HTTPException,
+                     Query,
+                     Response,
                      )
-
-import app.services.awx as awx
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from celery.result import AsyncResult
+
+import app.services.awx_async as awx
+from app.config import get_settings
+from app.errors import IdempotentRequestInProgressException
+from app.services.idempotency import idempotency, request_key
+from app.models.awx import InventorySourceItem
+from app.worker.tasks import celery, enqueue_sourced_inventory
 router = APIRouter(prefix="/awx", tags=["awx"])
 
 
 @router.post('/inventory/source', status_code=status.HTTP_201_CREATED)
-def create_sourced_inventory(app_name: str, profile: str, project: str):
+async def create_sourced_inventory(app_name: str, profile: str, project: str):
     """
     Create AWX Sourced inventory
     @param app_name: 생성하고자 하는 어플리케이션 이름
     @param profile: 서비스 프로파일, (e.g. dev, qa, stg, prod)
     @param project: Ansible AWX의 프로젝트
+
+    같은 (app_name, profile) 요청이 실행 중이면 그 결과를 기다리고,
+    awx_idempotency_ttl 안에 성공한 요청이 있으면 AWX 를 호출하지 않고 그 결과를 반환
     """
     app_name = app_name.lower()
     profile = profile.lower()
     project = project.lower()
-    ret = awx.create_awx_inventory_sources(app_name, profile, project)
 
-    return {"result": ret.status_code}
+    async def _create():
+        ret = await awx.create_awx_inventory_sources(app_name, profile, project)
+        return {"result": ret.status_code, "job": ret.json().get("inventory_update")}
+
+    try:
+        return await idempotency.run(request_key("create", app_name, profile), _create,
+                                     wait=get_settings().awx_idempotency_wait)
+    except IdempotentRequestInProgressException:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"Same request is in progress: {app_name}@{profile}")
+
+
+@router.post('/inventory/source/tasks', status_code=status.HTTP_202_ACCEPTED)
+async def create_sourced_inventory_task(app_name: str, profile: str, project: str,
+                                        lane: Literal["interactive", "bulk"] = "interactive"):
+    """
+    AWX Sourced inventory 생성을 celery 작업으로 등록하고 task id 를 바로 반환
+    진행 상태는 GET /awx/tasks/{task_id} 로 조회
+    같은 (app_name, profile) 작업이 대기/실행 중이거나 최근에 성공했다면 그 task id 를 반환
+    @param lane: interactive 는 bulk(backfill) 보다 먼저 처리된다.
+    """
+    args = (app_name.lower(), profile.lower(), project.lower())
+    task_id = await run_in_threadpool(enqueue_sourced_inventory, *args, lane=lane)
+
+    return {"task_id": task_id}
+
+
+@router.get('/tasks/{task_id}', status_code=status.HTTP_200_OK)
+async def read_task(task_id: str):
+    """
+    celery 작업 상태 조회
+    - state: PENDING, STARTED, CREATE, LOGIN, FORM_FILL, SAVE, SYNC, RETRY, SUCCESS, FAILURE
+    - progress: 진행 중인 단계와 경로(api|crawler)
+    - result: 완료된 경우 작업 결과, 실패한 경우 error
+    """
+    def _read():
+        result = AsyncResult(task_id, app=celery)
+        body = {"task_id": task_id, "state": result.state, "progress": None, "result": None, "error": None}
+        if result.successful():
+            body["result"] = result.result
+        elif result.failed():
+            body["error"] = repr(result.result)
+        elif isinstance(result.info, dict):
+            body["progress"] = result.info
+
+        return body
+
+    return await run_in_threadpool(_read)
+
+
+@router.post('/inventory/sources', status_code=status.HTTP_200_OK)
+async def create_sourced_inventories(items: List[InventorySourceItem]):
+    """
+    AWX Sourced inventory 일괄 생성
+    항목 별 결과 (id, status, error) 를 요청 순서대로 반환
+    """
+    for item in items:
+        item.app_name = item.app_name.lower()
+        item.project = item.project.lower()
+
+    results = await awx.create_awx_inventory_sources_bulk(items)
+    failed = len([result for result in results if result["error"]])
+
+    return {"created": len(results) - failed, "failed": failed, "results": results}
+
+
+@router.get('/inventory/sources', status_code=status.HTTP_200_OK)
+async def list_sourced_inventories(profile: str, name: Optional[str] = None,
+                                   search: Optional[str] = None, page_size: Optional[int] = None):
+    """
+    AWX Sourced inventory 목록을 한 줄에 하나씩 json 으로 streaming (application/x-ndjson)
+    @param name: 이름이 정확히 일치하는 항목만 (대소문자 무시)
+    @param search: AWX search 필터
+    @param page_size: AWX 에 한번에 요청할 항목 수
+    """
+    filters = {}
+    if name:
+        filters["name__iexact"] = name
+    if search:
+        filters["search"] = search
+    fields = ("id", "name", "source", "source_project", "source_path", "inventory", "status", "modified")
+
+    async def _lines():
+        async for item in awx.iter_awx_list(profile.lower(), "/api/v2/inventory_sources/",
+                                            page_size=page_size, **filters):
+            yield json.dumps({field: item.get(field) for field in fields}) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+@router.get('/inventory/sources/diff', status_code=status.HTTP_200_OK)
+async def diff_sourced_inventories(present: str, absent: str):
+    """
+    present 환경에는 있지만 absent 환경에는 없는 sourced inventory 이름 목록
+    AWX 를 조회하지 않고 local index 에서 응답한다.
+    e.g. present=dev, absent=prod
+    """
+    present, absent = present.lower(), absent.lower()
+    for profile in (present, absent):
+        if not awx.awx_index.ready(profile, "inventory_source"):
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=f"AWX index is not synchronized yet: {profile}")
+
+    present_names = awx.awx_index.names(present, "inventory_source")
+    absent_names = {name.lower() for name in awx.awx_index.names(absent, "inventory_source")}
+    names = sorted(name for name in present_names if name.lower() not in absent_names)
+
+    return {"present": present, "absent": absent, "count": len(names), "names": names}
+
+
+@router.get('/index', status_code=status.HTTP_200_OK)
+async def read_index_status():
+    """
+    local AWX index 의 profile/kind 별 항목 수와 마지막 동기화 이후 경과 시간(초)
+    """
+    return awx.awx_index.status()
 
 
 @router.patch('/inventory/source', status_code=status.HTTP_200_OK)
-def change_sourced_inventory_branch(profile: Optional[str] = None, app_name=""):
+async def change_sourced_inventory_branch(profile: Optional[str] = None, app_name=""):
     """
     Application name (sourced inventory name)을 기준으로 해당 인덱스를 찾아
     머지 프로젝트로 브랜치를 변경하는 함수
     """
-    idx = awx.search_source_inventory(profile=profile, app_name=app_name)
-    print(f"project idx: {idx}")
-    ret = awx.change_awx_sourced_inventory_branch(profile, idx)
-    print(f"r: {ret.json()}")
+    idx = await awx.search_source_inventory(profile=profile, app_name=app_name)
+    ret = await awx.change_awx_sourced_inventory_branch(profile, idx)
 
-    return {"result": ret.status_code}
+    return {"result": ret.status_code, "job": ret.json().get("inventory_update")}
 
 
 @router.patch('/project', status_code=status.HTTP_202_ACCEPTED)
-def update_project(profile: Optional[str] = None):
+async def update_project(response: Response, profile: Optional[str] = None, deadline: Optional[float] = Query(default=None, gt=0)):
     """
     AWX project update 동작을 수행
-    profile 값이 없을 경우, 모든 환경의 기본 프로젝트 업데이트
+    profile 값이 없을 경우, 모든 환경의 기본 프로젝트를 동시에 업데이트
+    - region 별 결과 (status, latency, error) 를 regions 에 담아 반환
+    - 일부 region 만 성공한 경우 207, 모두 실패한 경우 502
+    @param deadline: 전체 region 업데이트 제한 시간(초, 0 보다 커야 함), 기본값은 settings.awx_fanout_deadline
     """
-    ret = None
     regions = ['dev', 'qa', 'stg', 'prod']
 
     if profile is None:
-        for item in regions:
-            ret = awx.update_awx_project(item)
-            if ret.status_code != status.HTTP_202_ACCEPTED:
-                raise HTTPException(status_code=ret.status_code, detail="")
+        if deadline is None:
+            deadline = get_settings().awx_fanout_deadline
+        results = await awx.update_awx_projects(regions, deadline=deadline)
+        succeeded = [item for item in regions if results[item]["status"] == status.HTTP_202_ACCEPTED]
+        if not succeeded:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=results)
 
-    else:
-        profile = profile.lower()
-        ret = awx.update_awx_project(profile)
+        response.status_code = status.HTTP_202_ACCEPTED if len(succeeded) == len(regions) \
+            else status.HTTP_207_MULTI_STATUS
+
+        return {"ret": response.status_code, "regions": results}
+
+    profile = profile.lower()
+    ret = await awx.update_awx_project(profile)
 
     # Error Handling
     if ret.status_code != status.HTTP_202_ACCEPTED:
@@ -70,10 +206,27 @@ async def update_specific_project(profile: str, project):
     """
     Pre-defined project가 아닌 특정 AWX 프로젝트를 업데이트
     """
-    project_idx = awx.search_project_idx(profile=profile, awx_project=project)
-    ret = awx.update_awx_project(profile, project_idx)
+    project_idx = await awx.search_project_idx(profile=profile, awx_project=project)
+    ret = await awx.update_awx_project(profile, project_idx)
     if ret.status_code != status.HTTP_202_ACCEPTED:
         raise HTTPException(status_code=ret.status_code, detail="Not founded AWX Project")
 
     return {"ret": ret.status_code}
 
+
+@router.get('/jobs/{job_id}', status_code=status.HTTP_200_OK)
+async def read_job(job_id: int, profile: str,
+                   wait: float = Query(0, ge=0, le=get_settings().awx_job_max_wait)):
+    """
+    inventory sync job 상태 조회
+    @param profile: 서비스 프로파일, (e.g. dev, qa, stg, prod)
+    @param wait: 0 보다 크면 job 이 끝나거나 wait(초) 이 지날 때까지 기다린 후 응답 (최대 settings.awx_job_max_wait)
+    """
+    profile = profile.lower()
+    try:
+        return await awx.sync_tracker.wait(profile, job_id, timeout=wait)
+    except httpx.HTTPStatusError as error:
+        raise HTTPException(status_code=error.response.status_code, detail=f"Not founded AWX job {job_id}")
+    except httpx.RequestError as error:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY,
+                            detail=f"{error.__class__.__name__}: {error}")
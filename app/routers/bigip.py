@@ -1,12 +1,18 @@
 from typing import Optional, List
+from typing_extensions import Literal
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
 
 from ..dao import vipaddr as VIPAddrDao
 from ..dependencies import get_db
+from ..database import SessionLocal
 from ..schemas.vipaddr import VIPAddrSchema, UseYN
 from ..models.vipaddr import VIPAddrParams
-from ..services.bigip import Bigip, Node, VIP
+from ..services.bigip import Bigip, VIP
+from ..services.bigip_snapshot import CACHED
+from ..services.bigip_jobs import bigip_jobs, for_each_port
+from ..services.bigip_vserver import create_kubernetes_vservers
+from ..services.singleflight import singleflight
 from ..models.bigip import (
     PoolModel,
     MemberModel,
@@ -25,12 +31,34 @@ from ..errors import (
     raise_error,
 )
 
+# BIG-IP 접속은 처음 요청을 처리할 때 session pool 이 수행한다.
 bigip = Bigip()
 router = APIRouter(prefix="/bigip", tags=["BIG-IP"])
 
+Consistency = Literal["strong", "cached"]
+
+# dashboard 가 같은 node/pool 을 반복 조회하므로 동시에 들어온 같은 요청은 BIG-IP 호출을 공유한다.
+nodes_flight = singleflight("bigip.nodes")
+pools_flight = singleflight("bigip.pools")
+
+
+def _write(kind: str, partition: str, func, **params):
+    """
+    응답을 바로 반환하는 F5 변경 API 도 bigip_jobs 를 거쳐서 실행한다.
+    (partition 별 순서, F5 동시 변경 수 제한)
+    기존 호출자가 사용하는 응답 형식을 유지하기 위해 job 이 끝날 때까지 요청 thread 에서 기다린다.
+    대부분 F5 요청 한두번으로 끝나는 변경이므로 latency 는 줄지 않지만 대기열 순서와 동시 변경 수 제한은 따른다.
+    오래 걸리는 kubernetes pool/vserver 생성과 vip 변경은 202 와 job 을 바로 반환한다.
+    """
+    return bigip_jobs.call(kind, partition, lambda progress: func(), **params)
+
 
 @router.post("/nodes/")
 def create_node(nodeModel: NodeModel):
+    return _write("create_node", nodeModel.partition, lambda: _create_node(nodeModel), name=nodeModel.name)
+
+
+def _create_node(nodeModel: NodeModel):
     name, partition, address, description = (
         nodeModel.name,
         nodeModel.partition,
@@ -53,12 +81,25 @@ def create_node(nodeModel: NodeModel):
 
 
 @router.get("/nodes/{name}")
-def read_node(name: str, partition: str = "Common"):
-    node = bigip.find_node(name=name, partition=partition)
+def read_node(name: str, partition: str = "Common", consistency: Consistency = CACHED):
+    """
+    consistency: cached 는 메모리의 BIG-IP 사본에서, strong 은 BIG-IP 에서 직접 조회
+    """
+    return nodes_flight.do(
+        (name, partition, consistency),
+        _read_node,
+        name=name,
+        partition=partition,
+        consistency=consistency,
+    )
+
+
+def _read_node(name: str, partition: str, consistency: str):
+    node = bigip.find_node(name=name, partition=partition, consistency=consistency)
     if not node:
         raise_error(404, f"Node not found: {name}@{partition}")
 
-    pools = bigip.get_pools_by_node_name(name=node.name)
+    pools = bigip.get_pools_by_node_name(name=node.name, consistency=consistency)
 
     return {
         "name": node.name,
@@ -70,6 +111,10 @@ def read_node(name: str, partition: str = "Common"):
 
 @router.delete("/nodes/{name}")
 def delete_node(name: str, partition: str = "Common"):
+    return _write("delete_node", partition, lambda: _delete_node(name, partition), name=name)
+
+
+def _delete_node(name: str, partition: str):
     try:
         bigip.delete_node(name=name, partition=partition)
     except NodeNotFoundException as error:
@@ -82,6 +127,10 @@ def delete_node(name: str, partition: str = "Common"):
 
 @router.delete("/nodes/")
 def delete_node(query: str):
+    return _write("delete_nodes", "Common", lambda: _delete_nodes(query), query=query)
+
+
+def _delete_nodes(query: str):
     try:
         deleted_names = bigip.delete_nodes(query=query)
         return {
@@ -94,6 +143,10 @@ def delete_node(query: str):
 
 @router.post("/pools/")
 def create_pool(pool: PoolModel, description: Optional[str] = None):
+    return _write("create_pool", pool.partition, lambda: _create_pool(pool, description), name=pool.name)
+
+
+def _create_pool(pool: PoolModel, description: Optional[str]):
     created = bigip.create_pool(pool=pool, params={"description": description})
     if not created:
         raise_error(500, f"Failed to create a new pool: {pool.name}({pool.partition})")
@@ -102,10 +155,25 @@ def create_pool(pool: PoolModel, description: Optional[str] = None):
 
 
 @router.get("/pools/{name}")
-def read_pool(name: str, partition: str = "Common"):
+def read_pool(name: str, partition: str = "Common", consistency: Consistency = CACHED):
+    """
+    consistency: cached 는 메모리의 BIG-IP 사본에서, strong 은 BIG-IP 에서 직접 조회
+    """
+    return pools_flight.do(
+        (name, partition, consistency),
+        _read_pool,
+        name=name,
+        partition=partition,
+        consistency=consistency,
+    )
+
+
+def _read_pool(name: str, partition: str, consistency: str):
     try:
-        pool = bigip.find_pool(pool=PoolModel(name=name, partition=partition))
-        members = bigip.get_pool_members(pool=pool)
+        pool = bigip.find_pool(
+            pool=PoolModel(name=name, partition=partition), consistency=consistency
+        )
+        members = bigip.get_pool_members(pool=pool, consistency=consistency)
         pool_members = []
         for member in members:
             pool_members.append({"name": member.name})
@@ -119,6 +187,16 @@ def read_pool(name: str, partition: str = "Common"):
 def update_pool_members(
     name: str, members: List[MemberModel], partition: str = "Common"
 ):
+    return _write(
+        "update_pool_members",
+        partition,
+        lambda: _update_pool_members(name, members, partition),
+        name=name,
+        members=[member.name for member in members],
+    )
+
+
+def _update_pool_members(name: str, members: List[MemberModel], partition: str):
     try:
         pool = bigip.find_pool(PoolModel(name=name, partition=partition))
         return bigip.update_pool_members(pool=pool, members=members)
@@ -128,6 +206,10 @@ def update_pool_members(
 
 @router.delete("/pools/{name}")
 def delete_pool(name: str, partition: str = "Common"):
+    return _write("delete_pool", partition, lambda: _delete_pool(name, partition), name=name)
+
+
+def _delete_pool(name: str, partition: str):
     try:
         pool = PoolModel(name=name, partition=partition)
         bigip.delete_pool(pool)
@@ -146,6 +228,16 @@ def delete_pool(name: str, partition: str = "Common"):
 def create_pool_members(
     pool_name: str, members: List[MemberModel], partition: str = "Common"
 ):
+    return _write(
+        "create_pool_members",
+        partition,
+        lambda: _create_pool_members(pool_name, members, partition),
+        name=pool_name,
+        members=[member.name for member in members],
+    )
+
+
+def _create_pool_members(pool_name: str, members: List[MemberModel], partition: str):
     try:
         pool = bigip.find_pool(PoolModel(name=pool_name, partition=partition))
         created = bigip.create_pool_members(pool=pool, members=members)
@@ -160,10 +252,20 @@ def create_pool_members(
 def delete_pool_members(
     pool_name: str, members: List[MemberModel], partition: str = "Common"
 ):
+    return _write(
+        "delete_pool_members",
+        partition,
+        lambda: _delete_pool_members(pool_name, members, partition),
+        name=pool_name,
+        members=[member.name for member in members],
+    )
+
+
+def _delete_pool_members(pool_name: str, members: List[MemberModel], partition: str):
     try:
         pool = bigip.find_pool(PoolModel(name=pool_name, partition=partition))
         deleted = bigip.delete_pool_members(pool=pool, members=members)
-        return f"Deleted members({len(delete)}) to {pool_name}@{partition}"
+        return f"Deleted members({len(deleted)}) to {pool_name}@{partition}"
     except PoolNotFoundException as error:
         return raise_error(404, f"{error}")
     except Exception as error:
@@ -172,6 +274,16 @@ def delete_pool_members(
 
 @router.delete("/pools/{pool_name}/members/{member_name}/")
 def delete_pool_member(pool_name: str, member_name: str, partition: str = "Common"):
+    return _write(
+        "delete_pool_member",
+        partition,
+        lambda: _delete_pool_member(pool_name, member_name, partition),
+        name=pool_name,
+        member=member_name,
+    )
+
+
+def _delete_pool_member(pool_name: str, member_name: str, partition: str):
     try:
         pool = bigip.find_pool(PoolModel(name=pool_name, partition=partition))
         deleted = bigip.delete_pool_member(pool=pool, member=member_name)
@@ -189,6 +301,17 @@ def session_pool_member(
     partition: str = "Common",
     session_enable: str = "true",
 ):
+    return _write(
+        "session_pool_member",
+        partition,
+        lambda: _session_pool_member(pool_name, member_name, partition, session_enable),
+        name=pool_name,
+        member=member_name,
+        session_enable=session_enable,
+    )
+
+
+def _session_pool_member(pool_name: str, member_name: str, partition: str, session_enable: str):
     try:
         pool = bigip.find_pool(PoolModel(name=pool_name, partition=partition))
         if session_enable == "true":
@@ -240,31 +363,39 @@ def delete_ip_cidr(
 
 
 # hostname: e.g. `dev-api-infracm.wemakeprice.kr`
-@router.post("/kubernetes/pools/{hostname}")
+@router.post("/kubernetes/pools/{hostname}", status_code=202)
 def create_kubernetes_pool(
     hostname: str,
     node_name_patterns: List[str] = ["a.wmp.dev", "b.wmp.dev", "gke"],
     partition: str = "Common",
 ):
-    mapped_port = {80: 30633, 443: 31963}
-    targets = []
+    """
+    hostname_80, hostname_443 pool 생성 작업을 등록하고 job 을 바로 반환
+    진행 상태와 결과는 `GET /bigip/jobs/:id` 로 조회
+    """
+    return bigip_jobs.submit(
+        "create_kubernetes_pool",
+        partition,
+        lambda progress: _create_kubernetes_pool(
+            hostname, node_name_patterns, partition, progress
+        ),
+        hostname=hostname,
+        node_name_patterns=node_name_patterns,
+    )
 
-    node = Node(bigip.mgmt)
-    for pattern in node_name_patterns:
-        targets += node.search_by_name(q=pattern)
 
-    msg = []
-    for port in [80, 443]:
+def _create_kubernetes_pool(
+    hostname: str, node_name_patterns: List[str], partition: str, progress
+):
+    mapped_port = {80: 30633, 443: 31963}
+    targets = bigip.search_nodes(patterns=node_name_patterns)
+    progress(f"Found nodes({len(targets)}) by {node_name_patterns}")
+
+    def _provision(port):
         name = f"{hostname}_{port}"
-        pool_model = PoolModel(name=name, partition=partition)
-        pool = None
-        try:
-            pool = bigip.find_pool(pool=pool_model)
-        except PoolNotFoundException as exception:
-            pool = bigip.create_pool(pool=pool_model, params={})
-        finally:
-            if not pool:
-                return raise_error(500, f"Failed to create a new pool: {name}")
+        pool = bigip.create_pool(pool=PoolModel(name=name, partition=partition), params={})
+        if not pool:
+            return raise_error(500, f"Failed to create a new pool: {name}")
 
         members = []
         for target in targets:
@@ -272,11 +403,13 @@ def create_kubernetes_pool(
 
         try:
             created = bigip.create_pool_members(pool=pool, members=members)
-            msg.append(f"Created members({len(created)}) to {name}")
         except Exception as error:
             return raise_error(500, f"{error}")
 
-    return msg
+        progress(f"Created members({len(created)}) to {name}")
+        return {"pool": name, "added": created}
+
+    return for_each_port(_provision)
 
 
 @router.delete("/kubernetes/pools/{hostname}")
@@ -287,12 +420,12 @@ def delete_kubernetes_pool(
     """
     BIG-IP 에서 hostname_80, hostname_443 Pool object 를 삭제합니다.
     """
-    msg = []
-    for port in [80, 443]:
-        name = f"{hostname}_{port}"
-        msg.append(delete_pool(name=name, partition=partition))
-
-    return msg
+    return _write(
+        "delete_kubernetes_pool",
+        partition,
+        lambda: for_each_port(lambda port: _delete_pool(name=f"{hostname}_{port}", partition=partition)),
+        hostname=hostname,
+    )
 
 
 @router.delete("/kubernetes/pools/{hostname}/members")
@@ -304,15 +437,20 @@ def delete_kubernetes_pool_members(
     """
     BIG-IP 의 hostname_80, hostname_443 Pool object 에서 node_name_patterns 에 matching 되는 member 를 제거합니다.
     """
-    mapped_port = {80: 30633, 443: 31963}
-    targets = []
+    return _write(
+        "delete_kubernetes_pool_members",
+        partition,
+        lambda: _delete_kubernetes_pool_members(hostname, node_name_patterns, partition),
+        hostname=hostname,
+        node_name_patterns=node_name_patterns,
+    )
 
-    node = Node(bigip.mgmt)
-    for pattern in node_name_patterns:
-        targets += node.search_by_name(q=pattern)
 
-    msg = []
-    for port in [80, 443]:
+def _delete_kubernetes_pool_members(hostname: str, node_name_patterns: List[str], partition: str):
+    mapped_port = {80: 30633, 443: 31963}
+    targets = bigip.search_nodes(patterns=node_name_patterns)
+
+    def _delete(port):
         name = f"{hostname}_{port}"
         pool_model = PoolModel(name=name, partition=partition)
         pool = None
@@ -329,11 +467,12 @@ def delete_kubernetes_pool_members(
 
         try:
             deleted = bigip.delete_pool_members(pool=pool, members=members)
-            msg.append(f"Deleted members({len(deleted)}) to {name}")
         except Exception as error:
             return raise_error(500, f"{error}")
 
-    return msg
+        return f"Deleted members({len(deleted)}) to {name}"
+
+    return for_each_port(_delete)
 
 
 @router.patch("/kubernetes/pools/{hostname}")
@@ -349,12 +488,21 @@ def session_kubernetes_pool(
     **WARNING** membership 을 변경하는 API 가 아닙니다.
     Pool 의 membership 변경을 위해서는 `PATCH /bigip/pools/:name` API 를 사용합니다.
     """
-    mapped_port = {80: 30633, 443: 31963}
-    targets = []
+    return _write(
+        "session_kubernetes_pool",
+        partition,
+        lambda: _session_kubernetes_pool(hostname, node_name_patterns, partition, session_enable),
+        hostname=hostname,
+        node_name_patterns=node_name_patterns,
+        session_enable=session_enable,
+    )
 
-    node = Node(bigip.mgmt)
-    for pattern in node_name_patterns:
-        targets += node.search_by_name(q=pattern)
+
+def _session_kubernetes_pool(
+    hostname: str, node_name_patterns: List[str], partition: str, session_enable: str
+):
+    mapped_port = {80: 30633, 443: 31963}
+    targets = bigip.search_nodes(patterns=node_name_patterns)
 
     for port in [80, 443]:
         name = f"{hostname}_{port}"
@@ -382,54 +530,49 @@ def session_kubernetes_pool(
     return msg
 
 
-@router.post("/kubernetes/vserver")
-def create_kubernetes_vserver(
-    virtual_service: VirtualServiceModel, db: Session = Depends(get_db)
-):
-    hostname, vip = virtual_service.hostname, virtual_service.vip
-    available = (
-        VIPAddrDao.find_by_addr(db=db, addr=vip)
-        if vip
-        else VIPAddrDao.find_by_flag(db=db, use_yn=UseYN.N)
+@router.post("/kubernetes/vserver", status_code=202)
+def create_kubernetes_vserver(virtual_service: VirtualServiceModel):
+    """
+    hostname_80, hostname_443 VirtualServer 생성 작업을 등록하고 job 을 바로 반환
+    진행 상태와 결과는 `GET /bigip/jobs/:id` 로 조회
+    """
+    return bigip_jobs.submit(
+        "create_kubernetes_vserver",
+        virtual_service.partition,
+        lambda progress: _with_db(_create_kubernetes_vserver, virtual_service, progress),
+        hostname=virtual_service.hostname,
+        vip=virtual_service.vip,
     )
-    if not available:
-        raise_error(code=500, msg="There are no valid resources")
 
-    vip = available.vip_addr
-    ## UseYN enum 을 쓰니까 좀 헛갈리는 듯
-    if available.use_yn != UseYN.N.value:
-        raise_error(code=400, msg=f"VIP already in use: {vip}")
 
-    msg = []
-    snatpool = bigip.configs.bigip_snatpool
-    for port in [80, 443]:
-        vs_name = f"{hostname}_{port}"
-        destination = f"{vip}:{port}"
-        vserver_model = VirtualServerModel(
-            name=vs_name, pool=vs_name, snatpool=snatpool, destination=destination
-        )
-        try:
-            bigip.create_vserver(vserver=vserver_model)
-        except PoolNotFoundException as error:
-            return raise_error(
-                404, f"pool not found: {vserver_model.pool}@{vserver_model.partition}"
-            )
-        except Exception as error:
-            return raise_error(500, f"create_vserver failed: {error}")
-        msg.append(f"{vserver_model.name}@{vip} created")
+def _with_db(func, *args):
+    """
+    job 은 요청이 끝난 뒤에도 실행되므로 요청의 db session 대신 새 session 을 사용
+    """
+    db = SessionLocal()
+    try:
+        return func(*args, db=db)
+    finally:
+        db.close()
 
-    VIPAddrDao.update(
-        db=db,
-        row=available,
-        params=VIPAddrParams(vip_addr=vip, domain_name=hostname, use_yn=UseYN.Y),
-    )
-    return msg
+
+def _create_kubernetes_vserver(virtual_service: VirtualServiceModel, progress, db: Session):
+    return create_kubernetes_vservers(bigip, virtual_service, progress, db=db)
 
 
 @router.delete("/kubernetes/vserver/{hostname}")
 def delete_kubernetes_vserver(
     hostname: str, partition: str = "Common", db: Session = Depends(get_db)
 ):
+    return _write(
+        "delete_kubernetes_vserver",
+        partition,
+        lambda: _delete_kubernetes_vserver(hostname, partition, db),
+        hostname=hostname,
+    )
+
+
+def _delete_kubernetes_vserver(hostname: str, partition: str, db: Session):
     msg = []
     for port in [80, 443]:
         vs_name = f"{hostname}_{port}"
@@ -451,14 +594,30 @@ def delete_kubernetes_vserver(
     return msg
 
 
-@router.patch("/kubernetes/vserver/{hostname}")
-def update_kubernetes_vserver(
-    hostname: str, params: VirtualServerUpdateParams, db: Session = Depends(get_db)
+@router.patch("/kubernetes/vserver/{hostname}", status_code=202)
+def update_kubernetes_vserver(hostname: str, params: VirtualServerUpdateParams):
+    """
+    hostname_80, hostname_443 VirtualServer 의 vip 변경 작업을 등록하고 job 을 바로 반환
+    진행 상태와 결과는 `GET /bigip/jobs/:id` 로 조회
+    """
+    return bigip_jobs.submit(
+        "update_kubernetes_vserver",
+        params.partition,
+        lambda progress: _with_db(_update_kubernetes_vserver, hostname, params, progress),
+        hostname=hostname,
+        vip=params.vip,
+    )
+
+
+def _update_kubernetes_vserver(
+    hostname: str, params: VirtualServerUpdateParams, progress, db: Session
 ):
     vip, partition = params.vip, params.partition
 
     try:
-        bigip.update_vserver_vip(hostname=hostname, vip=vip, db=db, partition=partition)
+        origin_vip = bigip.update_vserver_vip(
+            hostname=hostname, vip=vip, db=db, partition=partition
+        )
     except VServerNotFoundException as error:
         return raise_error(404, f"{error}")
     except VServerNothingToChangeException as error:
@@ -466,12 +625,30 @@ def update_kubernetes_vserver(
     except Exception as error:
         return raise_error(500, f"{error}")
 
-    return f"{hostname}@{partition} VirtualServers vip updated to {vip} successfully"
+    progress(f"{hostname}@{partition} VirtualServers vip updated to {vip} successfully")
+    return {"hostname": hostname, "partition": partition, "vip": vip, "previous": origin_vip}
+
+
+@router.get("/jobs/{job_id}")
+def read_job(job_id: str):
+    """
+    BIG-IP 변경 작업 상태
+    - status: queued, running, successful, failed
+    - progress: 진행된 단계, result: 변경 내역, error: 실패 원인
+    """
+    job = bigip_jobs.get(job_id)
+    if not job:
+        return raise_error(404, f"Job not found: {job_id}")
+
+    return job
 
 
 @router.get("/vserver/{name}")
-def read_vserver(name: str, partition: str = "Common"):
-    vserver = bigip.find_vserver(name=name, partition=partition)
+def read_vserver(name: str, partition: str = "Common", consistency: Consistency = CACHED):
+    """
+    consistency: cached 는 메모리의 BIG-IP 사본에서, strong 은 BIG-IP 에서 직접 조회
+    """
+    vserver = bigip.find_vserver(name=name, partition=partition, consistency=consistency)
     if not vserver:
         return raise_error(404, f"VirtualServer not found: {name}@{partition}")
 
@@ -482,6 +659,10 @@ def read_vserver(name: str, partition: str = "Common"):
 
 @router.post("/vserver/")
 def create_vserver(vserver: VirtualServerModel):
+    return _write("create_vserver", vserver.partition, lambda: _create_vserver(vserver), name=vserver.name)
+
+
+def _create_vserver(vserver: VirtualServerModel):
     try:
         created = bigip.create_vserver(vserver=vserver)
         if not created:
@@ -499,6 +680,10 @@ def create_vserver(vserver: VirtualServerModel):
 
 @router.delete("/vserver/{name}")
 def delete_vserver(name: str, partition: str = "Common"):
+    return _write("delete_vserver", partition, lambda: _delete_vserver(name, partition), name=name)
+
+
+def _delete_vserver(name: str, partition: str):
     try:
         bigip.delete_vserver(name=name, partition=partition)
     except VServerNotFoundException as error:
@@ -507,3 +692,23 @@ def delete_vserver(name: str, partition: str = "Common"):
         return raise_error(500, f"{error}")
 
     return f"VirtualServer {name}@{partition} deleted successfully"
+
+
+@router.get("/health")
+def read_health():
+    """
+    BIG-IP 응답 여부, latency 와 session pool 상태
+    """
+    health = bigip.health()
+    if not health["ok"]:
+        raise HTTPException(status_code=503, detail=health)
+
+    return health
+
+
+@router.get("/snapshot")
+def read_snapshot_status():
+    """
+    BIG-IP 사본의 partition/kind 별 항목 수와 마지막으로 읽은 이후 경과 시간(초)
+    """
+    return bigip.snapshot.status()
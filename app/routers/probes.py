@@ -1,8 +1,18 @@
 from fastapi import APIRouter
 
+from ..services.singleflight import singleflight_stats
+
 router = APIRouter(prefix="/probes", tags=["Probes"])
 
 
 @router.get("/liveness")
 def liveness():
     return "OK"
+
+
+@router.get("/singleflight")
+def read_singleflight_stats():
+    """
+    조회 API 별 singleflight 요청 수, upstream 호출 수, coalescing ratio
+    """
+    return singleflight_stats()
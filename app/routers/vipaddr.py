@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Depends
+import ipaddress
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from ..dependencies import get_db
@@ -6,22 +9,79 @@ from ..dao import vipaddr as VIPAddrDao
 from ..schemas.vipaddr import VIPAddrSchema
 from ..models.vipaddr import VIPAddrParams, VIPAddrUpdateParams
 from ..errors import raise_error
+from ..services.singleflight import singleflight
+from ..services.vipaddr_stats import vipaddr_stats, forecast
+from ..config import get_settings
 
 router = APIRouter(prefix="/vipaddr", tags=["VIPAddr"])
 
+vipaddr_flight = singleflight("vipaddr.addr")
+
 
 @router.get("/", deprecated=True)
 def get(addr: str, db: Session = Depends(get_db)):
     return find_by_addr(addr=addr, db=db)
 
 
+# /stats 는 /{addr} 보다 먼저 등록해야 한다.
+@router.get("/stats")
+def get_stats(cidr: str = "0.0.0.0/0", window_days: Optional[int] = Query(default=None, ge=1),
+              db: Session = Depends(get_db)):
+    """
+    cidr 대역의 전체/사용/미사용 VIP 수와 소진 예측
+    소진 예측은 최근 window_days 일(기본값 vipaddr_forecast_window_days) 동안의 할당 속도로 계산한다.
+    """
+    cidr = _network(cidr)
+    window_days = window_days or get_settings().vipaddr_forecast_window_days
+
+    counts = vipaddr_stats.get(("cidr", cidr), VIPAddrDao.count_in_cidr, db=db, cidr=cidr)
+    allocated = vipaddr_stats.get(("allocated", cidr, window_days), VIPAddrDao.count_allocated_since,
+                                  db=db, days=window_days, cidr=cidr)
+
+    return {**counts, "forecast": forecast(free=counts["free"], allocated=allocated, window_days=window_days)}
+
+
+@router.get("/stats/subnets")
+def get_subnet_stats(cidr: str = "0.0.0.0/0", prefixlen: int = Query(default=24, ge=8, le=32),
+                     db: Session = Depends(get_db)):
+    """
+    cidr 대역을 /prefixlen subnet 으로 나눈 전체/사용/미사용 VIP 수
+    """
+    cidr = _network(cidr)
+    return vipaddr_stats.get(("subnets", cidr, prefixlen), VIPAddrDao.utilization_by_subnet,
+                             db=db, cidr=cidr, prefixlen=prefixlen)
+
+
+@router.get("/stats/domains")
+def get_domain_stats(labels: int = Query(default=2, ge=1), db: Session = Depends(get_db)):
+    """
+    domain_name 의 마지막 labels 개 label(e.g. wmp.dev) 별로 할당된 VIP 수
+    """
+    return vipaddr_stats.get(("domains", labels), VIPAddrDao.count_used_by_domain_suffix, db=db, labels=labels)
+
+
+def _network(cidr: str) -> str:
+    try:
+        return str(ipaddress.IPv4Network(cidr, strict=False))
+    except ValueError as error:
+        return raise_error(code=400, msg=f"Invalid cidr: {error}")
+
+
 @router.get("/{addr}")
 def find_by_addr(addr: str, db: Session = Depends(get_db)):
+    """
+    동시에 들어온 같은 addr 조회는 하나의 DB query 결과를 공유한다.
+    """
+    return vipaddr_flight.do(addr, _find_by_addr, addr=addr, db=db)
+
+
+def _find_by_addr(addr: str, db: Session) -> dict:
     row = VIPAddrDao.find_by_addr(db=db, addr=addr)
     if not row:
         return raise_error(code=404, msg=f"Not found VIPAddr: {addr}")
 
-    return row
+    # 다른 요청의 session 에 묶인 row 를 공유하지 않도록 값만 반환
+    return {column.name: getattr(row, column.name) for column in VIPAddrSchema.__table__.columns}
 
 
 @router.post("/")
@@ -35,7 +95,10 @@ def create(params: VIPAddrParams, db: Session = Depends(get_db)):
 
 @router.put("/{addr}")
 def update(addr: str, params: VIPAddrUpdateParams, db: Session = Depends(get_db)):
-    row = find_by_addr(addr=addr, db=db)
+    row = VIPAddrDao.find_by_addr(db=db, addr=addr)
+    if not row:
+        return raise_error(code=404, msg=f"Not found VIPAddr: {addr}")
+
     update_params = VIPAddrParams(
         vip_addr=addr, domain_name=params.domain_name, use_yn=params.use_yn
     )
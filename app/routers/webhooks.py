@@ -11,6 +11,7 @@ from ..dependencies import get_db
 from ..dao.pipeline import find as find_pipeline
 
 from ..services.bitbucket import WebHook
+from ..services.singleflight import singleflight
 from ..services.pipeline_builder import configure
 
 from ..models.params import (
@@ -21,6 +22,8 @@ from ..models.params import (
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
 
+webhooks_flight = singleflight("webhooks.list")
+
 
 @router.post("/bitbucket", response_class=PlainTextResponse)
 async def bitbucket(
@@ -57,5 +60,7 @@ async def bitbucket(
 def webhooks(key: str, slug: str) -> List[BitbucketWebhookItem]:
     """
     Bitbucket webhook list by `key` and `slug`
+    동시에 들어온 같은 key/slug 조회는 하나의 Bitbucket 호출 결과를 공유한다.
     """
-    return WebHook().list(key=key.upper(), slug=slug)
+    key = key.upper()
+    return webhooks_flight.do((key, slug), lambda: WebHook().list(key=key, slug=slug))
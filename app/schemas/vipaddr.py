@@ -1,8 +1,11 @@
-from sqlalchemy import Boolean, Column, Integer, String, func, text, DateTime
+from sqlalchemy import Boolean, Column, Index, Integer, String, func, text, DateTime
+from sqlalchemy.dialects.mysql import INTEGER
+from sqlalchemy.orm import validates
 from enum import Enum
 
 from ..database import Base
 from .datetime import DateTime
+from ..services.ipranges import to_number
 
 
 class UseYN(Enum):
@@ -12,13 +15,48 @@ class UseYN(Enum):
 
 class VIPAddrSchema(Base):
     __tablename__ = "vipaddr_tb"
-    __table_args__ = {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_general_ci"}
+    __table_args__ = (
+        # 사용 가능한 VIP 를 주소 순서로 조회, sql/04-add-vipaddr_tb-vip_num.sql
+        Index("idx_vipaddr_use_yn_num", "use_yn", "vip_num"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_general_ci"},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     vip_addr = Column(String(20), unique=True, index=True, nullable=False)
+    # INET_ATON(vip_addr), 대역(CIDR) 조회와 주소 순서 정렬에 사용
+    vip_num = Column(INTEGER(unsigned=True), unique=True, index=True, nullable=False)
     domain_name = Column(String(100))
     use_yn = Column(String(10), default=UseYN.N, nullable=False)
     create_dt = Column(DateTime, server_default=func.now())
     update_dt = Column(
         DateTime, server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
     )
+
+    @validates("vip_addr")
+    def _sync_vip_num(self, key, addr):
+        self.vip_num = to_number(addr)
+        return addr
+
+
+class AllocAction(Enum):
+    CLAIM = "claim"
+    UNCLAIM = "unclaim"
+
+
+class VIPAllocSchema(Base):
+    """
+    VIP 할당 이력, 추가만 하고 변경/삭제하지 않는다. (소진 예측에 사용)
+    claim 과 실패한 작업이 claim 을 되돌린 unclaim 을 기록한다.
+    """
+    __tablename__ = "vipaddr_alloc_tb"
+    __table_args__ = (
+        # 기간 + 대역 조회, sql/05-create-vipaddr_alloc_tb.sql
+        Index("idx_vipaddr_alloc_create_dt", "create_dt", "vip_num", "action"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_general_ci"},
+    )
+
+    id = Column(Integer, primary_key=True)
+    vip_num = Column(INTEGER(unsigned=True), nullable=False)
+    domain_name = Column(String(100))
+    action = Column(String(10), nullable=False)
+    create_dt = Column(DateTime, server_default=func.now())
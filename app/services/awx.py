@@ -1,79 +1,175 @@
 import json
+import logging
+import threading
 import requests
 
 from fastapi import status
-from typing import Optional
+from typing import Dict, Iterator, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from app.models.awx import AwxInfo
 from app.config import (AWX_URLS,
                         OAUTH2_TOKENS,
                         AWX_PROJECT_IDX,
                         AWX_INVENTORY_IDX,
                         AWX_HOST_FILTER,
+                        get_settings,
                         )
 
 from app.errors import (AWXProjectNotFoundException,
                         AWXProjectNotCreatedException,
                         )
+from app.services.cache import LookupCache
 
+RETRY_STATUS_FORCELIST = (500, 502, 503, 504)
 
-def update_awx_project(profile: str, index: Optional[int] = None):
+
+def _build_lookup_cache() -> LookupCache:
+    settings = get_settings()
+    return LookupCache(maxsize=settings.awx_cache_maxsize,
+                       ttl=settings.awx_cache_ttl,
+                       negative_ttl=settings.awx_cache_negative_ttl,
+                       redis_url=settings.awx_cache_redis_url,
+                       prefix="awx")
+
+
+# (profile, kind, name) -> id, sync/async service 가 함께 사용한다.
+lookup_cache = _build_lookup_cache()
+
+
+class AwxClient:
     """
-    Update AWX Projects
+    profile 별 AWX REST API client
+    keep-alive connection pool, timeout, retry 정책을 모든 호출이 공유한다.
+
+    5xx 응답에 대한 재시도는 멱등한 method (GET, PUT, DELETE, PATCH ...) 에만 적용되고,
+    connection 단계의 실패는 요청이 전달되기 전이므로 POST 도 재시도 된다.
     """
-    endpoints: str = ["/api/v2/projects/", "/update/"]
 
-    sess = requests.session()
+    def __init__(self, profile: str):
+        settings = get_settings()
+        self.profile = profile
+        self.url = AWX_URLS[profile]
+        self.project_idx = AWX_PROJECT_IDX[profile]
+        self.inventory_idx = AWX_INVENTORY_IDX[profile]
+        self.host_filter = AWX_HOST_FILTER[profile]
+        self.timeout = (settings.awx_connect_timeout, settings.awx_read_timeout)
+
+        retry = Retry(total=settings.awx_max_retries,
+                      backoff_factor=settings.awx_backoff_factor,
+                      status_forcelist=RETRY_STATUS_FORCELIST,
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"PATCH"},
+                      raise_on_status=False)
+        # pool_block: pool 이 가득 찬 경우 일회용 connection 을 만들지 않고 대기
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=settings.awx_pool_maxsize,
+                              pool_block=True,
+                              max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            'Authorization': 'Bearer ' + OAUTH2_TOKENS[profile],
+            'content-type': 'application/json'
+        })
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, self.url + path, **kwargs)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
 
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_clients: Dict[str, AwxClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_awx_client(profile: str) -> AwxClient:
+    """
+    profile 에 해당하는 AwxClient 를 반환, 최초 호출 시 한번만 생성한다.
+    """
     profile = profile.lower()
-    awx_info = AwxInfo(profile=profile,
-                       url=AWX_URLS[profile],
-                       token=OAUTH2_TOKENS[profile],
-                       project_idx=AWX_PROJECT_IDX[profile])
+    client = _clients.get(profile)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(profile)
+            if client is None:
+                client = AwxClient(profile)
+                _clients[profile] = client
 
-    print(f'parameter index: {index}')
-    if index is not None:
-        awx_info.project_idx = index
+    return client
 
-    req_address = awx_info.url + endpoints[0] + str(awx_info.project_idx) + endpoints[1]
 
-    headers = {
-        'Authorization': 'Bearer ' + awx_info.token,
-        'content-type': 'application/json'
-    }
+def close_awx_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
 
-    ret = sess.post(req_address, headers=headers)
-    print(f'ret: {ret.status_code, ret.reason}')
+
+def update_awx_project(profile: str, index: Optional[int] = None):
+    """
+    Update AWX Projects
+    """
+    client = get_awx_client(profile)
+
+    project_idx = client.project_idx if index is None else index
+
+    ret = client.post("/api/v2/projects/" + str(project_idx) + "/update/")
+    logging.info(f"Update project {project_idx}: {ret.status_code} {ret.reason}")
 
     return ret
 
 
-def search_project_idx(profile, awx_project):
+def iter_awx_list(profile: str, path: str, page_size: Optional[int] = None, **filters) -> Iterator[dict]:
     """
-    Search by project index number using name
+    AWX list endpoint 의 results 를 page 단위로 가져오며 하나씩 반환
+    응답의 next 링크는 다음 항목이 필요할 때 따라간다.
+    @param filters: AWX query filter (e.g. name__iexact="develop", search="nd-")
     """
-    sess = requests.session()
+    client = get_awx_client(profile)
 
-    awx_info = AwxInfo(profile=profile,
-                       url=AWX_URLS[profile],
-                       token=OAUTH2_TOKENS[profile],
-                       project_idx=AWX_PROJECT_IDX[profile])
-    req_url = awx_info.url + "/api/v2/projects?search=" + awx_project
+    params = dict(filters)
+    params["page_size"] = page_size or get_settings().awx_page_size
+    response = client.get(path, params=params)
+    while True:
+        response.raise_for_status()
+        body = response.json()
+        yield from body.get('results', [])
 
-    headers = {
-        'Authorization': 'Bearer ' + awx_info.token,
-        'content-type': 'application/json'
-    }
+        next_page = body.get('next')
+        if not next_page:
+            return
+        response = client.get(next_page)
+
+
+def search_project_idx(profile, awx_project):
+    """
+    Search by project index number using name
+    """
+    client = get_awx_client(profile)
 
-    response = sess.get(req_url, headers=headers)
-    cnt = response.json().get('count')
-    infos = response.json().get('results')
+    hit, idx = lookup_cache.get(client.profile, "project", awx_project)
+    if not hit:
+        found = next(iter_awx_list(profile, "/api/v2/projects/", page_size=1, name__iexact=awx_project), None)
+        idx = found.get('id', 0) if found else None
+        lookup_cache.set(client.profile, "project", awx_project, idx)
 
-    if cnt == 0:
-        print(f"Not founded project {awx_project}")
+    if idx is None:
+        logging.info(f"Not founded project {awx_project}")
         raise AWXProjectNotFoundException
 
-    idx = infos[0].get('id', 0)
     return idx
 
 
@@ -81,26 +177,17 @@ def search_source_inventory(profile, app_name):
     """
     Search by source inventory index number using application name
     """
-    endpoint = "/api/v2/inventory_sources?search=" + app_name
-    awx_info = AwxInfo(profile=profile,
-                       url=AWX_URLS[profile],
-                       token=OAUTH2_TOKENS[profile],
-                       project_idx=AWX_PROJECT_IDX[profile])
-    headers = {
-        'Authorization': 'Bearer ' + awx_info.token,
-        'content-type': 'application/json'
-    }
-
-    with requests.session() as sess:
-        response = sess.get(awx_info.url + endpoint, headers=headers)
-        cnt = response.json().get('count')
-        infos = response.json().get('results')
+    client = get_awx_client(profile)
 
-        if cnt == 0:
-            print(f"Not founded sourced inventory {app_name}")
-            raise AWXProjectNotFoundException
+    hit, idx = lookup_cache.get(client.profile, "inventory_source", app_name)
+    if not hit:
+        found = next(iter_awx_list(profile, "/api/v2/inventory_sources/", page_size=1, name__iexact=app_name), None)
+        idx = found.get("id", 0) if found else None
+        lookup_cache.set(client.profile, "inventory_source", app_name, idx)
 
-        idx = infos[0].get("id", 0)
+    if idx is None:
+        logging.info(f"Not founded sourced inventory {app_name}")
+        raise AWXProjectNotFoundException
 
     return idx
 
@@ -109,20 +196,7 @@ def create_awx_inventory_sources(app_name, profile, project):
     """
     Create inventory sources using AWX OpenAPI
     """
-    endpoints: str = ["/api/v2/inventories/", "/inventory_sources/", "/update/"]
-    sess = requests.session()
-
-    awx_info = AwxInfo(profile=profile,
-                       url=AWX_URLS[profile],
-                       token=OAUTH2_TOKENS[profile],
-                       project_idx=AWX_PROJECT_IDX[profile])
-
-    req_address = awx_info.url + endpoints[0] + str(AWX_INVENTORY_IDX[profile]) + endpoints[1]
-
-    headers = {
-        'Authorization': 'Bearer ' + awx_info.token,
-        'content-type': 'application/json'
-    }
+    client = get_awx_client(profile)
 
     idx = search_project_idx(profile=profile, awx_project=project)
     datas = {
@@ -130,22 +204,20 @@ def create_awx_inventory_sources(app_name, profile, project):
         "source": "scm",
         "overwrite": True,
         "overwrite_var": True,
-        "host_filter": AWX_HOST_FILTER[profile],
+        "host_filter": client.host_filter,
         "source_project": idx,
         "source_path": "inventories/" + app_name + "/hosts"
     }
-    r = sess.post(req_address, headers=headers, data=json.dumps(datas))
+    r = client.post("/api/v2/inventories/" + str(client.inventory_idx) + "/inventory_sources/",
+                    data=json.dumps(datas))
     if r.status_code != status.HTTP_201_CREATED:
-        print(r.json())
-        raise AWXProjectNotCreatedException
+        logging.warning(f"Failed to create inventory source {app_name}: {r.status_code} {r.text}")
+        raise AWXProjectNotCreatedException(r.text)
 
     created_idx = r.json().get('id')
-    req_address = awx_info.url + "/api/v2" + endpoints[1] + str(created_idx) + endpoints[2]
-    print(req_address)
-    r = sess.get(req_address, headers=headers)
-    print(r.json())
-    r = sess.post(req_address, headers=headers)
-    print(r.reason)
+    lookup_cache.set(client.profile, "inventory_source", app_name, created_idx)
+    r = client.post("/api/v2/inventory_sources/" + str(created_idx) + "/update/")
+    logging.info(f"Launch inventory source {created_idx} sync: {r.status_code}")
 
     return r
 
@@ -154,27 +226,17 @@ def change_awx_sourced_inventory_branch(profile, idx):
     """
     Sourced inventory branch parameter 변경
     """
-    endpoints = "/api/v2/inventory_sources/"
-    awx_info = AwxInfo(profile=profile,
-                       url=AWX_URLS[profile],
-                       token=OAUTH2_TOKENS[profile],
-                       project_idx=AWX_PROJECT_IDX[profile])
-    headers = {
-        'Authorization': 'Bearer ' + awx_info.token,
-        'content-type': 'application/json'
-    }
+    client = get_awx_client(profile)
 
     datas = {
-        "source_project": awx_info.project_idx
+        "source_project": client.project_idx
     }
 
-    with requests.Session() as sess:
-        # Change branch value to profile default branch
-        r = sess.patch(awx_info.url + endpoints + str(idx) + '/', headers=headers, data=json.dumps(datas))
-        print(r.status_code)
-        # Synchronizing sourced project
-        address = awx_info.url + "/api/v2/inventory_sources/" + str(idx) + "/update/"
-        r = sess.post(address, headers=headers)
-        print(r.status_code)
+    # Change branch value to profile default branch
+    r = client.patch("/api/v2/inventory_sources/" + str(idx) + '/', data=json.dumps(datas))
+    logging.info(f"Change inventory source {idx} branch: {r.status_code}")
+    # Synchronizing sourced project
+    r = client.post("/api/v2/inventory_sources/" + str(idx) + "/update/")
+    logging.info(f"Launch inventory source {idx} sync: {r.status_code}")
 
     return r
@@ -0,0 +1,363 @@
+"""
+app.services.awx 의 asyncio 버전
+event loop 를 막지 않으므로 router 에서 await 로 사용한다.
+celery worker 처럼 동기 코드에서는 app.services.awx 를 사용할 것.
+"""
+import asyncio
+import logging
+import time
+import httpx
+
+from fastapi import status
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config import (AWX_URLS,
+                        OAUTH2_TOKENS,
+                        AWX_PROJECT_IDX,
+                        AWX_INVENTORY_IDX,
+                        AWX_HOST_FILTER,
+                        get_settings,
+                        )
+from app.errors import (AWXProjectNotFoundException,
+                        AWXProjectNotCreatedException,
+                        )
+from app.models.awx import InventorySourceItem
+from app.services.awx import RETRY_STATUS_FORCELIST, lookup_cache
+from app.services.awx_jobs import InventorySyncTracker
+from app.services.awx_index import AwxIndex
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE", "PATCH"])
+
+
+class AsyncAwxClient:
+    """
+    profile 별 AWX REST API async client
+    connect 실패는 transport 에서, 5xx 응답은 멱등한 method 에 한해 backoff 후 재시도한다.
+    """
+
+    def __init__(self, profile: str):
+        settings = get_settings()
+        self.profile = profile
+        self.url = AWX_URLS[profile]
+        self.project_idx = AWX_PROJECT_IDX[profile]
+        self.inventory_idx = AWX_INVENTORY_IDX[profile]
+        self.host_filter = AWX_HOST_FILTER[profile]
+        self.max_retries = settings.awx_max_retries
+        self.backoff_factor = settings.awx_backoff_factor
+
+        limits = httpx.Limits(max_connections=settings.awx_async_max_connections,
+                              max_keepalive_connections=settings.awx_pool_maxsize)
+        self.client = httpx.AsyncClient(
+            base_url=self.url,
+            headers={
+                'Authorization': 'Bearer ' + OAUTH2_TOKENS[profile],
+                'content-type': 'application/json'
+            },
+            timeout=httpx.Timeout(settings.awx_read_timeout, connect=settings.awx_connect_timeout),
+            transport=httpx.AsyncHTTPTransport(limits=limits, retries=settings.awx_max_retries),
+        )
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        retries = self.max_retries if method in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while True:
+            response = await self.client.request(method, path, **kwargs)
+            if response.status_code not in RETRY_STATUS_FORCELIST or attempt >= retries:
+                return response
+
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def patch(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", path, **kwargs)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+_clients: Dict[str, AsyncAwxClient] = {}
+
+
+def get_async_awx_client(profile: str) -> AsyncAwxClient:
+    """
+    profile 에 해당하는 AsyncAwxClient 를 반환, 최초 호출 시 한번만 생성한다.
+    """
+    profile = profile.lower()
+    client = _clients.get(profile)
+    if client is None:
+        client = AsyncAwxClient(profile)
+        _clients[profile] = client
+
+    return client
+
+
+async def close_async_awx_clients():
+    await sync_tracker.close()
+    await awx_index.close()
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
+
+
+def _build_sync_tracker() -> InventorySyncTracker:
+    settings = get_settings()
+    return InventorySyncTracker(lambda profile: get_async_awx_client(profile),
+                                min_interval=settings.awx_job_poll_min_interval,
+                                max_interval=settings.awx_job_poll_max_interval,
+                                retention=settings.awx_job_retention,
+                                max_failures=settings.awx_job_poll_max_failures)
+
+
+sync_tracker = _build_sync_tracker()
+
+
+async def update_awx_project(profile: str, index: Optional[int] = None):
+    """
+    Update AWX Projects
+    """
+    client = get_async_awx_client(profile)
+    project_idx = client.project_idx if index is None else index
+
+    return await client.post(f"/api/v2/projects/{project_idx}/update/")
+
+
+async def update_awx_projects(profiles: List[str], deadline: float) -> Dict[str, dict]:
+    """
+    여러 profile 의 기본 프로젝트를 동시에 업데이트
+    region 별 결과 (status, latency, error) 를 반환하고,
+    deadline(초) 안에 끝나지 않은 region 은 취소 후 error 로 기록한다.
+    """
+    async def _update(profile):
+        started = time.monotonic()
+        try:
+            r = await update_awx_project(profile)
+            error = None if r.status_code == status.HTTP_202_ACCEPTED else r.reason_phrase
+            result = {"status": r.status_code, "error": error}
+        except Exception as error:
+            result = {"status": None, "error": f"{error.__class__.__name__}: {error}"}
+
+        result["latency"] = round(time.monotonic() - started, 3)
+        return result
+
+    tasks = {profile: asyncio.ensure_future(_update(profile)) for profile in profiles}
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    for profile, task in tasks.items():
+        if task in done:
+            results[profile] = task.result()
+        else:
+            results[profile] = {"status": None, "error": "deadline exceeded", "latency": deadline}
+
+    return results
+
+
+async def iter_awx_list(profile: str, path: str, page_size: Optional[int] = None,
+                        **filters) -> AsyncIterator[dict]:
+    """
+    AWX list endpoint 의 results 를 page 단위로 가져오며 하나씩 반환
+    응답의 next 링크는 다음 항목이 필요할 때 따라간다.
+    @param filters: AWX query filter (e.g. name__iexact="develop", search="nd-")
+    """
+    client = get_async_awx_client(profile)
+
+    params = dict(filters)
+    params["page_size"] = page_size or get_settings().awx_page_size
+    response = await client.get(path, params=params)
+    while True:
+        response.raise_for_status()
+        body = response.json()
+        for item in body.get('results', []):
+            yield item
+
+        next_page = body.get('next')
+        if not next_page:
+            return
+        response = await client.get(next_page)
+
+
+def _build_index() -> AwxIndex:
+    settings = get_settings()
+    return AwxIndex(iter_awx_list, list(AWX_URLS.keys()),
+                    interval=settings.awx_index_interval,
+                    full_sync_every=settings.awx_index_full_sync_every)
+
+
+# 이름 -> id 조회는 index, lookup_cache, AWX 순서로 확인한다.
+awx_index = _build_index()
+
+
+async def _find_first(profile: str, path: str, **filters) -> Optional[dict]:
+    async for item in iter_awx_list(profile, path, page_size=1, **filters):
+        return item
+
+    return None
+
+
+async def search_project_idx(profile, awx_project):
+    """
+    Search by project index number using name
+    """
+    client = get_async_awx_client(profile)
+
+    idx = awx_index.lookup(client.profile, "project", awx_project)
+    if idx is not None:
+        return idx
+
+    hit, idx = await lookup_cache.aget(client.profile, "project", awx_project)
+    if not hit:
+        found = await _find_first(profile, "/api/v2/projects/", name__iexact=awx_project)
+        idx = found.get('id', 0) if found else None
+        await lookup_cache.aset(client.profile, "project", awx_project, idx)
+
+    if idx is None:
+        logging.info(f"Not founded project {awx_project}")
+        raise AWXProjectNotFoundException
+
+    return idx
+
+
+async def search_source_inventory(profile, app_name):
+    """
+    Search by source inventory index number using application name
+    """
+    client = get_async_awx_client(profile)
+
+    idx = awx_index.lookup(client.profile, "inventory_source", app_name)
+    if idx is not None:
+        return idx
+
+    hit, idx = await lookup_cache.aget(client.profile, "inventory_source", app_name)
+    if not hit:
+        found = await _find_first(profile, "/api/v2/inventory_sources/", name__iexact=app_name)
+        idx = found.get("id", 0) if found else None
+        await lookup_cache.aset(client.profile, "inventory_source", app_name, idx)
+
+    if idx is None:
+        logging.info(f"Not founded sourced inventory {app_name}")
+        raise AWXProjectNotFoundException
+
+    return idx
+
+
+async def launch_inventory_sync(client: AsyncAwxClient, idx: int) -> httpx.Response:
+    """
+    sourced inventory sync 를 시작하고, 생성된 AWX job 을 sync_tracker 에 등록한다.
+    """
+    r = await client.post(f"/api/v2/inventory_sources/{idx}/update/")
+    if r.status_code == status.HTTP_202_ACCEPTED:
+        sync_tracker.track(client.profile, r.json().get("inventory_update"))
+    else:
+        logging.warning(f"Failed to launch inventory sync {idx}: {r.status_code} {r.text}")
+
+    return r
+
+
+async def _create_inventory_source(client: AsyncAwxClient, app_name: str,
+                                   project_idx: int) -> Tuple[int, httpx.Response]:
+    """
+    sourced inventory 를 생성하고 sync 를 시작한다.
+    생성된 inventory source id 와 sync 요청의 응답을 반환
+    """
+    datas = {
+        "name": app_name,
+        "source": "scm",
+        "overwrite": True,
+        "overwrite_var": True,
+        "host_filter": client.host_filter,
+        "source_project": project_idx,
+        "source_path": "inventories/" + app_name + "/hosts"
+    }
+    r = await client.post(f"/api/v2/inventories/{client.inventory_idx}/inventory_sources/", json=datas)
+    if r.status_code != status.HTTP_201_CREATED:
+        logging.warning(f"Failed to create inventory source {app_name}: {r.status_code} {r.text}")
+        raise AWXProjectNotCreatedException(r.text)
+
+    created_idx = r.json().get('id')
+    await lookup_cache.aset(client.profile, "inventory_source", app_name, created_idx)
+    awx_index.put(client.profile, "inventory_source", r.json())
+    r = await launch_inventory_sync(client, created_idx)
+
+    return created_idx, r
+
+
+async def create_awx_inventory_sources(app_name, profile, project):
+    """
+    Create inventory sources using AWX OpenAPI
+    """
+    client = get_async_awx_client(profile)
+
+    idx = await search_project_idx(profile=profile, awx_project=project)
+    _, r = await _create_inventory_source(client, app_name, idx)
+
+    return r
+
+
+async def create_awx_inventory_sources_bulk(items: List[InventorySourceItem]) -> List[dict]:
+    """
+    sourced inventory 일괄 생성
+    - 같은 (profile, project) 의 프로젝트 조회는 한번만 수행
+    - AWX host(profile) 별로 awx_bulk_concurrency 만큼만 동시에 요청
+    항목 순서대로 결과 (id, status, error) 를 반환한다.
+    """
+    concurrency = get_settings().awx_bulk_concurrency
+    semaphores = {item.profile: asyncio.Semaphore(concurrency) for item in items}
+
+    async def _lookup(profile, project):
+        async with semaphores[profile]:
+            return await search_project_idx(profile=profile, awx_project=project)
+
+    projects = list({(item.profile, item.project) for item in items})
+    found = await asyncio.gather(*[_lookup(profile, project) for profile, project in projects],
+                                 return_exceptions=True)
+    project_idx = dict(zip(projects, found))
+
+    async def _create(item):
+        result = {"app_name": item.app_name, "profile": item.profile, "project": item.project,
+                  "id": None, "job": None, "status": None, "error": None}
+
+        idx = project_idx[(item.profile, item.project)]
+        if isinstance(idx, AWXProjectNotFoundException):
+            result["error"] = f"Not founded project {item.project}"
+            return result
+        # 조회 자체가 실패한 경우 (e.g. timeout, 5xx) 는 원인을 그대로 전달
+        if isinstance(idx, Exception):
+            result["error"] = f"{idx.__class__.__name__}: {idx}"
+            return result
+
+        async with semaphores[item.profile]:
+            try:
+                client = get_async_awx_client(item.profile)
+                result["id"], r = await _create_inventory_source(client, item.app_name, idx)
+                result["status"] = r.status_code
+                result["job"] = r.json().get("inventory_update")
+            except Exception as error:
+                result["error"] = f"{error.__class__.__name__}: {error}"
+
+        return result
+
+    return await asyncio.gather(*[_create(item) for item in items])
+
+
+async def change_awx_sourced_inventory_branch(profile, idx):
+    """
+    Sourced inventory branch parameter 변경
+    """
+    client = get_async_awx_client(profile)
+
+    # Change branch value to profile default branch
+    r = await client.patch(f"/api/v2/inventory_sources/{idx}/", json={"source_project": client.project_idx})
+    logging.info(f"Change inventory source {idx} branch: {r.status_code}")
+    # Synchronizing sourced project
+    r = await launch_inventory_sync(client, idx)
+    logging.info(f"Launch inventory source {idx} sync: {r.status_code}")
+
+    return r
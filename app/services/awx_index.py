@@ -0,0 +1,106 @@
+"""
+AWX project / inventory source 의 profile 별 in-memory 사본
+background task 가 modified__gt 필터로 변경분만 주기적으로 가져오고,
+삭제된 항목을 반영하기 위해 full_sync_every 번마다 전체를 다시 읽는다.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+KINDS = {
+    "project": "/api/v2/projects/",
+    "inventory_source": "/api/v2/inventory_sources/",
+}
+
+
+class AwxIndex:
+    """
+    @param lister: (profile, path, **filters) -> async iterator, e.g. awx_async.iter_awx_list
+    """
+
+    def __init__(self, lister: Callable, profiles: List[str], interval: float = 60, full_sync_every: int = 10):
+        if full_sync_every < 1:
+            raise ValueError(f"full_sync_every must be >= 1: {full_sync_every}")
+
+        self.lister = lister
+        self.profiles = profiles
+        self.interval = interval
+        self.full_sync_every = full_sync_every
+        # (profile, kind) -> 소문자 이름 -> {"id", "name", "modified"}
+        self.items: Dict[Tuple[str, str], Dict[str, dict]] = {}
+        self.watermarks: Dict[Tuple[str, str], str] = {}
+        self.synced_at: Dict[Tuple[str, str], float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def lookup(self, profile: str, kind: str, name: str) -> Optional[int]:
+        item = self.items.get((profile, kind), {}).get(name.lower())
+        return item["id"] if item else None
+
+    def names(self, profile: str, kind: str) -> Set[str]:
+        return {item["name"] for item in self.items.get((profile, kind), {}).values()}
+
+    def ready(self, profile: str, kind: str) -> bool:
+        return (profile, kind) in self.synced_at
+
+    def put(self, profile: str, kind: str, item: dict):
+        """
+        이 서비스를 통해 생성/변경된 항목을 다음 sync 전에 바로 반영
+        """
+        if (profile, kind) in self.items:
+            self.items[(profile, kind)][item["name"].lower()] = self._record(item)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            f"{profile}/{kind}": {
+                "count": len(self.items.get((profile, kind), {})),
+                "age": round(now - self.synced_at[(profile, kind)], 1) if self.ready(profile, kind) else None,
+            }
+            for profile in self.profiles for kind in KINDS
+        }
+
+    async def refresh(self, profile: str, kind: str, full: bool = False):
+        key = (profile, kind)
+        filters = {"order_by": "modified"}
+        watermark = self.watermarks.get(key)
+        full = full or watermark is None
+        if not full:
+            filters["modified__gt"] = watermark
+
+        items = {} if full else self.items.setdefault(key, {})
+        async for item in self.lister(profile, KINDS[kind], **filters):
+            items[item["name"].lower()] = self._record(item)
+            watermark = max(watermark or "", item.get("modified") or "")
+
+        self.items[key] = items
+        if watermark:
+            self.watermarks[key] = watermark
+        self.synced_at[key] = time.monotonic()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        rounds = 0
+        while True:
+            full = rounds % self.full_sync_every == 0
+            targets = [(profile, kind) for profile in self.profiles for kind in KINDS]
+            results = await asyncio.gather(*[self.refresh(profile, kind, full=full) for profile, kind in targets],
+                                           return_exceptions=True)
+            for target, result in zip(targets, results):
+                if isinstance(result, Exception):
+                    logging.info(f"Failed to sync AWX index {target}: {result}")
+
+            rounds += 1
+            await asyncio.sleep(self.interval)
+
+    @staticmethod
+    def _record(item: dict) -> dict:
+        return {"id": item.get("id"), "name": item.get("name"), "modified": item.get("modified")}
@@ -0,0 +1,175 @@
+"""
+AWX inventory sync job 추적
+sync 를 시작한 뒤 AWX job id 를 기록하고, 하나의 poller task 가
+진행 중인 모든 job 의 상태를 adaptive backoff 로 조회한다.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.cache import TTLCache, MISSING
+
+FINISHED_STATUSES = frozenset(["successful", "failed", "error", "canceled"])
+
+JOB_FIELDS = ("id", "status", "failed", "started", "finished", "elapsed", "job_explanation")
+
+
+class InventorySyncTracker:
+    """
+    (profile, job id) 단위로 AWX inventory update job 을 추적한다.
+    - 상태 변화가 없으면 조회 간격을 min_interval 부터 max_interval 까지 두배씩 늘림
+    - 끝난 job 은 retention(초) 동안 보관
+    - 조회가 max_failures 번 연속 실패하면 (404, 인증 실패 ...) status 를 error 로 끝낸다.
+    """
+
+    def __init__(self, client_factory: Callable, min_interval: float = 1,
+                 max_interval: float = 15, retention: float = 3600, max_failures: int = 5):
+        self.client_factory = client_factory
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_failures = max_failures
+        self._failures: Dict[Tuple[str, int], int] = {}
+        self.active: Dict[Tuple[str, int], dict] = {}
+        self.finished = TTLCache(maxsize=4096, ttl=retention)
+        self._schedule: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self._waiters: Dict[Tuple[str, int], List[asyncio.Future]] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def track(self, profile: str, job_id: int, job: Optional[dict] = None) -> dict:
+        key = (profile, job_id)
+        job = self._record(profile, job_id, job or {"status": "pending"})
+        if job["status"] in FINISHED_STATUSES:
+            self._finish(key, job)
+            return job
+
+        self.active[key] = job
+        self._schedule[key] = (time.monotonic() + self.min_interval, self.min_interval)
+        self._ensure_poller()
+        return job
+
+    def get(self, profile: str, job_id: int) -> Optional[dict]:
+        key = (profile, job_id)
+        job = self.active.get(key)
+        if job is None:
+            job = self.finished.get(key)
+
+        return None if job is MISSING else job
+
+    async def fetch(self, profile: str, job_id: int) -> dict:
+        """
+        추적 중인 job 이면 저장된 상태를, 아니면 AWX 에서 조회 후 추적을 시작
+        """
+        job = self.get(profile, job_id)
+        if job is not None:
+            return job
+
+        return self.track(profile, job_id, await self._poll(profile, job_id))
+
+    async def wait(self, profile: str, job_id: int, timeout: float) -> dict:
+        """
+        job 이 끝나거나 timeout(초) 이 지날 때까지 기다린 후 현재 상태를 반환
+        """
+        key = (profile, job_id)
+        job = await self.fetch(profile, job_id)
+        if job["status"] in FINISHED_STATUSES or timeout <= 0:
+            return job
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter), timeout=timeout)
+        except asyncio.TimeoutError:
+            return self.get(profile, job_id)
+        finally:
+            waiters = self._waiters.get(key, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+    async def close(self):
+        if self._poller and not self._poller.done():
+            self._poller.cancel()
+        self._poller = None
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._poller = loop.create_task(self._run())
+        else:
+            self._wakeup.set()
+
+    async def _run(self):
+        while self.active:
+            now = time.monotonic()
+            due = [key for key, (at, _) in self._schedule.items() if at <= now]
+            results = await asyncio.gather(*[self._poll(*key) for key in due], return_exceptions=True)
+
+            for key, result in zip(due, results):
+                if isinstance(result, Exception):
+                    self._fail(key, result)
+                    continue
+                self._failures.pop(key, None)
+                self._update(key, result)
+
+            if not self.active:
+                break
+
+            self._wakeup.clear()
+            delay = max(0, min(at for at, _ in self._schedule.values()) - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, profile: str, job_id: int) -> dict:
+        client = self.client_factory(profile)
+        r = await client.get(f"/api/v2/inventory_updates/{job_id}/")
+        r.raise_for_status()
+        return r.json()
+
+    def _update(self, key: Tuple[str, int], payload: dict):
+        job = self.active.get(key)
+        if job is None:
+            return
+
+        previous = job["status"]
+        job = self._record(*key, payload or job)
+        if job["status"] in FINISHED_STATUSES:
+            self._finish(key, job)
+            return
+
+        self.active[key] = job
+        _, interval = self._schedule[key]
+        interval = self.min_interval if job["status"] != previous else min(interval * 2, self.max_interval)
+        self._schedule[key] = (time.monotonic() + interval, interval)
+
+    def _fail(self, key: Tuple[str, int], error: Exception):
+        failures = self._failures.get(key, 0) + 1
+        logging.info(f"Failed to poll AWX job {key} ({failures}/{self.max_failures}): {error}")
+        job = self.active.get(key)
+        if job is None or failures < self.max_failures:
+            self._failures[key] = failures
+            self._update(key, {})
+            return
+
+        job = {**job, "status": "error", "failed": True,
+               "job_explanation": f"Failed to poll AWX job {failures} times: {error}"}
+        self._finish(key, job)
+
+    def _finish(self, key: Tuple[str, int], job: dict):
+        self._failures.pop(key, None)
+        self.active.pop(key, None)
+        self._schedule.pop(key, None)
+        self.finished.set(key, job)
+        for waiter in self._waiters.pop(key, []):
+            if not waiter.done():
+                waiter.set_result(job)
+
+    @staticmethod
+    def _record(profile: str, job_id: int, payload: dict) -> dict:
+        job = {field: payload.get(field) for field in JOB_FIELDS}
+        job["id"] = job_id
+        job["profile"] = profile
+        return job
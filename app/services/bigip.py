@@ -1,5 +1,4 @@
 import re
-import ipaddress
 from typing import List, Optional
 from f5.bigip import ManagementRoot
 from sqlalchemy.orm import Session
@@ -7,7 +6,12 @@ from sqlalchemy.orm import Session
 from ..dao import vipaddr as VIPAddrDao
 from ..config import get_settings
 from ..models.bigip import PoolModel, MemberModel, VirtualServerModel
+from . import bigip_members, ipranges
+from .bigip_session import BigipSessionPool
+from .bigip_index import NodePoolIndex, node_of
+from .bigip_snapshot import BigipSnapshot, SnapshotRecord, STRONG, CACHED
 from ..errors import (
+    BigipUnavailableException,
     PoolNotFoundException,
     VServerNotFoundException,
     VServerNothingToChangeException,
@@ -15,141 +19,284 @@ from ..errors import (
 )
 
 
+# snapshot 에 보관하는 항목 별 속성
+SNAPSHOT_FIELDS = {
+    "nodes": ("name", "partition", "address", "description", "session", "state"),
+    "pools": ("name", "partition", "monitor", "description"),
+    "virtuals": ("name", "partition", "destination", "pool", "description"),
+}
+
+
 class Bigip:
     env = None
-    mgmt = None
     configs = get_settings()
 
     def __init__(self):
         config = self.configs
-        # expired 를 모르겠다.
-        # transaction 마다 인증을 거쳐서 사용하는 것이 더 나을 수도 있겠다.
-        if config.bigip_enabled == "true":
-            self.mgmt = ManagementRoot(
-                config.bigip_host, config.bigip_username, config.bigip_password
-            )
+        # ManagementRoot 는 session pool 이 처음 사용할 때 만들고, token 만료 전에 다시 만든다.
+        self.sessions = BigipSessionPool(
+            self._connect,
+            size=config.bigip_session_pool_size,
+            token_ttl=config.bigip_token_ttl,
+            refresh_margin=config.bigip_token_refresh_margin,
+        )
+        self.node_pools = NodePoolIndex(
+            self.list_pool_members, interval=config.bigip_node_index_interval
+        )
+        self.snapshot = BigipSnapshot(
+            self._load_snapshot,
+            partitions=config.bigip_snapshot_partitions,
+            interval=config.bigip_snapshot_interval,
+            max_staleness=config.bigip_snapshot_max_staleness,
+        )
+
+    def _connect(self):
+        config = self.configs
+        if config.bigip_enabled != "true":
+            raise BigipUnavailableException("BIG-IP is disabled")
+
+        return ManagementRoot(
+            config.bigip_host, config.bigip_username, config.bigip_password, token=True
+        )
 
-    def find_node(self, name: str, partition: str):
-        return Node(self.mgmt).find(name=name, partition=partition)
+    def health(self) -> dict:
+        return self.sessions.health()
+
+    def _load_snapshot(self, partition: str, kind: str) -> List[dict]:
+        """
+        partition 의 nodes | pools | virtuals 를 한번에 조회, pool 은 member 를 포함(expandSubcollections)
+        """
+        params = f"$filter=partition eq {partition}"
+        if kind == "pools":
+            params += "&expandSubcollections=true"
+
+        def _load(mgmt):
+            collection = getattr(mgmt.tm.ltm, kind)
+            resources = collection.get_collection(requests_params={"params": params})
+            return [self._snapshot_item(kind, resource) for resource in resources]
+
+        return self.sessions.run(_load)
+
+    @staticmethod
+    def _snapshot_item(kind: str, resource) -> dict:
+        item = {field: getattr(resource, field, None) for field in SNAPSHOT_FIELDS[kind]}
+        # member 를 함께 조회한 경우에만 members 를 채운다.
+        reference = getattr(resource, "membersReference", {})
+        if kind == "pools" and "items" in reference:
+            item["members"] = [member["name"] for member in reference["items"]]
+
+        return item
+
+    def _cached(self, partition: str, consistency: str) -> bool:
+        """
+        snapshot 에 없는 partition 은 cached 로 요청해도 BIG-IP 에서 직접 조회한다.
+        """
+        return consistency == CACHED and self.snapshot.covers(partition)
+
+    def find_node(self, name: str, partition: str, consistency: str = STRONG):
+        if self._cached(partition, consistency):
+            return self.snapshot.get(partition, "nodes", name)
+
+        return self.sessions.run(
+            lambda mgmt: Node(mgmt).find(name=name, partition=partition)
+        )
+
+    def search_nodes(self, patterns: List[str], consistency: str = STRONG):
+        """
+        patterns 중 하나라도 이름에 matching 되는 node 목록, node collection 은 한번만 조회
+        """
+        if consistency == CACHED:
+            matcher = Node.matcher(patterns)
+            return [
+                node
+                for partition in self.configs.bigip_snapshot_partitions
+                for node in self.snapshot.list(partition, "nodes")
+                if matcher.search(node.name)
+            ]
+
+        return self.sessions.run(lambda mgmt: Node(mgmt).search_by_patterns(patterns=patterns))
 
     def create_node(self, name: str, partition: str, address: str, description=None):
-        return Node(self.mgmt).create(
-            name=name, partition=partition, address=address, description=description
+        node = self.sessions.run(
+            lambda mgmt: Node(mgmt).create(
+                name=name, partition=partition, address=address, description=description
+            )
         )
+        self.snapshot.upsert(partition, "nodes", self._snapshot_item("nodes", node))
+        return node
 
     def delete_node(self, name: str, partition: str = "Common"):
-        Node(self.mgmt).delete(name=name, partition=partition)
+        self.sessions.run(lambda mgmt: Node(mgmt).delete(name=name, partition=partition))
+        self.snapshot.remove(partition, "nodes", name)
 
     def delete_nodes(self, query: str):
-        wmp_node = Node(self.mgmt)
-        nodes = wmp_node.search_by_name(q=query)
-        names = []
-        for node in nodes:
-            names.append(node.name)
-            node.delete()
-
-        return names
-
-    def get_pools_by_node_name(self, name: str):
-        return Pool(self.mgmt).search_by_node_name(name=name)
+        def _delete(mgmt):
+            nodes = Node(mgmt).search_by_name(q=query)
+            names = []
+            for node in nodes:
+                names.append(node.name)
+                node.delete()
+                self.snapshot.remove(node.partition, "nodes", node.name)
+
+            return names
+
+        return self.sessions.run(_delete)
+
+    def list_pool_members(self):
+        return self.sessions.run(lambda mgmt: Pool(mgmt).list_with_members())
+
+    def get_pools_by_node_name(self, name: str, consistency: str = STRONG) -> List[PoolModel]:
+        """
+        consistency 가 cached 이면 snapshot 의 pool member 에서 찾는다. (snapshot 의 partition 만)
+        strong 이면 node -> pool 색인을 BIG-IP 에서 다시 읽어서 만든 뒤 찾는다.
+        """
+        if consistency == CACHED:
+            return [
+                PoolModel(name=pool.name, partition=partition)
+                for partition in self.snapshot.partitions
+                for pool in self.snapshot.list(partition, "pools")
+                if any(node_of(member) == name for member in getattr(pool, "members", []))
+            ]
+
+        return [
+            PoolModel(name=pool, partition=partition)
+            for partition, pool in self.node_pools.lookup(name, fresh=True)
+        ]
 
     def create_pool(self, pool: PoolModel, params):
-        wmp_pool = Pool(self.mgmt)
-        return wmp_pool.find_or_create(pool=pool, params=params)
+        created = self.sessions.run(
+            lambda mgmt: Pool(mgmt).find_or_create(pool=pool, params=params)
+        )
+        if created:
+            self.snapshot.upsert(pool.partition, "pools", self._snapshot_item("pools", created))
+        return created
 
-    def find_pool(self, pool: PoolModel):
-        found = Pool(self.mgmt).find(pool)
+    def find_pool(self, pool: PoolModel, consistency: str = STRONG):
+        if self._cached(pool.partition, consistency):
+            found = self.snapshot.get(pool.partition, "pools", pool.name)
+        else:
+            found = self.sessions.run(lambda mgmt: Pool(mgmt).find(pool))
         if not found:
             raise PoolNotFoundException(f"Pool not found: {pool.name}")
 
         return found
 
-    def get_pool_members(self, pool):
-        return pool.members_s.get_collection()
-
-    def update_pool_members(self, pool, members: List[MemberModel]):
-        old_members = self.get_pool_members(pool=pool)
+    def get_pool_members(self, pool, consistency: str = STRONG):
+        """
+        @param pool: consistency 가 cached 이면 find_pool(consistency=cached) 의 결과
+        """
+        if consistency == CACHED and isinstance(pool, SnapshotRecord):
+            return [SnapshotRecord(name=name) for name in getattr(pool, "members", [])]
 
-        a_seen = {}
-        for member in old_members:
-            a_seen[member.name] = True
+        return self._run_on_pool(pool, lambda mgmt, loaded: loaded.members_s.get_collection())
 
-        b_seen = {}
-        for member in members:
-            b_seen[member.name] = True
+    def _run_on_pool(self, pool, func):
+        """
+        func(mgmt, pool) 를 실행할 session 에서 pool 을 다시 읽어서 실행
+        다른 session 으로 읽은 resource 를 사용하면 반납된 session 을 여러 thread 가 함께 쓰게 된다.
+        """
+        model = PoolModel(name=pool.name, partition=pool.partition)
 
-        ab_seen = {}
-        delete_target = []
-        for name in a_seen.keys():
-            if name in b_seen:
-                ab_seen[name] = True
-            else:
-                delete_target.append(name)
+        def _run(mgmt):
+            loaded = Pool(mgmt).find(model)
+            if not loaded:
+                raise PoolNotFoundException(f"Pool not found: {model.name}@{model.partition}")
+            return func(mgmt, loaded)
 
-        create_target = []
-        for name in b_seen.keys():
-            if not name in ab_seen:
-                create_target.append(name)
+        return self.sessions.run(_run)
 
-        wmp_pool = Pool(self.mgmt)
-        for target in delete_target:
-            wmp_pool.delete_member(pool=pool, member=MemberModel(name=target))
+    def update_pool_members(self, pool, members: List[MemberModel]):
+        """
+        pool 의 member 목록을 members 로 맞춘다. (members 배열 교체, bigip_members 참고)
+        """
+        desired = [member.name for member in members]
+        before, after = self._replace_members(pool, lambda current: desired)
+
+        return {
+            "added": [name for name in after if name not in before],
+            "deleted": [name for name in before if name not in after],
+            "kept": [name for name in after if name in before],
+        }
 
-        for target in create_target:
-            wmp_pool.add_member(pool=pool, member=MemberModel(name=target))
+    def _replace_members(self, pool, target):
+        """
+        같은 session 에서 pool 의 member 를 읽고 target(현재 member 이름) 의 결과로 교체
+        """
+        try:
+            before, after = self._run_on_pool(
+                pool, lambda mgmt, loaded: bigip_members.replace_members(loaded, target)
+            )
+        finally:
+            self.node_pools.invalidate()
+        if before != after:
+            self.snapshot.upsert(pool.partition, "pools", {"name": pool.name, "members": after})
 
-        return {"added": create_target, "deleted": delete_target}
+        return before, after
 
     def delete_pool(self, pool: PoolModel):
-        Pool(self.mgmt).delete(pool=pool)
+        try:
+            self.sessions.run(lambda mgmt: Pool(mgmt).delete(pool=pool))
+        finally:
+            self.node_pools.invalidate()
+        self.snapshot.remove(pool.partition, "pools", pool.name)
 
     def create_pool_members(self, pool, members: List[MemberModel]):
-        created = []
-        for memberModel in members:
-            if pool.members_s.members.exists(
-                name=memberModel.name, partition=pool.partition
-            ):
-                raise Exception(f"member already exists: {memberModel.name}")
-
-            created.append(
-                pool.members_s.members.create(
-                    name=memberModel.name, partition=pool.partition
-                )
-            )
-
-        return created
+        """
+        member 를 하나씩 exists 확인 후 생성하지 않고,
+        현재 member 를 한번 조회한 뒤 members 배열에 추가해서 한번에 반영한다.
+        """
+        def _target(current):
+            for memberModel in members:
+                if memberModel.name in current:
+                    raise Exception(f"member already exists: {memberModel.name}")
+            return current + [memberModel.name for memberModel in members]
+
+        before, after = self._replace_members(pool, _target)
+        return [name for name in after if name not in before]
 
     def delete_pool_members(self, pool, members: List[MemberModel]):
-        deleted = []
-        wmp_pool = Pool(self.mgmt)
-        for memberModel in members:
-            wmp_pool.delete_member(pool=pool, member=memberModel)
-            deleted.append(memberModel.name)
-        return deleted
+        """
+        현재 member 를 한번 조회한 뒤 members 를 뺀 배열로 한번에 반영한다.
+        pool 에 없는 member 는 무시하고, 실제로 삭제한 member 이름을 반환
+        """
+        targets = {memberModel.name for memberModel in members}
+
+        before, after = self._replace_members(
+            pool, lambda current: [name for name in current if name not in targets]
+        )
+        return [name for name in before if name not in after]
 
     def delete_pool_member(self, pool, member: str):
-        deleted = []
-        wmp_pool = Pool(self.mgmt)
-        wmp_pool.delete_member(pool=pool, member=MemberModel(name=member))
-        deleted.append(member)
-        return deleted
+        try:
+            self._change_member(pool, Pool.delete_member, member)
+        finally:
+            self.node_pools.invalidate()
+        return [member]
 
     def enable_pool_member(self, pool, member: str):
-        enabled = []
-        wmp_pool = Pool(self.mgmt)
-        wmp_pool.enable_member(pool=pool, member=MemberModel(name=member))
-        enabled.append(member)
-        return enabled
+        self._change_member(pool, Pool.enable_member, member)
+        return [member]
 
     def disable_pool_member(self, pool, member: str):
-        disabled = []
-        wmp_pool = Pool(self.mgmt)
-        wmp_pool.disable_member(pool=pool, member=MemberModel(name=member))
-        disabled.append(member)
-        return disabled
+        self._change_member(pool, Pool.disable_member, member)
+        return [member]
+
+    def _change_member(self, pool, change, member: str):
+        """
+        change(Pool, pool, member) 실행 후 같은 session 에서 member 목록을 다시 읽어 snapshot 에 반영
+        """
+        def _change(mgmt, loaded):
+            change(Pool(mgmt), pool=loaded, member=MemberModel(name=member))
+            return [item.name for item in loaded.members_s.get_collection()]
+
+        names = self._run_on_pool(pool, _change)
+        self.snapshot.upsert(pool.partition, "pools", {"name": pool.name, "members": names})
 
-    def find_vserver(self, name: str, partition: str = "Common"):
-        return Virtual(self.mgmt).find(name, partition=partition)
+    def find_vserver(self, name: str, partition: str = "Common", consistency: str = STRONG):
+        if self._cached(partition, consistency):
+            return self.snapshot.get(partition, "virtuals", name)
+
+        return self.sessions.run(lambda mgmt: Virtual(mgmt).find(name, partition=partition))
 
     def create_vserver(self, vserver: VirtualServerModel):
         pool = self.find_pool(PoolModel(name=vserver.pool, partition=vserver.partition))
@@ -158,28 +305,42 @@ class Bigip:
                 f"pool not found: {vserver.pool}@{vserver.partition}"
             )
 
-        return Virtual(self.mgmt).create(vserver=vserver)
+        created = self.sessions.run(lambda mgmt: Virtual(mgmt).create(vserver=vserver))
+        if created:
+            self.snapshot.upsert(
+                vserver.partition, "virtuals", self._snapshot_item("virtuals", created)
+            )
+        return created
 
     def delete_vserver(self, name: str, partition: str = "Common"):
-        Virtual(self.mgmt).delete(name=name, partition=partition)
+        self.sessions.run(lambda mgmt: Virtual(mgmt).delete(name=name, partition=partition))
+        self.snapshot.remove(partition, "virtuals", name)
 
     def update_vserver_vip(
         self, hostname: str, vip: str, db: Session, partition: str = "Common"
     ):
-        virtual = Virtual(self.mgmt)
+        def _update(mgmt):
+            virtual = Virtual(mgmt)
+
+            origin_vip = None
+            for port in [80, 443]:
+                name = f"{hostname}_{port}"
+                vserver = virtual.find(name=name, partition=partition)
+                if not vserver:
+                    raise VServerNotFoundException(f"VServer not found: {name}")
+                destination = vserver.destination
+                origin_vip = destination.split("/")[-1].split(":")[0]
+                if origin_vip == vip:
+                    raise VServerNothingToChangeException(f"{name} already has vip: {vip}")
+
+                virtual.update_vip(vserver=vserver, vip=vip, partition=partition)
+                self.snapshot.upsert(
+                    partition, "virtuals", self._snapshot_item("virtuals", vserver)
+                )
 
-        origin_vip = None
-        for port in [80, 443]:
-            name = f"{hostname}_{port}"
-            vserver = self.find_vserver(name=name, partition=partition)
-            if not vserver:
-                raise VServerNotFoundException(f"VServer not found: {name}")
-            destination = vserver.destination
-            origin_vip = destination.split("/")[-1].split(":")[0]
-            if origin_vip == vip:
-                raise VServerNothingToChangeException(f"{name} already has vip: {vip}")
+            return origin_vip
 
-            virtual.update_vip(vserver=vserver, vip=vip, partition=partition)
+        origin_vip = self.sessions.run(_update)
 
         # 찾은거 release 하고, addr 로 찾아가서 update
         VIPAddrDao.take_and_release(
@@ -187,6 +348,7 @@ class Bigip:
             old=VIPAddrDao.find_by_addr(db=db, addr=origin_vip),
             new=VIPAddrDao.find_by_addr(db=db, addr=vip),
         )
+        return origin_vip
 
 
 class Pool:
@@ -243,17 +405,21 @@ class Pool:
             m.session = "user-disabled"
             m.update()
 
-    def search_by_node_name(self, name: str):
-        matched = []
-        all_pools = self.mgmt.tm.ltm.pools.get_collection()
-        for pool in all_pools:
-            members = pool.members_s.get_collection()
-            for member in members:
-                if re.search(rf"{name}", member.name):
-                    matched.append(pool)
-                    break
+    def list_with_members(self):
+        """
+        모든 pool 과 member 이름을 한번의 요청(expandSubcollections)으로 조회
+        pool 마다 members_s.get_collection() 을 호출하지 않는다.
+        """
+        pools = self.mgmt.tm.ltm.pools.get_collection(
+            requests_params={"params": "expandSubcollections=true"}
+        )
+        listed = []
+        for pool in pools:
+            reference = getattr(pool, "membersReference", {})
+            members = [member["name"] for member in reference.get("items", [])]
+            listed.append((pool.partition, pool.name, members))
 
-        return matched
+        return listed
 
 
 class Node:
@@ -265,14 +431,17 @@ class Node:
         self.node_obj = mgmt.tm.ltm.nodes
 
     def search_by_name(self, q: str = "k8s"):
-        matched = []
+        return self.search_by_patterns(patterns=[q])
+
+    @staticmethod
+    def matcher(patterns: List[str]):
+        return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+    def search_by_patterns(self, patterns: List[str]):
+        matcher = self.matcher(patterns)
         nodes = self.node_obj.get_collection()
-        for node in nodes:
-            name = node.name
-            if re.search(rf"{q}", name):
-                matched.append(node)
 
-        return matched
+        return [node for node in nodes if matcher.search(node.name)]
 
     def find(self, name: str, partition: str):
         if not self.node_obj.node.exists(name=name, partition=partition):
@@ -346,40 +515,26 @@ class VIP:
     def create_by_cidr(
         self, db: Session, include_cidr: str, exclude_cidrs: Optional[List[str]] = []
     ):
-        ipaddrs = list()
-        include_net = ipaddress.IPv4Network(include_cidr)
-        for exclude_cidr in exclude_cidrs:
-            exclude_net = ipaddress.IPv4Network(exclude_cidr)
-            include_net = include_net.address_exclude(exclude_net)
-
-        if isinstance(include_net, ipaddress.IPv4Network):
-            for host in include_net.hosts():
-                ipaddrs.append(host)
-        else:
-            for network in list(include_net):
-                for host in network.hosts():
-                    ipaddrs.append(host)
-
-        ipaddrs.sort()
-        ipaddrs = self.__exclude_reserved_hosts(ipaddrs)
-        VIPAddrDao.add_all(db=db, ipaddrs=ipaddrs)
+        """
+        include_cidr 의 host 중 exclude_cidrs 와 예약된 host 를 뺀 주소를 vipaddr 에 추가
+        주소 목록을 만들지 않고 범위 단위로 chunk insert 한다.
+        """
+        ranges = self.__exclude_reserved_hosts(
+            ipranges.host_ranges(include_cidr, exclude_cidrs)
+        )
+        VIPAddrDao.add_ranges(db=db, ranges=ranges)
 
     def delete_by_cidr(self, db: Session, cidr: str):
-        net = ipaddress.IPv4Network(cidr)
-        ipaddrs = [host for host in net.hosts()]
-        ipaddrs = self.__exclude_reserved_hosts(ipaddrs)
-        VIPAddrDao.delete_all(db=db, ipaddrs=ipaddrs)
+        ranges = self.__exclude_reserved_hosts(ipranges.host_ranges(cidr))
+        VIPAddrDao.delete_ranges(db=db, ranges=ranges)
 
     def __exclude_reserved_hosts(
-        self, ipaddrs: List[ipaddress.IPv4Address]
-    ) -> List[ipaddress.IPv4Address]:
-        network_length = len(ipaddrs)
+        self, ranges: List[ipranges.IPRange]
+    ) -> List[ipranges.IPRange]:
+        network_length = ipranges.count(ranges)
         if network_length <= self.RESERVED_PRE_HOSTS + self.RESERVED_POST_HOSTS:
             raise Exception(
                 f"Reserved hosts size are bigger than network: reserved({self.RESERVED_PRE_HOSTS+self.RESERVED_POST_HOSTS}), network({network_length})"
             )
 
-        ipaddrs = ipaddrs[
-            self.RESERVED_PRE_HOSTS : network_length - self.RESERVED_POST_HOSTS
-        ]
-        return ipaddrs
+        return ipranges.trim(ranges, self.RESERVED_PRE_HOSTS, self.RESERVED_POST_HOSTS)
@@ -0,0 +1,97 @@
+"""
+BIG-IP node -> pool 역색인
+pool 과 member 를 한번에 가져와서(expandSubcollections) node 이름별 소속 pool 을 메모리에 보관한다.
+- 처음 조회할 때 만들고, 이후 background thread 가 interval(초) 마다 다시 만든다.
+- member 를 변경한 뒤 invalidate() 하면 다음 조회에서 다시 만든다.
+- lookup(fresh=True) 는 interval 을 기다리지 않고 다시 만든 뒤 조회한다. (consistency=strong)
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# (pool partition, pool name, [member name]) 목록
+PoolMembers = Iterable[Tuple[str, str, List[str]]]
+
+
+def node_of(member: str) -> str:
+    """
+    member 이름에서 node 이름만 추출
+    e.g. /Common/worker-001.k8s-a.wmp.dev:31963 -> worker-001.k8s-a.wmp.dev
+    """
+    return member.rsplit("/", 1)[-1].rsplit(":", 1)[0]
+
+
+class NodePoolIndex:
+    """
+    @param loader: () -> PoolMembers, e.g. Bigip.list_pool_members
+    """
+
+    def __init__(self, loader: Callable[[], PoolMembers], interval: float = 60):
+        self.loader = loader
+        self.interval = interval
+        self.loaded_at: Optional[float] = None
+        self._pools: Dict[str, Set[Tuple[str, str]]] = {}
+        self._generation = 0
+        self._stale = True
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def lookup(self, node: str, fresh: bool = False) -> List[Tuple[str, str]]:
+        """
+        node 를 member 로 가진 pool 의 (partition, name) 목록
+        @param fresh: BIG-IP 에서 다시 읽어서 색인을 만든 뒤 조회 (이 service 밖에서 변경된 member 도 반영)
+        """
+        if fresh:
+            self.refresh()
+        elif self._stale:
+            self.refresh(only_stale=True)
+        self._start()
+
+        return sorted(self._pools.get(node, ()))
+
+    def invalidate(self):
+        self._generation += 1
+        self._stale = True
+
+    def refresh(self, only_stale: bool = False):
+        """
+        @param only_stale: 기다리는 동안 다른 thread 가 다시 만들었다면 읽지 않는다. (lookup 에서 사용)
+        """
+        with self._refresh_lock:
+            if only_stale and not self._stale:
+                return
+
+            generation = self._generation
+            index = defaultdict(set)
+            for partition, pool, members in self.loader():
+                for member in members:
+                    index[node_of(member)].add((partition, pool))
+
+            self._pools = dict(index)
+            self.loaded_at = time.monotonic()
+            # 읽는 동안 member 가 변경되었다면 다음 조회에서 다시 만든다.
+            self._stale = generation != self._generation
+
+    def status(self) -> dict:
+        return {
+            "nodes": len(self._pools),
+            "age": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+            "stale": self._stale,
+        }
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="bigip-node-index", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as error:
+                logging.info(f"Failed to refresh BIG-IP node index: {error}")
@@ -0,0 +1,162 @@
+"""
+BIG-IP 변경 작업 실행기
+요청은 job id 를 바로 반환하고, 작업은 크기가 정해진 thread pool 에서 실행된다.
+같은 partition 의 작업은 partition 별 대기열에서 순서대로 하나씩 꺼내 실행해서 F5 에 동시에 변경하는 요청 수를 제한한다.
+대기 중인 작업은 thread 를 점유하지 않으므로 한 partition 의 작업이 밀려도 다른 partition 의 작업은 실행된다.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.config import get_settings
+from app.services.cache import TTLCache, MISSING
+
+JobFunc = Callable[[Callable[[str], None]], object]
+
+
+class BigipJobRunner:
+    """
+    job 상태: queued -> running -> successful | failed
+    - progress: 작업이 남긴 단계별 메시지
+    - result: 성공한 경우 작업의 반환값 (변경 내역)
+    - error: 실패한 경우 원인, HTTPException 은 status_code 와 detail 을 그대로 기록
+    대기/실행 중인 job 은 끝날 때까지 보관하고, 끝난 job 은 retention(초) 동안 보관한다.
+    """
+
+    def __init__(self, workers: int = 4, retention: float = 3600):
+        self.workers = workers
+        self.active: Dict[str, dict] = {}
+        self.finished = TTLCache(maxsize=4096, ttl=retention)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queues: Dict[str, Deque[Tuple[dict, JobFunc, Optional[Callable]]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, partition: str, func: JobFunc, **params) -> dict:
+        """
+        @param func: (progress) -> result, progress(message) 로 진행 상황을 남긴다.
+        @param params: 조회 시 함께 보여줄 요청 값
+        """
+        return self._submit(kind, partition, func, params)
+
+    def call(self, kind: str, partition: str, func: JobFunc, **params):
+        """
+        submit 후 job 이 끝날 때까지 기다려서 결과를 반환, 실패하면 기록된 error 로 HTTPException 발생
+        응답 형식을 유지하는 동기 API 도 같은 실행기를 거쳐서 F5 동시 변경 수 제한을 따른다.
+        job 안에서 호출하면 같은 partition 의 대기열을 기다리게 되므로 사용하지 않는다.
+        """
+        finished = threading.Event()
+        job = self._submit(kind, partition, func, params, on_finish=finished.set)
+        finished.wait()
+
+        if job["status"] == "failed":
+            raise HTTPException(status_code=job["error"]["status_code"], detail=job["error"]["detail"])
+
+        return job["result"]
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.active.get(job_id)
+        if job is not None:
+            return job
+
+        job = self.finished.get(job_id)
+        return None if job is MISSING else job
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False)
+
+    def _submit(self, kind: str, partition: str, func: JobFunc, params: dict,
+                on_finish: Optional[Callable] = None) -> dict:
+        job = {"id": uuid.uuid4().hex, "kind": kind, "partition": partition, "params": params,
+               "status": "queued", "progress": [], "result": None, "error": None,
+               "created": time.time(), "started": None, "finished": None}
+
+        with self._lock:
+            self.active[job["id"]] = job
+            queue = self._queues.get(partition)
+            # 대기열이 없으면 이 partition 에서 실행 중인 job 이 없으므로 바로 실행
+            start = queue is None
+            if start:
+                queue = self._queues[partition] = deque()
+            queue.append((job, func, on_finish))
+
+        if start:
+            self._get_executor().submit(self._next, partition)
+        return job
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bigip-job")
+            return self._executor
+
+    def _next(self, partition: str):
+        """
+        partition 대기열의 job 하나를 실행하고, 남은 job 이 있으면 다음 job 을 다시 pool 에 등록
+        한 thread 가 대기열을 모두 비우지 않으므로 다른 partition 의 job 과 번갈아 실행된다.
+        """
+        with self._lock:
+            job, func, on_finish = self._queues[partition].popleft()
+
+        try:
+            self._run(job, func)
+        finally:
+            if on_finish:
+                on_finish()
+
+            with self._lock:
+                remains = bool(self._queues[partition])
+                if not remains:
+                    del self._queues[partition]
+
+            if remains:
+                self._get_executor().submit(self._next, partition)
+
+    def _run(self, job: dict, func: JobFunc):
+        job["status"] = "running"
+        job["started"] = time.time()
+        try:
+            job["result"] = func(job["progress"].append)
+            job["status"] = "successful"
+        except HTTPException as error:
+            job["error"] = {"status_code": error.status_code, "detail": error.detail}
+            job["status"] = "failed"
+        except Exception as error:
+            logging.exception(f"BIG-IP job {job['id']} failed")
+            job["error"] = {"status_code": 500, "detail": f"{error.__class__.__name__}: {error}"}
+            job["status"] = "failed"
+        finally:
+            job["finished"] = time.time()
+            # 끝난 시점부터 retention 동안 보관
+            self.finished.set(job["id"], job)
+            with self._lock:
+                self.active.pop(job["id"], None)
+
+
+def for_each_port(func: Callable[[int], object], ports: Tuple[int, ...] = (80, 443)) -> list:
+    """
+    job 하나 안에서 port 별 pool(hostname_80, hostname_443) 작업을 동시에 실행하고 port 순서대로 결과를 반환
+    port 별 작업은 BIG-IP session pool 의 session 을 하나씩 사용하므로
+    F5 를 동시에 변경하는 요청 수는 최대 bigip_job_workers x port 수
+    모든 port 가 끝난 뒤 먼저 실패한 port 의 예외(HTTPException 포함)를 그대로 전달한다.
+    """
+    with ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="bigip-port") as executor:
+        futures = [executor.submit(func, port) for port in ports]
+
+    return [future.result() for future in futures]
+
+
+def _build_runner() -> BigipJobRunner:
+    settings = get_settings()
+    return BigipJobRunner(workers=settings.bigip_job_workers, retention=settings.bigip_job_retention)
+
+
+bigip_jobs = _build_runner()
@@ -0,0 +1,67 @@
+"""
+pool member 배열 교체
+member 를 하나씩 추가/삭제하지 않고 members 배열 전체를 한번의 PATCH 로 교체하므로
+모두 반영되거나 하나도 반영되지 않는다.
+PATCH 는 배열을 통째로 바꾸므로 유지되는 member 는 읽은 설정을 모두 다시 보내야 기존 설정이 유지된다.
+pool resource 는 인자로 받는다. (f5-sdk 없이 payload 를 확인할 수 있도록)
+"""
+from typing import Callable, List, Tuple
+
+# members 배열을 교체할 때 유지되는 member 에 다시 보내는 설정
+MEMBER_FIELDS = (
+    "description",
+    "ratio",
+    "priorityGroup",
+    "connectionLimit",
+    "rateLimit",
+    "dynamicRatio",
+    "monitor",
+    "logging",
+    "metadata",
+)
+
+
+def member_settings(member) -> dict:
+    """
+    members 배열을 교체할 때 유지할 기존 member 의 설정
+    - MEMBER_FIELDS 중 조회된 값
+    - session: monitor-enabled, user-enabled ... 중 user-disabled 만 (쓰기는 user-enabled|user-disabled)
+    - state: up, down, unchecked ... 중 user-down 만
+    """
+    settings = {
+        field: getattr(member, field) for field in MEMBER_FIELDS if getattr(member, field, None) is not None
+    }
+    if getattr(member, "session", None) == "user-disabled":
+        settings["session"] = "user-disabled"
+    if getattr(member, "state", None) == "user-down":
+        settings["state"] = "user-down"
+
+    return settings
+
+
+def replace_members(pool, target: Callable[[List[str]], List[str]]) -> Tuple[List[str], List[str]]:
+    """
+    pool 의 member 를 읽고 target(현재 member 이름) 이 반환한 이름으로 members 배열을 교체
+    member 목록이 바뀌지 않으면 PATCH 하지 않는다.
+    @param pool: member 를 읽은 session 에서 불러온 pool resource
+    @return: (변경 전, 변경 후) member 이름
+    """
+    current = {member.name: member for member in pool.members_s.get_collection()}
+    before = list(current.keys())
+
+    after = []
+    for name in target(before):
+        if name not in after:
+            after.append(name)
+    if set(after) == set(before):
+        return before, before
+
+    payload = []
+    for name in after:
+        item = {"name": name, "partition": pool.partition}
+        if name in current:
+            item.update(member_settings(current[name]))
+        payload.append(item)
+
+    pool.modify(members=payload)
+    return before, after
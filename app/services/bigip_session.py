@@ -0,0 +1,155 @@
+"""
+BIG-IP iControl REST session pool
+ManagementRoot 하나를 모든 threadpool thread 가 공유하면 token 만료 시점에 인증 실패가 나고,
+한 session 의 요청이 순서대로 처리되므로 session 을 thread 수 만큼 나눠서 사용한다.
+
+- 처음 사용할 때 session 을 만든다. (app 기동 시 F5 에 접속하지 않음)
+- token 만료 refresh_margin(초) 전에 session 을 새로 만든다.
+- 401 응답을 받으면 session 을 폐기하고 새 session 으로 한번 더 실행한다.
+"""
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from app.errors import BigipUnavailableException
+
+
+class BigipSession:
+    """
+    pool 에 보관되는 ManagementRoot 와 token 만료 시각
+    """
+
+    def __init__(self, mgmt, expires_at: float):
+        self.mgmt = mgmt
+        self.expires_at = expires_at
+
+
+def is_unauthorized(error: Exception) -> bool:
+    """
+    icontrol 의 iControlUnexpectedHTTPError 는 requests 응답을 response 로 가지고 있다.
+    """
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 401
+
+
+class BigipSessionPool:
+    """
+    @param factory: () -> ManagementRoot
+    @param size: 최대 session 수, uvicorn threadpool 크기와 맞춘다.
+    @param token_ttl: BIG-IP token 유효 시간(초)
+    @param refresh_margin: 만료 몇 초 전에 session 을 새로 만들지
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 40,
+                 token_ttl: float = 1200, refresh_margin: float = 120):
+        self.factory = factory
+        self.size = size
+        self.token_ttl = token_ttl
+        self.refresh_margin = refresh_margin
+        self.created = 0
+        self.refreshed = 0
+        self.reauthenticated = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._open = 0
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """
+        session 의 ManagementRoot 를 빌려준다. 모든 session 이 사용 중이면 반납될 때까지 대기
+        401 이 발생한 session 은 pool 에 반납하지 않는다.
+        """
+        self._slots.acquire()
+        session = None
+        try:
+            session = self._checkout()
+            yield session.mgmt
+        except Exception as error:
+            if session is not None and is_unauthorized(error):
+                self._discard(session)
+                session = None
+            raise
+        finally:
+            if session is not None:
+                self._idle.put(session)
+            self._slots.release()
+
+    def run(self, func: Callable[[Any], Any]) -> Any:
+        """
+        func(mgmt) 를 실행, 401 이면 새 session 으로 한번 더 실행한다.
+        """
+        try:
+            with self.acquire() as mgmt:
+                return func(mgmt)
+        except Exception as error:
+            if not is_unauthorized(error):
+                raise
+
+            logging.info(f"BIG-IP session unauthorized, retry with a new session: {error}")
+            self.reauthenticated += 1
+
+        with self.acquire() as mgmt:
+            return func(mgmt)
+
+    def health(self) -> dict:
+        """
+        session 하나로 가벼운 조회(sys clock)를 해서 BIG-IP 응답 여부와 latency 를 확인
+        """
+        started = time.monotonic()
+        try:
+            self.run(lambda mgmt: mgmt.tm.sys.clock.load())
+            error = None
+        except Exception as exception:
+            error = f"{exception.__class__.__name__}: {exception}"
+
+        return {"ok": error is None, "error": error,
+                "latency": round(time.monotonic() - started, 3), **self.stats()}
+
+    def stats(self) -> dict:
+        return {"size": self.size, "open": self._open, "idle": self._idle.qsize(),
+                "created": self.created, "refreshed": self.refreshed,
+                "reauthenticated": self.reauthenticated}
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def _checkout(self) -> BigipSession:
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            session = None
+
+        if session is not None and session.expires_at - self.refresh_margin <= time.monotonic():
+            self._discard(session)
+            self.refreshed += 1
+            session = None
+
+        return session or self._connect()
+
+    def _connect(self) -> BigipSession:
+        try:
+            mgmt = self.factory()
+        except Exception as error:
+            raise BigipUnavailableException(f"Failed to connect BIG-IP: {error}") from error
+
+        with self._lock:
+            self._open += 1
+            self.created += 1
+
+        return BigipSession(mgmt, time.monotonic() + self.token_ttl)
+
+    def _discard(self, session: BigipSession):
+        with self._lock:
+            self._open -= 1
+        try:
+            session.mgmt.icrs.session.close()
+        except Exception:
+            pass
@@ -0,0 +1,155 @@
+"""
+BIG-IP partition 별 node / pool(member) / virtual server 사본
+조회 API 가 F5 management plane 을 매번 호출하지 않도록 메모리에서 응답한다.
+
+- (partition, kind) 단위로 따로 읽어서, background thread 가 가장 오래된 항목부터 하나씩 다시 읽는다.
+- max_staleness(초) 보다 오래된 항목은 조회 시점에 다시 읽는다.
+- 설정된 partitions 만 보관한다. 다른 partition 은 호출하는 쪽에서 BIG-IP 를 직접 조회해야 한다. (covers)
+- Bigip 을 통한 변경은 upsert/remove 로 바로 반영하고,
+  다시 읽는 도중에 반영된 변경은 읽은 결과에 덮어쓴다.
+"""
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+STRONG = "strong"
+CACHED = "cached"
+
+KINDS = ("nodes", "pools", "virtuals")
+
+
+class SnapshotRecord(SimpleNamespace):
+    """
+    f5 resource 와 같은 방식(record.name, record.address ...)으로 읽을 수 있는 사본 항목
+    """
+    pass
+
+
+class BigipSnapshot:
+    """
+    @param loader: (partition, kind) -> [dict], 항목마다 name 필수
+    """
+
+    def __init__(self, loader: Callable[[str, str], List[dict]], partitions: List[str],
+                 interval: float = 30, max_staleness: float = 120):
+        self.loader = loader
+        self.partitions = list(partitions)
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self._data: Dict[Tuple[str, str], Dict[str, SnapshotRecord]] = {}
+        self._loaded_at: Dict[Tuple[str, str], float] = {}
+        self._writes: Dict[Tuple[str, str], list] = {}
+        self._refreshing: Dict[Tuple[str, str], int] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def covers(self, partition: str) -> bool:
+        return partition in self.partitions
+
+    def get(self, partition: str, kind: str, name: str) -> Optional[SnapshotRecord]:
+        return self._ensure(partition, kind).get(name)
+
+    def list(self, partition: str, kind: str) -> List[SnapshotRecord]:
+        return list(self._ensure(partition, kind).values())
+
+    def upsert(self, partition: str, kind: str, item: dict):
+        """
+        item 의 값으로 저장된 항목을 변경, 없으면 추가
+        """
+        with self._lock:
+            record = self._data.get((partition, kind), {}).get(item["name"])
+        fields = {**vars(record), **item} if record is not None else item
+        self._write((partition, kind), item["name"], SnapshotRecord(**fields))
+
+    def remove(self, partition: str, kind: str, name: str):
+        self._write((partition, kind), name, None)
+
+    def refresh(self, partition: str, kind: str):
+        key = (partition, kind)
+        with self._lock:
+            started = self._seq
+            self._refreshing[key] = self._refreshing.get(key, 0) + 1
+
+        try:
+            items = {item["name"]: SnapshotRecord(**item) for item in self.loader(partition, kind)}
+        except Exception:
+            with self._lock:
+                self._release(key)
+            raise
+
+        with self._lock:
+            self._release(key)
+            writes = self._writes.get(key, []) if key in self._refreshing else self._writes.pop(key, [])
+            for seq, name, record in writes:
+                if seq <= started:
+                    continue
+                if record is None:
+                    items.pop(name, None)
+                else:
+                    items[name] = record
+
+            self._data[key] = items
+            self._loaded_at[key] = time.monotonic()
+
+    def _release(self, key: Tuple[str, str]):
+        self._refreshing[key] -= 1
+        if not self._refreshing[key]:
+            del self._refreshing[key]
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            f"{partition}/{kind}": {
+                "count": len(self._data[(partition, kind)]),
+                "age": round(now - self._loaded_at[(partition, kind)], 1),
+            }
+            for partition, kind in list(self._data.keys())
+        }
+
+    def _ensure(self, partition: str, kind: str) -> Dict[str, SnapshotRecord]:
+        key = (partition, kind)
+        # 요청마다 다른 partition 을 보내서 background 로 읽는 대상이 늘어나지 않도록 한다.
+        if not self.covers(partition):
+            raise ValueError(f"Partition is not in the BIG-IP snapshot: {partition}")
+
+        loaded_at = self._loaded_at.get(key)
+        if loaded_at is None or time.monotonic() - loaded_at > self.max_staleness:
+            self.refresh(partition, kind)
+        self._start()
+
+        return self._data[key]
+
+    def _write(self, key: Tuple[str, str], name: str, record: Optional[SnapshotRecord]):
+        with self._lock:
+            self._seq += 1
+            # 다시 읽는 중인 항목의 변경만 기록해서 읽은 결과에 덮어쓴다.
+            if key in self._refreshing:
+                self._writes.setdefault(key, []).append((self._seq, name, record))
+            items = self._data.get(key)
+            if items is None:
+                return
+            if record is None:
+                items.pop(name, None)
+            else:
+                items[name] = record
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="bigip-snapshot", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # interval 동안 모든 (partition, kind) 를 한번씩 다시 읽도록 나눠서 실행
+        while True:
+            targets = [(partition, kind) for partition in self.partitions for kind in KINDS]
+            time.sleep(self.interval / len(targets))
+            partition, kind = min(targets, key=lambda target: self._loaded_at.get(target, 0))
+            try:
+                self.refresh(partition, kind)
+            except Exception as error:
+                logging.info(f"Failed to refresh BIG-IP snapshot {partition}/{kind}: {error}")
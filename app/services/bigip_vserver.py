@@ -0,0 +1,75 @@
+"""
+Kubernetes hostname 의 VirtualServer(hostname_80, hostname_443) 생성
+F5 를 변경하기 전에 VIP 를 먼저 할당(claim)하고, 도중에 실패하면 만든 VirtualServer 를 지우고 VIP 를 반납한다.
+Bigip 은 인자로 받는다. (f5-sdk 없이 rollback 경로를 확인할 수 있도록)
+"""
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from ..dao import vipaddr as VIPAddrDao
+from ..errors import PoolNotFoundException, raise_error
+from ..models.bigip import VirtualServerModel, VirtualServiceModel
+
+
+def create_kubernetes_vservers(bigip, virtual_service: VirtualServiceModel,
+                               progress: Callable[[str], None], db: Session) -> dict:
+    hostname, vip, partition = virtual_service.hostname, virtual_service.vip, virtual_service.partition
+
+    # 동시에 들어온 요청이 같은 VIP 를 사용하지 않도록 F5 변경 전에 할당
+    available = VIPAddrDao.claim(db=db, hostname=hostname, addr=vip)
+    if not available:
+        if vip and VIPAddrDao.find_by_addr(db=db, addr=vip):
+            raise_error(code=400, msg=f"VIP already in use: {vip}")
+        raise_error(code=500, msg="There are no valid resources")
+
+    vip = available.vip_addr
+    progress(f"VIP {vip} claimed for {hostname}")
+
+    created = []
+    snatpool = bigip.configs.bigip_snatpool
+    try:
+        for port in [80, 443]:
+            vs_name = f"{hostname}_{port}"
+            destination = f"{vip}:{port}"
+            vserver_model = VirtualServerModel(
+                name=vs_name, partition=partition, pool=vs_name, snatpool=snatpool, destination=destination
+            )
+            try:
+                bigip.create_vserver(vserver=vserver_model)
+            except PoolNotFoundException as error:
+                return raise_error(
+                    404, f"pool not found: {vserver_model.pool}@{vserver_model.partition}"
+                )
+            except Exception as error:
+                return raise_error(500, f"create_vserver failed: {error}")
+            progress(f"{vserver_model.name}@{vip} created")
+            created.append(vserver_model.name)
+    except Exception:
+        _rollback(bigip, db, available, hostname, created, partition, progress)
+        raise
+
+    return {"hostname": hostname, "vip": vip, "created": created}
+
+
+def _rollback(bigip, db: Session, claimed, hostname: str, created: list, partition: str,
+              progress: Callable[[str], None]):
+    """
+    일부만 생성된 VirtualServer 를 지우고 VIP 를 반납
+    rollback 중의 실패는 progress 에 남기고, 원래 실패 원인을 가리지 않도록 예외를 발생시키지 않는다.
+    """
+    vip = claimed.vip_addr
+    for name in created:
+        try:
+            bigip.delete_vserver(name=name, partition=partition)
+        except Exception as error:
+            progress(f"Failed to delete {name}: {error}")
+
+    try:
+        released = VIPAddrDao.unclaim(db=db, row=claimed, hostname=hostname)
+    except Exception as error:
+        db.rollback()
+        progress(f"Failed to release VIP {vip}: {error}")
+        return
+
+    progress(f"VIP {vip} released" if released else f"VIP {vip} is no longer assigned to {hostname}")
@@ -0,0 +1,177 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    in-process LRU cache
+    maxsize 를 넘으면 가장 오래 사용되지 않은 항목부터 제거하고,
+    항목마다 만료 시간(ttl, 초)을 가진다.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """
+    여러 uvicorn worker 가 공유하는 redis cache, 값은 json 으로 저장한다.
+    redis 장애 시 cache miss 로 취급해서 원래 요청 흐름을 막지 않는다.
+    """
+
+    def __init__(self, url: str, prefix: str, ttl: float = 600):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key: Tuple) -> str:
+        return ":".join([self.prefix] + [str(item) for item in key])
+
+    def get(self, key: Tuple, default: Any = MISSING) -> Any:
+        try:
+            raw = self.client.get(self._key(key))
+        except Exception as error:
+            logging.info(f"Failed to read cache({key}): {error}")
+            return default
+
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key: Tuple, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            self.client.set(self._key(key), json.dumps(value), px=int(ttl * 1000))
+        except Exception as error:
+            logging.info(f"Failed to write cache({key}): {error}")
+
+    def delete(self, key: Tuple):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as error:
+            logging.info(f"Failed to delete cache({key}): {error}")
+
+
+class LookupCache:
+    """
+    이름 -> id 조회 결과를 (profile, kind, name) 단위로 저장하는 2단계 cache
+    - L1: TTLCache (process 내부)
+    - L2: RedisCache (redis_url 이 주어진 경우만)
+
+    "찾을 수 없음" 도 None 으로 저장(negative caching)하되 더 짧은 ttl 을 사용한다.
+    get 은 (hit 여부, id) 를 반환한다.
+    AWX 는 이름을 대소문자 구분 없이(name__iexact) 찾으므로 name 은 소문자로 바꿔서 저장한다.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float,
+                 redis_url: Optional[str] = None, prefix: str = "lookup"):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.remote = RedisCache(redis_url, prefix=prefix, ttl=ttl) if redis_url else None
+
+    def get(self, profile: str, kind: str, name: str) -> Tuple[bool, Optional[int]]:
+        key = self._key(profile, kind, name)
+        value = self.local.get(key)
+        if value is MISSING and self.remote:
+            value = self._get_remote(key)
+
+        if value is MISSING:
+            return False, None
+
+        return True, value
+
+    def set(self, profile: str, kind: str, name: str, value: Optional[int]):
+        key = self._key(profile, kind, name)
+        ttl = self._ttl(value)
+        self.local.set(key, value, ttl=ttl)
+        if self.remote:
+            self.remote.set(key, value, ttl=ttl)
+
+    def invalidate(self, profile: str, kind: str, name: str):
+        key = self._key(profile, kind, name)
+        self.local.delete(key)
+        if self.remote:
+            self.remote.delete(key)
+
+    # redis 접근은 blocking 이므로 async 코드에서는 threadpool 을 거친다.
+    async def aget(self, profile: str, kind: str, name: str) -> Tuple[bool, Optional[int]]:
+        key = self._key(profile, kind, name)
+        value = self.local.get(key)
+        if value is MISSING and self.remote:
+            value = await run_in_threadpool(self._get_remote, key)
+
+        if value is MISSING:
+            return False, None
+
+        return True, value
+
+    async def aset(self, profile: str, kind: str, name: str, value: Optional[int]):
+        if not self.remote:
+            return self.set(profile, kind, name, value)
+
+        await run_in_threadpool(self.set, profile, kind, name, value)
+
+    async def ainvalidate(self, profile: str, kind: str, name: str):
+        if not self.remote:
+            return self.invalidate(profile, kind, name)
+
+        await run_in_threadpool(self.invalidate, profile, kind, name)
+
+    @staticmethod
+    def _key(profile: str, kind: str, name: str) -> Tuple[str, str, str]:
+        return profile, kind, name.lower()
+
+    def _get_remote(self, key: Tuple) -> Any:
+        value = self.remote.get(key)
+        if value is not MISSING:
+            self.local.set(key, value, ttl=self._ttl(value))
+
+        return value
+
+    def _ttl(self, value: Optional[int]) -> float:
+        return self.ttl if value is not None else self.negative_ttl
@@ -0,0 +1,163 @@
+"""
+같은 요청의 중복 실행 방지 (idempotency)
+정규화한 요청 key 단위로 redis 에 실행 상태를 기록해서 여러 uvicorn worker 가 공유한다.
+- pending: 실행 중, pending_ttl 이 지나면 만료 (실행하던 process 가 죽은 경우)
+- done: 실행 결과, ttl 동안 같은 요청에 그대로 반환
+실패한 실행은 기록을 지워서 다음 요청이 다시 실행할 수 있게 한다.
+redis 장애 시에는 process 내부의 중복 요청만 합친다.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import redis
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+from app.errors import IdempotentRequestInProgressException
+
+PENDING = "pending"
+DONE = "done"
+
+
+def request_key(*parts) -> Tuple:
+    """
+    대소문자, 앞뒤 공백이 다른 요청도 같은 key 가 되도록 정규화
+    """
+    return tuple(str(part).strip().lower() for part in parts)
+
+
+class IdempotencyStore:
+    """
+    (kind, app_name, profile ...) 단위의 실행 상태 저장소
+    redis 의 SET NX 로 선점한 요청만 실행한다.
+    """
+
+    def __init__(self, url: str, prefix: str = "awx:idem", ttl: float = 600,
+                 pending_ttl: float = 300, poll_interval: float = 0.5):
+        """
+        @param ttl: 완료된 결과 보관 시간(초)
+        @param pending_ttl: 실행 중 기록의 만료 시간(초)
+        @param poll_interval: 다른 process 에서 실행 중인 요청의 완료 여부 확인 간격(초)
+        """
+        self.url = url
+        self.prefix = prefix
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.poll_interval = poll_interval
+        self._client: Optional[redis.Redis] = None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    def _key(self, key: Tuple) -> str:
+        return ":".join([self.prefix] + [str(item) for item in key])
+
+    def claim(self, key: Tuple, value: Any = None, pending_ttl: Optional[float] = None) -> Optional[dict]:
+        """
+        key 를 선점하면 None, 이미 기록이 있으면 그 기록 ({"state", "value"}) 을 반환
+        @param value: pending 기록에 함께 저장할 값 (e.g. 미리 정한 celery task id)
+        @param pending_ttl: 실행 중 기록의 만료 시간(초), 기본값은 self.pending_ttl
+        """
+        record = {"state": PENDING, "value": value}
+        pending_ttl = self.pending_ttl if pending_ttl is None else pending_ttl
+        try:
+            if self.client.set(self._key(key), json.dumps(record), nx=True, px=int(pending_ttl * 1000)):
+                return None
+            raw = self.client.get(self._key(key))
+        except Exception as error:
+            logging.info(f"Failed to claim idempotency key({key}): {error}")
+            return None
+
+        # set 과 get 사이에 만료된 경우, 선점한 것으로 취급
+        return None if raw is None else json.loads(raw)
+
+    def complete(self, key: Tuple, value: Any):
+        record = {"state": DONE, "value": value}
+        try:
+            self.client.set(self._key(key), json.dumps(record), px=int(self.ttl * 1000))
+        except Exception as error:
+            logging.info(f"Failed to store idempotency result({key}): {error}")
+
+    def release(self, key: Tuple):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as error:
+            logging.info(f"Failed to release idempotency key({key}): {error}")
+
+    async def run(self, key: Tuple, func: Callable[[], Awaitable[Any]], wait: float) -> Any:
+        """
+        같은 key 의 요청은 func 를 한번만 실행하고 결과를 공유한다.
+        - 같은 process 에서 실행 중이면 그 실행을 기다림
+        - 다른 process 에서 실행 중이면 wait(초) 동안 완료를 기다림
+        - 완료된 결과가 있으면 실행하지 않고 반환
+        먼저 실행하던 요청이 취소되면 기다리던 요청 중 하나가 다시 실행한다.
+        """
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 이 요청이 취소된 경우가 아니라 먼저 실행하던 요청이 취소된 경우만 다시 시도
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run(key, func, wait)
+        except Exception as error:
+            future.set_exception(error)
+            # 기다리는 요청이 없는 경우 "exception was never retrieved" 경고 방지
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            self._inflight.pop(key, None)
+            # 취소(CancelledError) 등 BaseException 으로 끝난 경우
+            if not future.done():
+                future.cancel()
+
+        return result
+
+    async def _run(self, key: Tuple, func: Callable[[], Awaitable[Any]], wait: float) -> Any:
+        deadline = time.monotonic() + wait
+        while True:
+            record = await run_in_threadpool(self.claim, key)
+            if record is None:
+                break
+            if record["state"] == DONE:
+                return record["value"]
+            if time.monotonic() >= deadline:
+                raise IdempotentRequestInProgressException(key)
+
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            result = await func()
+        except BaseException:
+            # 요청이 취소된 경우에도 pending 기록을 바로 지워서 pending_ttl 동안 막히지 않도록 한다.
+            await asyncio.shield(run_in_threadpool(self.release, key))
+            raise
+
+        await run_in_threadpool(self.complete, key, result)
+        return result
+
+
+def _build_store() -> IdempotencyStore:
+    settings = get_settings()
+    return IdempotencyStore(settings.awx_cache_redis_url or settings.celery_broker_url,
+                            ttl=settings.awx_idempotency_ttl,
+                            pending_ttl=settings.awx_idempotency_pending_ttl)
+
+
+idempotency = _build_store()
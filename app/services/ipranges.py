@@ -0,0 +1,115 @@
+"""
+IPv4 주소를 정수 범위 (start, end) 로 다루는 도구
+/16 처럼 큰 대역도 주소 목록을 만들지 않고 범위 단위로 처리한다.
+"""
+import ipaddress
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# 양 끝을 포함하는 정수 주소 범위
+IPRange = Tuple[int, int]
+
+
+def to_number(addr: str) -> int:
+    """
+    MySQL INET_ATON(addr) 과 같은 값
+    """
+    return int(ipaddress.IPv4Address(addr))
+
+
+def network_range(cidr: str) -> IPRange:
+    """
+    network ~ broadcast 주소를 포함하는 대역 전체 범위
+    """
+    network = ipaddress.IPv4Network(cidr)
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def subnet_of(block: int, prefixlen: int) -> str:
+    """
+    vip_num DIV 2^(32 - prefixlen) 값을 subnet CIDR 로 변환
+    """
+    return str(ipaddress.IPv4Network((block << (32 - prefixlen), prefixlen)))
+
+
+def host_range(network: ipaddress.IPv4Network) -> IPRange:
+    """
+    network.hosts() 와 같은 범위, /31 /32 는 모든 주소가 host
+    """
+    first, last = int(network.network_address), int(network.broadcast_address)
+    if network.prefixlen >= 31:
+        return first, last
+
+    return first + 1, last - 1
+
+
+def host_ranges(include_cidr: str, exclude_cidrs: Optional[Iterable[str]] = None) -> List[IPRange]:
+    """
+    include_cidr 의 host 중 exclude_cidrs 에 속하지 않는 주소 범위 목록 (오름차순)
+    """
+    start, end = host_range(ipaddress.IPv4Network(include_cidr))
+    excludes = sorted(
+        (int(network.network_address), int(network.broadcast_address))
+        for network in map(ipaddress.IPv4Network, exclude_cidrs or [])
+    )
+
+    ranges = []
+    for exclude_start, exclude_end in excludes:
+        if exclude_end < start or exclude_start > end:
+            continue
+        if exclude_start > start:
+            ranges.append((start, exclude_start - 1))
+        start = max(start, exclude_end + 1)
+
+    if start <= end:
+        ranges.append((start, end))
+
+    return ranges
+
+
+def count(ranges: Iterable[IPRange]) -> int:
+    return sum(end - start + 1 for start, end in ranges)
+
+
+def trim(ranges: List[IPRange], head: int, tail: int) -> List[IPRange]:
+    """
+    범위 목록의 앞쪽 head 개, 뒤쪽 tail 개 주소를 제외
+    """
+    trimmed = []
+    for start, end in ranges:
+        skip = min(head, end - start + 1)
+        head -= skip
+        if start + skip <= end:
+            trimmed.append((start + skip, end))
+
+    while tail and trimmed:
+        start, end = trimmed.pop()
+        drop = min(tail, end - start + 1)
+        tail -= drop
+        if start <= end - drop:
+            trimmed.append((start, end - drop))
+
+    return trimmed
+
+
+def addresses(ranges: Iterable[IPRange]) -> Iterator[str]:
+    for _, addr in numbered_addresses(ranges):
+        yield addr
+
+
+def numbered_addresses(ranges: Iterable[IPRange]) -> Iterator[Tuple[int, str]]:
+    """
+    (정수 주소, 주소 문자열) 목록
+    """
+    for start, end in ranges:
+        for number in range(start, end + 1):
+            yield number, str(ipaddress.IPv4Address(number))
+
+
+def chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,99 @@
+"""
+같은 인자로 동시에 들어온 조회 요청을 하나의 upstream 호출로 합친다. (singleflight)
+동기 router 는 threadpool 에서 실행되므로 threading 기반으로 구현한다.
+
+    nodes = singleflight("bigip.nodes")
+    node = nodes.do((name, partition), bigip.find_node, name=name, partition=partition)
+
+먼저 들어온 요청(leader)만 함수를 실행하고, 실행 중에 들어온 같은 key 의 요청은
+그 결과(또는 예외)를 그대로 받는다. 결과를 저장하지는 않으므로 실행이 끝난 뒤의 요청은 다시 실행한다.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    key 단위로 실행 중인 호출을 공유하는 group, router 의 조회 API 마다 하나씩 사용
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.executed = 0
+        self.shared = 0
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result
+
+    def stats(self) -> dict:
+        """
+        requests: 전체 요청 수, executed: upstream 호출 수, shared: 다른 요청의 결과를 받은 수
+        ratio: shared / requests (coalescing ratio)
+        """
+        requests = self.executed + self.shared
+        return {
+            "requests": requests,
+            "executed": self.executed,
+            "shared": self.shared,
+            "inflight": len(self._calls),
+            "ratio": round(self.shared / requests, 4) if requests else 0.0,
+        }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def singleflight(name: str) -> SingleFlight:
+    """
+    name 에 해당하는 SingleFlight 를 반환, 최초 호출 시 한번만 생성한다.
+    """
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = SingleFlight(name)
+            _groups[name] = group
+
+    return group
+
+
+def singleflight_stats() -> Dict[str, dict]:
+    with _groups_lock:
+        groups = list(_groups.values())
+
+    return {group.name: group.stats() for group in groups}
@@ -0,0 +1,68 @@
+"""
+VIP 사용 현황 집계 cache
+/vipaddr/stats 조회마다 vipaddr_tb 를 집계하지 않도록 결과를 ttl(초) 동안 보관한다.
+- VIP 를 할당/해제/추가/삭제하는 DAO 함수가 invalidate() 를 호출해서 같은 process 에서는 바로 다시 집계한다.
+  (다른 uvicorn worker 의 변경은 ttl 이내에 반영)
+- 동시에 들어온 같은 집계 요청은 하나의 query 로 합친다. (singleflight)
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Hashable, Optional
+
+from app.config import get_settings
+from app.services.cache import TTLCache, MISSING
+from app.services.singleflight import singleflight
+
+
+class VipStatsCache:
+    def __init__(self, ttl: float = 60):
+        self.cache = TTLCache(maxsize=256, ttl=ttl)
+        self.flight = singleflight("vipaddr.stats")
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        value = self.cache.get(key)
+        if value is not MISSING:
+            return value
+
+        with self._lock:
+            generation = self._generation
+        value = self.flight.do(key, func, *args, **kwargs)
+        # 집계하는 동안 VIP 가 변경되었다면 저장하지 않는다.
+        with self._lock:
+            if generation == self._generation:
+                self.cache.set(key, value)
+
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self.cache.clear()
+
+
+def forecast(free: int, allocated: int, window_days: float, now: Optional[datetime] = None) -> dict:
+    """
+    최근 window_days 일 동안의 할당 속도(allocated / window_days)가 유지된다고 보고 남은 VIP 의 소진 시점을 계산
+    기간 내 할당이 없으면 days_left, exhausted_at 은 None
+    """
+    per_day = allocated / window_days if window_days > 0 else 0
+    days_left = free / per_day if per_day else None
+    now = now or datetime.now(timezone.utc)
+
+    return {
+        "free": free,
+        "allocated": allocated,
+        "window_days": window_days,
+        "per_day": round(per_day, 2),
+        "days_left": round(days_left, 1) if days_left is not None else None,
+        "exhausted_at": (now + timedelta(days=days_left)).date().isoformat() if days_left is not None else None,
+    }
+
+
+def _build_cache() -> VipStatsCache:
+    return VipStatsCache(ttl=get_settings().vipaddr_stats_ttl)
+
+
+vipaddr_stats = _build_cache()
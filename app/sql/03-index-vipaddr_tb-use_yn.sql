@@ -0,0 +1,3 @@
+-- 사용 가능한 VIP 조회 (use_yn = 'N' ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED) 를 index 로 처리
+-- SKIP LOCKED 는 MySQL 8.0 이상에서 사용 가능
+ CREATE INDEX idx_vipaddr_use_yn ON vipaddr_tb (use_yn, id);
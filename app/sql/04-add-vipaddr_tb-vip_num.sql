@@ -0,0 +1,15 @@
+-- vip_addr(VARCHAR) 는 문자열 순서로 정렬되어 대역(CIDR) 조회에 index range scan 을 사용할 수 없으므로
+-- INET_ATON(vip_addr) 값을 vip_num 으로 저장
+ ALTER TABLE vipaddr_tb ADD COLUMN vip_num INT UNSIGNED NULL AFTER vip_addr;
+
+-- 기존 데이터 backfill
+ UPDATE vipaddr_tb SET vip_num = INET_ATON(vip_addr) WHERE vip_num IS NULL;
+
+-- 대역 조회: vip_num BETWEEN start AND end
+-- 사용 가능한 VIP 조회: use_yn = 'N' ORDER BY vip_num LIMIT 1 FOR UPDATE SKIP LOCKED
+-- (use_yn, id) index 는 (use_yn, vip_num) 으로 대체
+ ALTER TABLE vipaddr_tb
+    MODIFY vip_num INT UNSIGNED NOT NULL,
+    ADD UNIQUE INDEX ix_vipaddr_tb_vip_num (vip_num),
+    ADD INDEX idx_vipaddr_use_yn_num (use_yn, vip_num),
+    DROP INDEX idx_vipaddr_use_yn;
@@ -0,0 +1,11 @@
+-- VIP 할당 이력 : vipaddr_alloc_tb
+-- claim 과 실패한 작업이 되돌린 unclaim 을 추가만 한다. (/vipaddr/stats 소진 예측)
+ CREATE TABLE vipaddr_alloc_tb(
+  id INT(11) NOT NULL AUTO_INCREMENT,
+  vip_num INT UNSIGNED NOT NULL,
+  domain_name VARCHAR(100) NULL,
+  action VARCHAR(10) NOT NULL,
+  create_dt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT vipaddr_alloc_PK PRIMARY KEY(id),
+  INDEX idx_vipaddr_alloc_create_dt (create_dt, vip_num, action)
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci;
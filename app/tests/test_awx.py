@@ -7,6 +7,42 @@ TC
 """
 
 
+@pytest.fixture(autouse=True)
+def clear_lookup_cache():
+    from app.services.awx import lookup_cache
+    lookup_cache.local.clear()
+    yield
+    lookup_cache.local.clear()
+
+
+class FakeRedis:
+    """
+    IdempotencyStore 가 사용하는 redis 명령 (set nx/px, get, delete) 만 흉내낸다.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture(autouse=True)
+def fake_idempotency(monkeypatch):
+    from app.services.idempotency import idempotency
+    monkeypatch.setattr(idempotency, "_client", FakeRedis())
+    return idempotency
+
+
 @pytest.fixture
 def awx_urls():
     from app.config import AWX_URLS
@@ -26,3 +62,640 @@ def test_get_awx(awx_urls):
         ret = requests.get(url)
         assert ret.status_code == status.HTTP_200_OK
 
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self.reason = ""
+        self._payload = payload or {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+def test_awx_client_shared_by_profile():
+    from app.services.awx import get_awx_client, close_awx_clients
+
+    client = get_awx_client("dev")
+    assert get_awx_client("DEV") is client
+    assert get_awx_client("prod") is not client
+
+    adapter = client.session.get_adapter(client.url)
+    assert adapter.max_retries.total > 0
+    assert 502 in adapter.max_retries.status_forcelist
+    close_awx_clients()
+
+
+def test_awx_client_reused_across_calls(monkeypatch):
+    from app.services import awx
+    awx.close_awx_clients()
+
+    calls = []
+
+    def fake_request(self, method, url, **kwargs):
+        calls.append((self, method, url, kwargs.get("timeout")))
+        return FakeResponse(payload={"count": 1, "results": [{"id": 42}]})
+
+    monkeypatch.setattr("requests.Session.request", fake_request)
+
+    assert awx.search_project_idx("dev", "develop") == 42
+    awx.update_awx_project("dev", 42)
+
+    assert len(calls) == 2
+    assert calls[0][0] is calls[1][0]
+    assert calls[1][2].endswith("/api/v2/projects/42/update/")
+    assert calls[0][3] == awx.get_awx_client("dev").timeout
+    awx.close_awx_clients()
+
+
+@pytest.fixture
+def mock_async_awx(monkeypatch):
+    """
+    AsyncAwxClient 의 transport 를 httpx.MockTransport 로 교체
+    handler 에 (request) -> httpx.Response 함수를 등록해서 사용한다.
+    """
+    import httpx
+    from app.services import awx_async
+
+    state = {"handler": None, "requests": []}
+
+    def dispatch(request):
+        state["requests"].append(request)
+        return state["handler"](request)
+
+    def fake_client(profile):
+        client = awx_async.AsyncAwxClient(profile)
+        client.backoff_factor = 0
+        client.client = httpx.AsyncClient(base_url=client.url,
+                                          transport=httpx.MockTransport(dispatch))
+        return client
+
+    monkeypatch.setattr(awx_async, "_clients", {})
+    monkeypatch.setattr(awx_async.awx_index, "start", lambda: None)
+    monkeypatch.setattr(awx_async, "get_async_awx_client",
+                        lambda profile: awx_async._clients.setdefault(profile, fake_client(profile)))
+    return state
+
+
+def test_async_update_specific_project(mock_async_awx):
+    import httpx
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    def handler(request):
+        if request.method == "GET":
+            return httpx.Response(200, json={"count": 1, "results": [{"id": 7}]})
+        return httpx.Response(202, json={})
+
+    mock_async_awx["handler"] = handler
+    res = TestClient(app).patch("/awx/project/develop", params={"profile": "dev"})
+
+    assert res.status_code == 202
+    assert mock_async_awx["requests"][-1].url.path == "/api/v2/projects/7/update/"
+
+
+def test_async_client_retries_only_idempotent(mock_async_awx):
+    import asyncio
+    import httpx
+    from app.services import awx_async
+
+    mock_async_awx["handler"] = lambda request: httpx.Response(503)
+    client = awx_async.get_async_awx_client("dev")
+
+    asyncio.run(client.get("/api/v2/ping/"))
+    assert len(mock_async_awx["requests"]) == client.max_retries + 1
+
+    mock_async_awx["requests"].clear()
+    asyncio.run(client.post("/api/v2/ping/"))
+    assert len(mock_async_awx["requests"]) == 1
+
+
+def test_update_project_all_regions_partial_success(mock_async_awx):
+    import httpx
+    from fastapi.testclient import TestClient
+    from app.config import AWX_URLS
+    from app.main import app
+
+    def handler(request):
+        if AWX_URLS["qa"].endswith(request.url.host):
+            return httpx.Response(500)
+        return httpx.Response(202, json={})
+
+    mock_async_awx["handler"] = handler
+    res = TestClient(app).patch("/awx/project")
+
+    assert res.status_code == 207
+    regions = res.json()["regions"]
+    assert regions["qa"]["status"] == 500
+    assert regions["dev"]["status"] == 202
+    assert all("latency" in item for item in regions.values())
+
+    assert res.json()["ret"] == 207
+
+    # 제한 시간 0 은 기본값으로 바꾸지 않고 거부한다.
+    assert TestClient(app).patch("/awx/project", params={"deadline": 0}).status_code == 422
+
+
+def test_update_project_all_regions_success(mock_async_awx):
+    import httpx
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    mock_async_awx["handler"] = lambda request: httpx.Response(202, json={})
+    res = TestClient(app).patch("/awx/project")
+
+    assert res.status_code == 202
+    assert res.json()["ret"] == 202
+    assert {item["status"] for item in res.json()["regions"].values()} == {202}
+
+
+def test_lookup_cache_positive_and_negative(mock_async_awx):
+    import asyncio
+    import httpx
+    from app.errors import AWXProjectNotFoundException
+    from app.services import awx_async
+
+    def handler(request):
+        if request.url.params["name__iexact"].lower() == "develop":
+            return httpx.Response(200, json={"count": 1, "results": [{"id": 7}]})
+        return httpx.Response(200, json={"count": 0, "results": []})
+
+    mock_async_awx["handler"] = handler
+
+    # AWX 는 이름을 대소문자 구분 없이 찾으므로 cache 도 같은 항목을 사용한다.
+    assert asyncio.run(awx_async.search_project_idx("dev", "develop")) == 7
+    assert asyncio.run(awx_async.search_project_idx("dev", "Develop")) == 7
+    assert len(mock_async_awx["requests"]) == 1
+
+    for name in ["unknown", "UNKNOWN"]:
+        with pytest.raises(AWXProjectNotFoundException):
+            asyncio.run(awx_async.search_project_idx("dev", name))
+    assert len(mock_async_awx["requests"]) == 2
+
+
+def test_ttl_cache_evicts_lru_and_expired():
+    from app.services.cache import TTLCache, MISSING
+
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+
+    cache.set("d", 4, ttl=0)
+    assert cache.get("d") is MISSING
+
+
+def test_bulk_create_sourced_inventories(mock_async_awx):
+    import httpx
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    created = iter(range(100, 200))
+
+    def handler(request):
+        if request.url.path == "/api/v2/projects/":
+            return httpx.Response(200, json={"count": 1, "results": [{"id": 7}]})
+        if request.url.path.endswith("/inventory_sources/"):
+            return httpx.Response(201, json={"id": next(created)})
+        return httpx.Response(202, json={"inventory_update": 1})
+
+    mock_async_awx["handler"] = handler
+    items = [{"app_name": f"app-{i}", "profile": "dev", "project": "develop"} for i in range(5)]
+    res = TestClient(app).post("/awx/inventory/sources", json=items)
+
+    assert res.status_code == 200
+    assert res.json()["created"] == 5
+    lookups = [r for r in mock_async_awx["requests"] if r.url.path == "/api/v2/projects/"]
+    assert len(lookups) == 1
+
+
+def test_bulk_create_reports_project_lookup_errors(mock_async_awx):
+    import asyncio
+    import httpx
+    from app.models.awx import InventorySourceItem
+    from app.services import awx_async
+
+    def handler(request):
+        if request.url.params.get("name__iexact") == "missing":
+            return httpx.Response(200, json={"count": 0, "results": []})
+        raise httpx.ConnectTimeout("timed out", request=request)
+
+    mock_async_awx["handler"] = handler
+    items = [InventorySourceItem(app_name="app", profile="dev", project=project)
+             for project in ["missing", "develop"]]
+    results = asyncio.run(awx_async.create_awx_inventory_sources_bulk(items))
+
+    # 없는 프로젝트와 조회 실패를 구분한다.
+    assert [item["error"] for item in results] == ["Not founded project missing", "ConnectTimeout: timed out"]
+
+
+def test_inventory_sync_job_tracking(mock_async_awx, monkeypatch):
+    import httpx
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.awx_async import sync_tracker
+
+    polls = {"count": 0}
+
+    def handler(request):
+        if request.url.path == "/api/v2/inventory_sources/":
+            return httpx.Response(200, json={"count": 1, "results": [{"id": 3}]})
+        if request.method == "PATCH":
+            return httpx.Response(200, json={"id": 3, "name": "app"})
+        if request.url.path.endswith("/update/"):
+            return httpx.Response(202, json={"inventory_update": 55})
+        polls["count"] += 1
+        job_status = "successful" if polls["count"] > 1 else "running"
+        return httpx.Response(200, json={"id": 55, "status": job_status, "failed": False})
+
+    mock_async_awx["handler"] = handler
+    monkeypatch.setattr(sync_tracker, "min_interval", 0.01)
+    with TestClient(app) as client:
+        res = client.patch("/awx/inventory/source", params={"profile": "dev", "app_name": "app"})
+        assert res.json()["job"] == 55
+
+        res = client.get("/awx/jobs/55", params={"profile": "dev", "wait": 5})
+        assert res.json()["status"] == "successful"
+    assert not any(r.method == "GET" and r.url.path.endswith("/update/")
+                   for r in mock_async_awx["requests"])
+
+
+def test_read_job_bounds_wait_and_reports_awx_outage(mock_async_awx):
+    import httpx
+    from fastapi.testclient import TestClient
+    from app.config import get_settings
+    from app.main import app
+
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    mock_async_awx["handler"] = handler
+    client = TestClient(app)
+
+    res = client.get("/awx/jobs/56", params={"profile": "dev", "wait": get_settings().awx_job_max_wait + 1})
+    assert res.status_code == 422
+    res = client.get("/awx/jobs/56", params={"profile": "dev"})
+    assert res.status_code == 502
+    assert res.json()["detail"] == "ConnectError: connection refused"
+
+
+def test_stream_sourced_inventories_follows_next(mock_async_awx):
+    import json
+    import httpx
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    def handler(request):
+        page = int(request.url.params.get("page", 1))
+        next_page = f"/api/v2/inventory_sources/?page={page + 1}&page_size=2" if page < 3 else None
+        results = [{"id": page * 10 + i, "name": f"app-{page}-{i}"} for i in range(2)]
+        return httpx.Response(200, json={"count": 6, "next": next_page, "results": results})
+
+    mock_async_awx["handler"] = handler
+    res = TestClient(app).get("/awx/inventory/sources", params={"profile": "dev", "page_size": 2})
+
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert [line["id"] for line in lines] == [10, 11, 20, 21, 30, 31]
+    assert len(mock_async_awx["requests"]) == 3
+
+
+def test_awx_index_incremental_sync_and_diff(monkeypatch):
+    import asyncio
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.awx_async import awx_index
+    from app.services.awx_index import AwxIndex
+
+    calls = []
+    sources = {
+        "dev": [{"id": 1, "name": "app-a", "modified": "2023-01-01T00:00:00Z"},
+                {"id": 2, "name": "app-b", "modified": "2023-01-02T00:00:00Z"}],
+        "prod": [{"id": 9, "name": "App-A", "modified": "2023-01-01T00:00:00Z"}],
+    }
+
+    async def lister(profile, path, **filters):
+        calls.append(filters)
+        for item in sources.get(profile, []) if "inventory_sources" in path else []:
+            if item["modified"] > filters.get("modified__gt", ""):
+                yield item
+
+    index = AwxIndex(lister, ["dev", "prod"])
+    for profile in ("dev", "prod"):
+        asyncio.run(index.refresh(profile, "inventory_source"))
+    assert index.lookup("dev", "inventory_source", "APP-B") == 2
+
+    sources["dev"].append({"id": 3, "name": "app-c", "modified": "2023-01-03T00:00:00Z"})
+    asyncio.run(index.refresh("dev", "inventory_source"))
+    assert calls[-1]["modified__gt"] == "2023-01-02T00:00:00Z"
+    assert index.lookup("dev", "inventory_source", "app-c") == 3
+    assert index.lookup("dev", "inventory_source", "app-a") == 1
+
+    for attr in ("items", "synced_at"):
+        monkeypatch.setattr(awx_index, attr, getattr(index, attr))
+    res = TestClient(app).get("/awx/inventory/sources/diff", params={"present": "dev", "absent": "prod"})
+    assert res.json()["names"] == ["app-b", "app-c"]
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+        self.alive = True
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError("session deleted")
+        return "complete"
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_chrome_driver_pool_recycles(monkeypatch):
+    from app.worker import awx as worker
+
+    logins = []
+    monkeypatch.setattr(worker, "launch_chrome", FakeDriver)
+    monkeypatch.setattr(worker, "awx_login", lambda driver, url=None: logins.append(url))
+
+    pool = worker.ChromeDriverPool(size=1, max_uses=2, warm_profiles=["dev"])
+    pool.warm()
+    assert len(logins) == 1
+
+    with pool.acquire("dev") as first:
+        pass
+    with pool.acquire("dev") as second:
+        pass
+    assert first is second and first.quit_called
+    assert len(logins) == 1
+
+    with pytest.raises(ValueError):
+        with pool.acquire("qa") as broken:
+            raise ValueError
+    assert broken.quit_called
+
+    with pool.acquire("dev") as driver:
+        driver.alive = False
+    with pool.acquire("dev") as replaced:
+        pass
+    assert replaced is not driver and driver.quit_called
+
+
+def test_step_waiter_records_timings():
+    from selenium.common.exceptions import TimeoutException
+    from app.worker.awx import StepWaiter
+
+    waiter = StepWaiter(FakeDriver())
+    ready = iter([False, False, True])
+    assert waiter.until("form_fill", lambda driver: next(ready)) is True
+    assert 0 < waiter.timings["form_fill"] < 1
+
+    with pytest.raises(TimeoutException):
+        waiter.until("save", lambda driver: False, timeout=0.2)
+    assert waiter.timings["save"] >= 0.2
+
+
+def test_make_sourced_inventory_prefers_api(monkeypatch):
+    from app.errors import AWXProjectNotCreatedException
+    from app.worker import tasks
+
+    crawled, states = [], []
+    monkeypatch.setattr(tasks.rate_limiter, "acquire", lambda profile: True)
+    monkeypatch.setattr(tasks.make_sourced_inventory, "update_state",
+                        lambda state, meta: states.append(meta["path"]))
+    monkeypatch.setattr(tasks, "_crawl_sourced_inventory",
+                        lambda *args, on_step: crawled.append(args) or on_step("LOGIN") or True)
+    monkeypatch.setattr(tasks.awx, "create_awx_inventory_sources",
+                        lambda *args: FakeResponse(202, {"inventory_update": 11}))
+
+    result = tasks.make_sourced_inventory.apply(args=("app", "dev", "develop")).get()
+    assert result == {"path": "api", "job": 11}
+    assert not crawled
+
+    def reject(*args):
+        raise AWXProjectNotCreatedException('{"source_path": ["Invalid source path"]}')
+
+    monkeypatch.setattr(tasks.awx, "create_awx_inventory_sources", reject)
+    result = tasks.make_sourced_inventory.apply(args=("app", "dev", "develop")).get()
+    assert result["path"] == "crawler"
+    assert crawled == [("app", "dev", "develop")]
+    assert states == ["api", "api", "crawler"]
+
+
+def test_rate_limited_task_releases_key_when_retries_run_out(fake_idempotency, monkeypatch):
+    from celery.exceptions import MaxRetriesExceededError, Retry
+    from app.worker import tasks
+
+    task = tasks.make_sourced_inventory
+    monkeypatch.setattr(tasks.rate_limiter, "acquire", lambda profile: False)
+    monkeypatch.setattr(task, "apply_async", lambda args, priority, task_id: None)
+    task_id = tasks.enqueue_sourced_inventory("app", "dev", "develop")
+
+    # 재시도하는 동안에는 같은 요청이 이 task 로 합쳐진다.
+    monkeypatch.setattr(task, "retry", lambda countdown: Retry())
+    with pytest.raises(Retry):
+        task.run("app", "dev", "develop")
+    assert tasks.enqueue_sourced_inventory("app", "dev", "develop") == task_id
+
+    # 재시도를 모두 쓴 task 에는 합쳐지지 않는다.
+    def exhausted(countdown):
+        raise MaxRetriesExceededError()
+
+    monkeypatch.setattr(task, "retry", exhausted)
+    with pytest.raises(MaxRetriesExceededError):
+        task.run("app", "dev", "develop")
+    assert tasks.enqueue_sourced_inventory("app", "dev", "develop") != task_id
+
+
+def test_read_task_reports_progress(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.routers import awx as router
+
+    class FakeResult:
+        state = "FORM_FILL"
+        info = {"step": "FORM_FILL", "path": "crawler"}
+
+        def __init__(self, task_id, app=None):
+            pass
+
+        def successful(self):
+            return False
+
+        def failed(self):
+            return False
+
+    monkeypatch.setattr(router, "AsyncResult", FakeResult)
+    res = TestClient(app).get("/awx/tasks/abc")
+
+    assert res.json()["state"] == "FORM_FILL"
+    assert res.json()["progress"]["path"] == "crawler"
+
+
+def test_awx_tasks_are_routed_per_region(monkeypatch):
+    from app.worker import tasks
+    from app.worker.consumers import build_command
+
+    router = tasks.route_task
+    assert router("app.worker.tasks.make_sourced_inventory", ("app", "prod", "develop"), {}, {}) == \
+        {"queue": "awx.prod"}
+    assert router("app.worker.tasks.make_sourced_inventory", (), {"app_name": "app", "profile": "QA",
+                                                                  "project": "develop"}, {}) == {"queue": "awx.qa"}
+    assert router("app.worker.tasks.add", (1, 2), {}, {}) is None
+    # profile 이 없으면 기본 queue
+    assert router("app.worker.tasks.make_sourced_inventory", ("app",), {}, {}) is None
+    assert router("app.worker.tasks.make_sourced_inventory", None, None, {}) is None
+
+    sent = []
+    monkeypatch.setattr(tasks.make_sourced_inventory, "apply_async",
+                        lambda args, priority, task_id: sent.append((args, priority)))
+    tasks.enqueue_sourced_inventory("app", "dev", "develop", lane="bulk")
+    tasks.enqueue_sourced_inventory("other", "dev", "develop")
+    assert [priority for _, priority in sent] == [9, 0]
+
+    command = build_command("start")
+    assert command[command.index("-Q:awx_prod") + 1] == "awx.prod"
+    assert "--autoscale:awx_prod=4,1" in command
+    assert "-Q:default" not in build_command("stopwait")
+
+
+def test_duplicate_inventory_creation_is_coalesced(mock_async_awx, fake_idempotency, monkeypatch):
+    import asyncio
+    import httpx
+    from app.services.idempotency import request_key
+    from app.worker import tasks
+    from app.routers.awx import create_sourced_inventory
+
+    created = []
+
+    def handler(request):
+        if request.url.path == "/api/v2/projects/":
+            return httpx.Response(200, json={"results": [{"id": 7, "name": "develop"}], "next": None})
+        if request.url.path.endswith("/inventory_sources/"):
+            created.append(request)
+            return httpx.Response(201, json={"id": 31, "name": "app"})
+        return httpx.Response(202, json={"inventory_update": 55})
+
+    mock_async_awx["handler"] = handler
+
+    async def _run():
+        first = await asyncio.gather(create_sourced_inventory("app", "dev", "develop"),
+                                     create_sourced_inventory("APP", "DEV", "develop"))
+        return first + [await create_sourced_inventory("App ", "dev", "develop")]
+
+    results = asyncio.run(_run())
+    assert results == [{"result": 202, "job": 55}] * 3
+    assert len(created) == 1
+
+    # 실패한 요청은 기록을 남기지 않는다.
+    mock_async_awx["handler"] = lambda request: httpx.Response(400, json={"name": ["exists"]})
+    with pytest.raises(Exception):
+        asyncio.run(create_sourced_inventory("fail", "dev", "develop"))
+    assert fake_idempotency.claim(request_key("create", "fail", "dev")) is None
+
+    sent = []
+    monkeypatch.setattr(tasks.make_sourced_inventory, "apply_async",
+                        lambda args, priority, task_id: sent.append(task_id))
+    task_id = tasks.enqueue_sourced_inventory("app", "dev", "develop")
+    assert tasks.enqueue_sourced_inventory("APP", "dev", "develop") == task_id
+    assert sent == [task_id]
+
+
+def test_cancelled_leader_releases_idempotency_key(fake_idempotency):
+    import asyncio
+    from app.services.idempotency import request_key
+
+    key = request_key("create", "cancel", "dev")
+    runs = []
+
+    async def slow():
+        runs.append(1)
+        await asyncio.sleep(10 if len(runs) == 1 else 0)
+        return len(runs)
+
+    async def _run():
+        leader = asyncio.ensure_future(fake_idempotency.run(key, slow, wait=1))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(fake_idempotency.run(key, slow, wait=1))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # 기다리던 요청이 다시 실행한다.
+        return await asyncio.wait_for(waiter, 2)
+
+    # 취소된 요청의 pending 기록을 지웠으므로 wait 안에 다시 선점해서 실행
+    assert asyncio.run(_run()) == 2
+    assert fake_idempotency.claim(key) == {"state": "done", "value": 2}
+
+
+def test_driver_pool_warm_up_is_opt_in_and_never_fails_the_worker(monkeypatch):
+    from app.worker import tasks
+
+    warmed = []
+    monkeypatch.setattr(tasks, "chrome_driver_path", lambda: "/usr/bin/chromedriver")
+    monkeypatch.setattr(tasks, "get_driver_pool", lambda: type("Pool", (), {"warm": lambda self: warmed.append(1)})())
+
+    monkeypatch.setattr(tasks.settings, "crawler_warm_on_start", False)
+    tasks.init_driver_pool()
+    assert warmed == []
+
+    def fail():
+        raise RuntimeError("chrome not found")
+
+    monkeypatch.setattr(tasks.settings, "crawler_warm_on_start", True)
+    monkeypatch.setattr(tasks, "chrome_driver_path", fail)
+    tasks.init_driver_pool()
+
+
+def test_sync_tracker_gives_up_after_repeated_poll_failures():
+    import asyncio
+    import httpx
+    from app.services.awx_jobs import InventorySyncTracker
+
+    class Client:
+        polls = 0
+
+        async def get(self, path):
+            Client.polls += 1
+            return httpx.Response(404, json={"detail": "Not found."},
+                                  request=httpx.Request("GET", f"http://awx-dev{path}"))
+
+    async def _run():
+        tracker = InventorySyncTracker(lambda profile: Client(), min_interval=0.01, max_interval=0.01,
+                                       max_failures=3)
+        tracker.track("dev", 55)
+        return await tracker.wait("dev", 55, timeout=2)
+
+    job = asyncio.run(_run())
+    assert job["status"] == "error"
+    assert job["job_explanation"].startswith("Failed to poll AWX job 3 times")
+    assert Client.polls == 3
+
+
+def test_lookup_cache_does_not_store_awx_errors(mock_async_awx):
+    import asyncio
+    import httpx
+    from app.services import awx_async
+
+    state = {"down": True}
+
+    def handler(request):
+        if state["down"]:
+            return httpx.Response(503, json={"detail": "unavailable"})
+        return httpx.Response(200, json={"count": 1, "results": [{"id": 9}]})
+
+    mock_async_awx["handler"] = handler
+
+    # 장애 응답은 "찾을 수 없음" 으로 저장하지 않고 예외를 전달한다.
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(awx_async.search_project_idx("dev", "outage"))
+
+    state["down"] = False
+    assert asyncio.run(awx_async.search_project_idx("dev", "outage")) == 9
@@ -0,0 +1,114 @@
+# python
+import importlib
+import sys
+import types
+
+import pytest
+from sqlalchemy.ext.declarative import declarative_base
+
+from app.models.bigip import MemberModel, PoolModel
+from app.services.bigip_session import BigipSessionPool
+
+
+@pytest.fixture(scope="module")
+def bigip_module():
+    """
+    f5-sdk 와 MySQL 없이 app.services.bigip 을 import
+    (ManagementRoot 는 사용하지 않고, app.database 는 접속하지 않는 module 로 바꾼다.)
+    """
+    f5 = types.ModuleType("f5")
+    f5_bigip = types.ModuleType("f5.bigip")
+    f5_bigip.ManagementRoot = None
+    database = types.ModuleType("app.database")
+    database.Base = declarative_base()
+
+    loaded = set(sys.modules)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, module in (("f5", f5), ("f5.bigip", f5_bigip), ("app.database", database)):
+            monkeypatch.setitem(sys.modules, name, module)
+        yield importlib.import_module("app.services.bigip")
+
+    for name in set(sys.modules) - loaded:
+        if name.startswith("app."):
+            del sys.modules[name]
+
+
+class FakePool:
+    def __init__(self, name, partition, members):
+        self.name, self.partition = name, partition
+        self.members = [types.SimpleNamespace(name=member) for member in members]
+        self.members_s = types.SimpleNamespace(get_collection=lambda: list(self.members))
+
+    def modify(self, members):
+        self.members = [types.SimpleNamespace(**member) for member in members]
+
+
+class FakeBigipDevice:
+    """
+    mgmt.tm.ltm 의 pools, nodes 중 테스트에서 사용하는 부분
+    """
+
+    def __init__(self, nodes, pools):
+        self.pools = {(pool.partition, pool.name): pool for pool in pools}
+        pool = types.SimpleNamespace(
+            exists=lambda name, partition: (partition, name) in self.pools,
+            load=lambda name, partition: self.pools[(partition, name)],
+        )
+        self.tm = types.SimpleNamespace(ltm=types.SimpleNamespace(
+            nodes=types.SimpleNamespace(
+                get_collection=lambda: [types.SimpleNamespace(name=node) for node in nodes]
+            ),
+            pools=types.SimpleNamespace(pool=pool, get_collection=self._pools_with_members),
+        ))
+
+    def _pools_with_members(self, requests_params=None):
+        return [
+            types.SimpleNamespace(name=pool.name, partition=pool.partition,
+                                  membersReference={"items": [{"name": m.name} for m in pool.members]})
+            for pool in self.pools.values()
+        ]
+
+
+@pytest.fixture
+def device(bigip_module):
+    return FakeBigipDevice(
+        nodes=["worker-001.k8s-a.wmp.dev", "worker-002.k8s-a.wmp.dev", "db-001.wmp.dev"],
+        pools=[FakePool("api_80", "Common", ["worker-001.k8s-a.wmp.dev:30633"])],
+    )
+
+
+@pytest.fixture
+def bigip(bigip_module, device):
+    bigip = bigip_module.Bigip()
+    bigip.sessions = BigipSessionPool(lambda: device, size=2)
+    return bigip
+
+
+def test_kubernetes_members_are_created_and_deleted_in_one_patch(bigip, device):
+    pool = PoolModel(name="api_80", partition="Common")
+    targets = bigip.search_nodes(patterns=["a.wmp.dev", "gke"])
+    assert [node.name for node in targets] == ["worker-001.k8s-a.wmp.dev", "worker-002.k8s-a.wmp.dev"]
+
+    with pytest.raises(Exception, match="member already exists"):
+        bigip.create_pool_members(pool=pool, members=[MemberModel(name=f"{node.name}:30633") for node in targets])
+
+    created = bigip.create_pool_members(pool=pool, members=[MemberModel(name="worker-002.k8s-a.wmp.dev:30633")])
+    assert created == ["worker-002.k8s-a.wmp.dev:30633"]
+    assert bigip.snapshot.get("Common", "pools", "api_80").members == \
+        ["worker-001.k8s-a.wmp.dev:30633", "worker-002.k8s-a.wmp.dev:30633"]
+
+    deleted = bigip.delete_pool_members(pool=pool, members=[MemberModel(name="worker-001.k8s-a.wmp.dev:30633"),
+                                                            MemberModel(name="unknown:30633")])
+    assert deleted == ["worker-001.k8s-a.wmp.dev:30633"]
+    assert [member.name for member in device.pools[("Common", "api_80")].members] == \
+        ["worker-002.k8s-a.wmp.dev:30633"]
+
+
+def test_strong_node_lookup_sees_pools_changed_outside_the_service(bigip, device):
+    assert [pool.name for pool in bigip.get_pools_by_node_name("worker-001.k8s-a.wmp.dev")] == ["api_80"]
+
+    # 색인을 만든 뒤 다른 경로(e.g. F5 GUI)로 pool 이 추가됨
+    device.pools[("Common", "web_80")] = FakePool("web_80", "Common", ["/Common/worker-001.k8s-a.wmp.dev:30633"])
+
+    assert [pool.name for pool in bigip.get_pools_by_node_name("worker-001.k8s-a.wmp.dev", consistency="strong")] == \
+        ["api_80", "web_80"]
@@ -0,0 +1,53 @@
+# python
+from app.services.bigip_index import NodePoolIndex, node_of
+
+
+def test_node_of_strips_partition_and_port():
+    assert node_of("/Common/worker-001.k8s-a.wmp.dev:31963") == "worker-001.k8s-a.wmp.dev"
+    assert node_of("worker-001:80") == "worker-001"
+
+
+def test_node_pool_index_loads_once_and_rebuilds_after_invalidate():
+    pools = [("Common", "api_80", ["worker-001:30633", "worker-002:30633"]),
+             ("Common", "api_443", ["worker-001:31963"])]
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return list(pools)
+
+    index = NodePoolIndex(loader, interval=3600)
+    assert index.lookup("worker-001") == [("Common", "api_443"), ("Common", "api_80")]
+    assert index.lookup("worker-002") == [("Common", "api_80")]
+    assert index.lookup("worker-003") == []
+    assert len(loads) == 1
+
+    pools.append(("Common", "web_80", ["worker-003:30633"]))
+    index.invalidate()
+    assert index.lookup("worker-003") == [("Common", "web_80")]
+    assert len(loads) == 2
+    assert index.status()["nodes"] == 3
+
+
+def test_concurrent_lookups_after_invalidate_rebuild_once():
+    import threading
+    import time
+
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return [("Common", "api_80", ["worker-001:30633"])]
+
+    index = NodePoolIndex(loader, interval=3600)
+    index.lookup("worker-001")
+    index.invalidate()
+
+    threads = [threading.Thread(target=index.lookup, args=("worker-001",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 2
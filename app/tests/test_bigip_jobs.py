@@ -0,0 +1,115 @@
+# python
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.bigip_jobs import BigipJobRunner, for_each_port
+
+
+def wait_finished(runner, job_id, timeout=2):
+    deadline = time.monotonic() + timeout
+    while runner.get(job_id)["status"] not in ("successful", "failed"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return runner.get(job_id)
+
+
+def test_jobs_on_same_partition_run_one_at_a_time():
+    runner = BigipJobRunner(workers=4)
+    running, overlapped = [], []
+    lock = threading.Lock()
+
+    def work(progress):
+        with lock:
+            running.append(1)
+            overlapped.append(len(running) > 1)
+        time.sleep(0.05)
+        progress("done")
+        with lock:
+            running.pop()
+        return {"added": ["worker-001:30633"]}
+
+    jobs = [runner.submit("create_kubernetes_pool", "Common", work, hostname="api") for _ in range(3)]
+    results = [wait_finished(runner, job["id"]) for job in jobs]
+
+    assert not any(overlapped)
+    assert [job["status"] for job in results] == ["successful"] * 3
+    assert results[0]["result"] == {"added": ["worker-001:30633"]}
+    assert results[0]["progress"] == ["done"]
+    assert results[0]["params"] == {"hostname": "api"}
+    runner.shutdown()
+
+
+def test_failed_job_records_error():
+    runner = BigipJobRunner(workers=1)
+
+    def reject(progress):
+        raise HTTPException(status_code=404, detail="pool not found: api_80@Common")
+
+    job = wait_finished(runner, runner.submit("create_kubernetes_vserver", "Common", reject)["id"])
+    assert job["status"] == "failed"
+    assert job["error"] == {"status_code": 404, "detail": "pool not found: api_80@Common"}
+
+    job = wait_finished(runner, runner.submit("x", "Common", lambda progress: 1 / 0)["id"])
+    assert job["error"]["detail"].startswith("ZeroDivisionError")
+    assert runner.get("missing") is None
+    runner.shutdown()
+
+
+def test_queued_partition_does_not_block_other_partitions():
+    runner = BigipJobRunner(workers=2)
+    release = threading.Event()
+
+    def blocked(progress):
+        release.wait(2)
+
+    common = [runner.submit("x", "Common", blocked) for _ in range(4)]
+    other = wait_finished(runner, runner.submit("y", "Other", lambda progress: "ok")["id"], timeout=1)
+    assert other["result"] == "ok"
+    # 대기 중인 job 은 끝나기 전까지 조회할 수 있다.
+    assert [runner.get(job["id"])["status"] for job in common[1:]] == ["queued"] * 3
+
+    release.set()
+    assert [wait_finished(runner, job["id"])["status"] for job in common] == ["successful"] * 4
+    assert runner.active == {}
+    runner.shutdown()
+
+
+def test_call_waits_for_result_and_raises_failures():
+    runner = BigipJobRunner(workers=1)
+    assert runner.call("x", "Common", lambda progress: 42) == 42
+
+    def reject(progress):
+        raise HTTPException(status_code=404, detail="pool not found")
+
+    with pytest.raises(HTTPException) as error:
+        runner.call("x", "Common", reject)
+    assert error.value.status_code == 404
+    runner.shutdown()
+
+
+def test_port_pools_are_handled_concurrently():
+    # 두 port 가 동시에 실행되지 않으면 barrier 에서 timeout
+    barrier = threading.Barrier(2, timeout=1)
+
+    def provision(port):
+        barrier.wait()
+        return f"api_{port}"
+
+    assert for_each_port(provision) == ["api_80", "api_443"]
+
+    finished = []
+
+    def reject(port):
+        if port == 80:
+            raise HTTPException(status_code=404, detail=f"can not found pool: api_{port}")
+        time.sleep(0.05)
+        finished.append(port)
+
+    with pytest.raises(HTTPException) as error:
+        for_each_port(reject)
+    assert error.value.detail == "can not found pool: api_80"
+    # 실패를 전달하기 전에 다른 port 의 작업이 끝나기를 기다린다.
+    assert finished == [443]
@@ -0,0 +1,64 @@
+# python
+import types
+
+from app.services.bigip_members import member_settings, replace_members
+
+
+def member(name, **attrs):
+    return types.SimpleNamespace(name=name, **attrs)
+
+
+class FakePool:
+    partition = "Common"
+
+    def __init__(self, *members):
+        self.members = list(members)
+        self.patched = []
+        self.members_s = types.SimpleNamespace(get_collection=lambda: list(self.members))
+
+    def modify(self, members):
+        self.patched.append(members)
+
+
+def test_added_member_keeps_existing_member_settings():
+    pool = FakePool(member("worker-001:30633", ratio=3, priorityGroup=10, connectionLimit=100,
+                           description="primary", monitor="/Common/tcp", session="monitor-enabled",
+                           state="up"))
+
+    assert replace_members(pool, lambda current: current + ["worker-002:30633"]) == \
+        (["worker-001:30633"], ["worker-001:30633", "worker-002:30633"])
+    assert pool.patched == [[
+        {"name": "worker-001:30633", "partition": "Common", "ratio": 3, "priorityGroup": 10,
+         "connectionLimit": 100, "description": "primary", "monitor": "/Common/tcp"},
+        {"name": "worker-002:30633", "partition": "Common"},
+    ]]
+
+
+def test_removed_member_is_left_out_of_the_array():
+    pool = FakePool(member("worker-001:30633", ratio=2), member("worker-002:30633"))
+
+    before, after = replace_members(pool, lambda current: [name for name in current if name != "worker-002:30633"])
+
+    assert (before, after) == (["worker-001:30633", "worker-002:30633"], ["worker-001:30633"])
+    assert pool.patched == [[{"name": "worker-001:30633", "partition": "Common", "ratio": 2}]]
+
+
+def test_unchanged_members_are_not_patched():
+    pool = FakePool(member("worker-001:30633"), member("worker-002:30633"))
+
+    # 순서나 중복만 다른 경우도 변경 없음
+    assert replace_members(pool, lambda current: ["worker-002:30633", "worker-001:30633", "worker-001:30633"]) == \
+        (["worker-001:30633", "worker-002:30633"], ["worker-001:30633", "worker-002:30633"])
+    assert pool.patched == []
+
+
+def test_user_disabled_member_stays_disabled():
+    disabled = member("worker-001:30633", session="user-disabled", state="user-down")
+    pool = FakePool(disabled)
+
+    replace_members(pool, lambda current: current + ["worker-002:30633"])
+
+    assert pool.patched[0][0] == {"name": "worker-001:30633", "partition": "Common",
+                                  "session": "user-disabled", "state": "user-down"}
+    # monitor 가 정한 상태는 다시 쓰지 않는다.
+    assert member_settings(member("worker-003:30633", session="monitor-enabled", state="down")) == {}
@@ -0,0 +1,91 @@
+# python
+import threading
+import time
+
+import pytest
+
+from app.errors import BigipUnavailableException
+from app.services.bigip_session import BigipSessionPool
+
+
+class Unauthorized(Exception):
+    class response:
+        status_code = 401
+
+
+class FakeMgmt:
+    def __init__(self, number):
+        self.number = number
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def factory():
+        created.append(FakeMgmt(len(created)))
+        return created[-1]
+
+    return BigipSessionPool(factory, **kwargs), created
+
+
+def test_sessions_are_created_lazily_and_reused():
+    pool, created = make_pool(size=2)
+    assert created == []
+
+    first = pool.run(lambda mgmt: mgmt)
+    assert pool.run(lambda mgmt: mgmt) is first
+
+    # 동시에 사용 중인 session 은 서로 다르고 size 를 넘지 않는다.
+    using, barrier = [], threading.Barrier(2)
+
+    def hold(mgmt):
+        using.append(mgmt)
+        barrier.wait(timeout=1)
+        time.sleep(0.05)
+
+    threads = [threading.Thread(target=pool.run, args=(hold,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert using[0] is not using[1]
+    assert pool.stats()["open"] == 2
+
+
+def test_expiring_session_is_refreshed():
+    pool, created = make_pool(size=1, token_ttl=10, refresh_margin=10)
+    first = pool.run(lambda mgmt: mgmt)
+    assert pool.run(lambda mgmt: mgmt) is not first
+    assert pool.stats()["refreshed"] == 1
+
+
+def test_unauthorized_is_retried_with_new_session():
+    pool, created = make_pool(size=1)
+    seen = []
+
+    def call(mgmt):
+        seen.append(mgmt)
+        if len(seen) == 1:
+            raise Unauthorized()
+        return "ok"
+
+    assert pool.run(call) == "ok"
+    assert seen[0] is not seen[1]
+    assert pool.stats()["open"] == 1
+
+    with pytest.raises(ValueError):
+        pool.run(lambda mgmt: (_ for _ in ()).throw(ValueError()))
+    assert pool.stats()["open"] == 1
+
+
+def test_health_reports_connect_failure():
+    def factory():
+        raise ConnectionError("refused")
+
+    pool = BigipSessionPool(factory)
+    with pytest.raises(BigipUnavailableException):
+        pool.run(lambda mgmt: mgmt)
+
+    health = pool.health()
+    assert health["ok"] is False and "refused" in health["error"]
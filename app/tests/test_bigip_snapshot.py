@@ -0,0 +1,76 @@
+# python
+import threading
+
+import pytest
+
+from app.services.bigip_snapshot import BigipSnapshot
+
+
+def test_snapshot_serves_reads_from_memory_and_applies_writes():
+    loads = []
+
+    def loader(partition, kind):
+        loads.append((partition, kind))
+        return [{"name": "api_80", "partition": partition, "members": ["worker-001:30633"]}]
+
+    snapshot = BigipSnapshot(loader, partitions=["Common"], interval=3600, max_staleness=3600)
+    assert snapshot.get("Common", "pools", "api_80").members == ["worker-001:30633"]
+    assert snapshot.get("Common", "pools", "web_80") is None
+    assert loads == [("Common", "pools")]
+
+    snapshot.upsert("Common", "pools", {"name": "api_80", "members": []})
+    snapshot.upsert("Common", "pools", {"name": "web_80", "partition": "Common"})
+    assert snapshot.get("Common", "pools", "api_80").partition == "Common"
+    assert snapshot.get("Common", "pools", "api_80").members == []
+    assert snapshot.get("Common", "pools", "web_80") is not None
+
+    snapshot.remove("Common", "pools", "web_80")
+    assert snapshot.get("Common", "pools", "web_80") is None
+    assert snapshot.status()["Common/pools"]["count"] == 1
+    assert len(loads) == 1
+
+
+def test_snapshot_keeps_writes_made_during_refresh():
+    loading, entered, release = threading.Event(), threading.Event(), threading.Event()
+
+    def loader(partition, kind):
+        if loading.is_set():
+            entered.set()
+            release.wait(timeout=1)
+        return [{"name": "old", "address": "10.0.0.1"}]
+
+    snapshot = BigipSnapshot(loader, partitions=["Common"], interval=3600, max_staleness=3600)
+    assert snapshot.get("Common", "nodes", "old").address == "10.0.0.1"
+
+    loading.set()
+    refresh = threading.Thread(target=snapshot.refresh, args=("Common", "nodes"))
+    refresh.start()
+    entered.wait(timeout=1)
+    snapshot.upsert("Common", "nodes", {"name": "new", "address": "10.0.0.2"})
+    snapshot.remove("Common", "nodes", "old")
+    release.set()
+    refresh.join()
+
+    assert snapshot.get("Common", "nodes", "new").address == "10.0.0.2"
+    assert snapshot.get("Common", "nodes", "old") is None
+
+
+def test_snapshot_reloads_when_stale():
+    loads = []
+    snapshot = BigipSnapshot(lambda partition, kind: loads.append(kind) or [],
+                             partitions=["Common"], interval=3600, max_staleness=0)
+    snapshot.list("Common", "virtuals")
+    snapshot.list("Common", "virtuals")
+    assert loads == ["virtuals", "virtuals"]
+
+
+def test_snapshot_only_serves_configured_partitions():
+    loads = []
+    snapshot = BigipSnapshot(lambda partition, kind: loads.append(partition) or [],
+                             partitions=["Common"], interval=3600, max_staleness=3600)
+
+    assert not snapshot.covers("Other")
+    with pytest.raises(ValueError):
+        snapshot.list("Other", "pools")
+    assert snapshot.partitions == ["Common"]
+    assert loads == []
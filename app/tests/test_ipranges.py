@@ -0,0 +1,37 @@
+# python
+import ipaddress
+
+from app.services import ipranges
+
+
+def test_host_ranges_skip_excluded_subnets():
+    ranges = ipranges.host_ranges("192.168.30.0/24",
+                                  ["192.168.30.0/28", "192.168.30.16/32", "192.168.30.192/26"])
+    expected = [int(ipaddress.IPv4Address("192.168.30.17")), int(ipaddress.IPv4Address("192.168.30.191"))]
+    assert ranges == [tuple(expected)]
+
+    # 겹치거나 대역 밖의 exclude 는 무시
+    assert ipranges.host_ranges("10.0.0.0/30", ["10.0.0.0/31", "10.0.0.1/32", "10.1.0.0/16"]) == \
+        [(int(ipaddress.IPv4Address("10.0.0.2")),) * 2]
+    assert ipranges.count(ipranges.host_ranges("10.0.0.0/16")) == 65534
+
+
+def test_trim_and_addresses_match_hosts():
+    network = ipaddress.IPv4Network("10.0.0.0/27")
+    ranges = ipranges.host_ranges(str(network), ["10.0.0.8/30"])
+    hosts = [str(host) for host in network.hosts() if host not in ipaddress.IPv4Network("10.0.0.8/30")]
+
+    assert list(ipranges.addresses(ranges)) == hosts
+    assert list(ipranges.addresses(ipranges.trim(ranges, 8, 2))) == hosts[8:-2]
+    assert [len(chunk) for chunk in ipranges.chunks(ipranges.addresses(ranges), 10)] == [10, 10, 6]
+
+
+def test_numbers_match_inet_aton():
+    assert ipranges.to_number("10.0.1.2") == (10 << 24) + (1 << 8) + 2
+    assert ipranges.network_range("10.0.1.0/24") == (ipranges.to_number("10.0.1.0"), ipranges.to_number("10.0.1.255"))
+    assert list(ipranges.numbered_addresses([(ipranges.to_number("10.0.1.255"),) * 2])) == \
+        [(ipranges.to_number("10.0.1.255"), "10.0.1.255")]
+
+    # vip_num DIV 256 -> /24 subnet
+    assert ipranges.subnet_of(ipranges.to_number("10.0.1.77") // 256, 24) == "10.0.1.0/24"
+    assert ipranges.subnet_of(ipranges.to_number("10.0.1.77") // 16, 28) == "10.0.1.64/28"
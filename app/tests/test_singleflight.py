@@ -0,0 +1,68 @@
+# python
+import threading
+import time
+
+from app.services.singleflight import SingleFlight, singleflight, singleflight_stats
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight("test")
+    calls = []
+    started = threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.2)
+        return {"value": value}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("key", slow, 1)))
+    leader.start()
+    started.wait()
+
+    followers = [threading.Thread(target=lambda: results.append(group.do("key", slow, 2))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert calls == [1]
+    assert results == [{"value": 1}] * 5
+    assert group.stats() == {"requests": 5, "executed": 1, "shared": 4, "inflight": 0, "ratio": 0.8}
+
+    # 끝난 호출의 결과는 저장하지 않는다.
+    assert group.do("key", slow, 3) == {"value": 3}
+
+
+def test_errors_are_shared_and_not_kept():
+    group = SingleFlight("test")
+    started = threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("upstream")
+
+    def call():
+        try:
+            group.do("key", fail)
+        except ValueError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait()
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert group.do("key", lambda: "ok") == "ok"
+
+
+def test_named_groups_are_registered():
+    assert singleflight("test.registry") is singleflight("test.registry")
+    assert "test.registry" in singleflight_stats()
@@ -0,0 +1,173 @@
+# python
+import importlib
+import sys
+import types
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.bigip import VirtualServiceModel
+
+# vipaddr_tb 의 sqlite 버전 (ON UPDATE CURRENT_TIMESTAMP 제외)
+VIPADDR_DDL = """
+CREATE TABLE vipaddr_tb (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  vip_addr VARCHAR(20) NOT NULL UNIQUE,
+  vip_num INTEGER NOT NULL UNIQUE,
+  domain_name VARCHAR(100),
+  use_yn VARCHAR(10) NOT NULL,
+  create_dt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  update_dt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+VIPADDR_ALLOC_DDL = """
+CREATE TABLE vipaddr_alloc_tb (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  vip_num INTEGER NOT NULL,
+  domain_name VARCHAR(100),
+  action VARCHAR(10) NOT NULL,
+  create_dt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+@pytest.fixture(scope="module")
+def modules():
+    """
+    app.database 는 MySQL 에 접속하므로 sqlite 메모리 DB 를 사용하는 모듈로 바꿔서 DAO 를 import
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    database = types.ModuleType("app.database")
+    database.engine = engine
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    database.Base = declarative_base()
+
+    loaded = set(sys.modules)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setitem(sys.modules, "app.database", database)
+        yield types.SimpleNamespace(
+            database=database,
+            dao=importlib.import_module("app.dao.vipaddr"),
+            models=importlib.import_module("app.models.vipaddr"),
+            vserver=importlib.import_module("app.services.bigip_vserver"),
+        )
+
+    for name in set(sys.modules) - loaded:
+        if name.startswith("app."):
+            del sys.modules[name]
+
+
+@pytest.fixture
+def db(modules):
+    with modules.database.engine.begin() as connection:
+        for table, ddl in (("vipaddr_tb", VIPADDR_DDL), ("vipaddr_alloc_tb", VIPADDR_ALLOC_DDL)):
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+            connection.exec_driver_sql(ddl)
+
+    session = modules.database.SessionLocal()
+    for addr in ["10.0.0.10", "10.0.0.9", "10.0.0.11"]:
+        modules.dao.create(db=session, params=modules.models.VIPAddrParams(vip_addr=addr, domain_name=None))
+    yield session
+    session.close()
+
+
+def test_claim_by_addr_assigns_only_once(modules, db):
+    dao = modules.dao
+
+    claimed = dao.claim(db=db, hostname="api.wmp.dev", addr="10.0.0.10")
+    assert (claimed.vip_addr, claimed.domain_name, claimed.use_yn) == ("10.0.0.10", "api.wmp.dev", "Y")
+    assert dao.claim(db=db, hostname="web.wmp.dev", addr="10.0.0.10") is None
+    assert dao.claim(db=db, hostname="web.wmp.dev", addr="10.0.0.99") is None
+    assert dao.find_by_addr(db=db, addr="10.0.0.10").domain_name == "api.wmp.dev"
+
+
+def test_claim_without_addr_takes_lowest_free_address(modules, db):
+    dao = modules.dao
+
+    # 문자열 순서("10.0.0.10" < "10.0.0.9") 가 아닌 주소 순서
+    assert [dao.claim(db=db, hostname=f"app{i}.wmp.dev").vip_addr for i in range(3)] == \
+        ["10.0.0.9", "10.0.0.10", "10.0.0.11"]
+    assert dao.claim(db=db, hostname="app3.wmp.dev") is None
+
+
+def test_unclaim_only_releases_own_assignment(modules, db):
+    dao = modules.dao
+
+    claimed = dao.claim(db=db, hostname="api.wmp.dev")
+    assert dao.unclaim(db=db, row=claimed, hostname="web.wmp.dev") is False
+    assert dao.unclaim(db=db, row=claimed, hostname="api.wmp.dev") is True
+
+    row = dao.find_by_addr(db=db, addr=claimed.vip_addr)
+    db.refresh(row)
+    assert (row.domain_name, row.use_yn) == (None, "N")
+
+
+def test_claims_are_recorded_as_allocation_history(modules, db):
+    from app.schemas.vipaddr import VIPAllocSchema
+
+    dao = modules.dao
+    claimed = dao.claim(db=db, hostname="api.wmp.dev", addr="10.0.0.10")
+    dao.claim(db=db, hostname="web.wmp.dev")
+    dao.unclaim(db=db, row=claimed, hostname="api.wmp.dev")
+    # 할당을 옮기는 변경은 이력에 남기지 않는다.
+    dao.take_and_release(db=db, old=dao.find_by_addr(db=db, addr="10.0.0.9"),
+                         new=dao.find_by_addr(db=db, addr="10.0.0.11"))
+
+    history = [(row.action, row.domain_name, row.vip_num)
+               for row in db.query(VIPAllocSchema).order_by(VIPAllocSchema.id)]
+    assert history == [("claim", "api.wmp.dev", 167772170),
+                       ("claim", "web.wmp.dev", 167772169),
+                       ("unclaim", "api.wmp.dev", 167772170)]
+
+
+class FakeBigip:
+    configs = types.SimpleNamespace(bigip_snatpool="snat")
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.created, self.deleted = [], []
+
+    def create_vserver(self, vserver):
+        if vserver.name == self.fail_on:
+            raise RuntimeError("F5 rejected")
+        self.created.append(f"{vserver.name}@{vserver.partition}")
+        return vserver
+
+    def delete_vserver(self, name, partition):
+        self.deleted.append(f"{name}@{partition}")
+
+
+def test_failed_vserver_creation_rolls_back_and_releases_vip(modules, db):
+    bigip = FakeBigip(fail_on="api_443")
+    service = VirtualServiceModel(hostname="api", vip="10.0.0.11", partition="k8s")
+    progress = []
+
+    with pytest.raises(HTTPException) as error:
+        modules.vserver.create_kubernetes_vservers(bigip, service, progress.append, db=db)
+
+    assert error.value.status_code == 500
+    assert bigip.created == bigip.deleted == ["api_80@k8s"]
+    assert progress[-1] == "VIP 10.0.0.11 released"
+    row = modules.dao.find_by_addr(db=db, addr="10.0.0.11")
+    db.refresh(row)
+    assert row.use_yn == "N"
+
+
+def test_unclaim_failure_does_not_hide_original_error(modules, db, monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError("db connection lost")
+
+    monkeypatch.setattr(modules.dao, "unclaim", fail)
+    progress = []
+
+    with pytest.raises(HTTPException) as error:
+        modules.vserver.create_kubernetes_vservers(
+            FakeBigip(fail_on="api_80"), VirtualServiceModel(hostname="api"), progress.append, db=db
+        )
+
+    assert error.value.detail == "create_vserver failed: F5 rejected"
+    assert progress[-1] == "Failed to release VIP 10.0.0.9: db connection lost"
@@ -0,0 +1,41 @@
+# python
+from datetime import datetime, timezone
+
+from app.services.vipaddr_stats import VipStatsCache, forecast
+
+
+def test_stats_are_cached_until_invalidated():
+    cache = VipStatsCache(ttl=60)
+    calls = []
+
+    def count(cidr):
+        calls.append(cidr)
+        return {"cidr": cidr, "free": 10 - len(calls)}
+
+    assert cache.get(("cidr", "10.0.0.0/24"), count, cidr="10.0.0.0/24")["free"] == 9
+    assert cache.get(("cidr", "10.0.0.0/24"), count, cidr="10.0.0.0/24")["free"] == 9
+    assert len(calls) == 1
+
+    cache.invalidate()
+    assert cache.get(("cidr", "10.0.0.0/24"), count, cidr="10.0.0.0/24")["free"] == 8
+
+
+def test_stats_changed_while_counting_are_not_cached():
+    cache = VipStatsCache(ttl=60)
+
+    def count():
+        cache.invalidate()
+        return 1
+
+    cache.get("total", count)
+    assert cache.get("total", lambda: 2) == 2
+
+
+def test_forecast_uses_recent_allocation_rate():
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    result = forecast(free=90, allocated=30, window_days=30, now=now)
+    assert result["per_day"] == 1
+    assert result["days_left"] == 90
+    assert result["exhausted_at"] == "2026-04-01"
+
+    assert forecast(free=90, allocated=0, window_days=30, now=now)["exhausted_at"] is None
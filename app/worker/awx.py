@@ -1,26 +1,241 @@
 import logging
+import queue
+import threading
 import time
 import traceback
 import requests
 
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional
+
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import Select
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select, WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
 
 from app.config import (AWX_URLS,
                         AWX_INVENTORY_IDX,
                         AWX_HOST_FILTER,
                         CHROME_OPTION,
+                        get_settings,
                         )
 from app.errors import AWXLoginFailException
 
 logging.basicConfig()
 
 
+@lru_cache()
+def chrome_driver_path() -> str:
+    """
+    chromedriver 경로는 worker 기동 시 한번만 확인한다.
+    """
+    return ChromeDriverManager().install()
+
+
+def launch_chrome() -> webdriver.Chrome:
+    chrome_options = webdriver.ChromeOptions()
+
+    for item in CHROME_OPTION:
+        chrome_options.add_argument(item)
+
+    return webdriver.Chrome(service=Service(chrome_driver_path()), options=chrome_options)
+
+
+class StepWaiter:
+    """
+    고정된 time.sleep 대신 조건이 만족될 때까지만 기다린다.
+    단계(step) 별 timeout 은 settings.crawler_step_timeouts 로 조정하고,
+    단계별 소요 시간(초)을 timings 에 기록한다.
+    """
+
+    def __init__(self, driver: webdriver.Chrome):
+        settings = get_settings()
+        self.driver = driver
+        self.default_timeout = settings.crawler_step_timeout
+        self.timeouts = settings.crawler_step_timeouts
+        self.timings: Dict[str, float] = {}
+
+    def until(self, step: str, condition: Callable, timeout: Optional[float] = None):
+        timeout = timeout or self.timeouts.get(step, self.default_timeout)
+        started = time.monotonic()
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(condition)
+        finally:
+            self.timings[step] = round(time.monotonic() - started, 3)
+            logging.debug(f"crawler step {step}: {self.timings[step]}s")
+
+
+def count_of(locator, count: int):
+    """
+    locator 에 해당하는 element 가 count 개 이상 나타날 때까지, element 목록을 반환
+    """
+    def _condition(driver):
+        elements = driver.find_elements(*locator)
+        return elements if len(elements) >= count else False
+
+    return _condition
+
+
+def awx_login(driver: webdriver.Chrome, target_url: Optional[str] = None,
+              waiter: Optional[StepWaiter] = None):
+    """
+    AWX login process
+    target_url 이 주어지면 해당 AWX 로 이동 후 로그인 한다.
+    """
+    waiter = waiter or StepWaiter(driver)
+    if target_url:
+        driver.get(target_url)
+
+    awx_id = 'jenkins'
+    awx_pw = 'dlswmd_1'
+    id_tag = waiter.until("login_page", EC.presence_of_element_located((By.ID, 'pf-login-username-id')))
+    pw_tag = driver.find_element(By.ID, 'pf-login-password-id')
+    login_btn = driver.find_elements(By.CLASS_NAME, 'pf-c-button')
+
+    id_tag.send_keys(awx_id)
+    pw_tag.send_keys(awx_pw)
+    login_btn[0].click()
+
+    # Login page에는 없는 css class를 이용해서 예외 처리
+    try:
+        waiter.until("login", EC.presence_of_element_located((By.CLASS_NAME, "pf-c-page__main")))
+    except TimeoutException:
+        raise AWXLoginFailException
+
+
+class PooledDriver:
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.uses = 0
+        # 로그인 된 AWX profile
+        self.profiles = set()
+
+
+class ChromeDriverPool:
+    """
+    celery worker process 별로 미리 실행/로그인 해둔 headless chrome session pool
+    - size 개 까지만 동시에 사용, 모두 사용 중이면 반납될 때까지 대기
+    - 반납 전 max_uses 번 사용했거나 작업 중 예외가 발생한 session 은 종료 후 새로 생성
+    - 꺼낼 때마다 health check 를 수행해서 응답 없는 session 은 교체
+    """
+
+    def __init__(self, size: int, max_uses: int, warm_profiles: Iterable[str] = ()):
+        self.size = size
+        self.max_uses = max_uses
+        self.warm_profiles = list(warm_profiles)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def warm(self):
+        for _ in range(self.size - self._idle.qsize()):
+            pooled = self._launch()
+            for profile in self.warm_profiles:
+                try:
+                    self._login(pooled, profile)
+                except Exception as error:
+                    logging.warning(f"Failed to warm up AWX login({profile}): {error}")
+            self._idle.put(pooled)
+
+    @contextmanager
+    def acquire(self, profile: str):
+        """
+        profile 의 AWX 에 로그인 된 driver 를 빌려준다.
+        with 블록에서 예외가 발생하면 해당 session 은 폐기된다.
+        """
+        self._slots.acquire()
+        try:
+            pooled = self._checkout()
+            try:
+                self._login(pooled, profile)
+            except Exception:
+                self._discard(pooled)
+                raise
+
+            try:
+                yield pooled.driver
+            except Exception:
+                self._discard(pooled)
+                raise
+
+            pooled.uses += 1
+            if pooled.uses >= self.max_uses:
+                self._discard(pooled)
+            else:
+                self._idle.put(pooled)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def _checkout(self) -> PooledDriver:
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return self._launch()
+
+            if self._healthy(pooled):
+                return pooled
+            self._discard(pooled)
+
+    def _launch(self) -> PooledDriver:
+        return PooledDriver(launch_chrome())
+
+    def _login(self, pooled: PooledDriver, profile: str):
+        if profile in pooled.profiles:
+            return
+
+        awx_login(pooled.driver, AWX_URLS[profile])
+        pooled.profiles.add(profile)
+
+    @staticmethod
+    def _healthy(pooled: PooledDriver) -> bool:
+        try:
+            pooled.driver.execute_script("return document.readyState")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(pooled: PooledDriver):
+        try:
+            pooled.driver.quit()
+        except Exception as error:
+            logging.info(f"Failed to quit chrome driver: {error}")
+
+
+_driver_pool: Optional[ChromeDriverPool] = None
+
+
+def get_driver_pool() -> ChromeDriverPool:
+    global _driver_pool
+    if _driver_pool is None:
+        settings = get_settings()
+        _driver_pool = ChromeDriverPool(size=settings.crawler_pool_size,
+                                        max_uses=settings.crawler_max_uses,
+                                        warm_profiles=settings.crawler_warm_profiles)
+
+    return _driver_pool
+
+
 class AnsibleCrawler:
-    def __init__(self, app_name: str, profile: str, project: str):
+    def __init__(self, app_name: str, profile: str, project: str,
+                 driver: Optional[webdriver.Chrome] = None,
+                 on_step: Optional[Callable[[str], None]] = None):
+        """
+        @param driver: ChromeDriverPool 에서 빌린 로그인 된 driver
+                       없으면 새 chrome 을 띄우고 make_inventory 종료 시 닫는다.
+        @param on_step: 단계(LOGIN, FORM_FILL, SAVE, SYNC)가 시작될 때 호출
+        """
         self.app_name = app_name
         self.profile = profile
         self.project = project
@@ -32,13 +247,10 @@ class AnsibleCrawler:
         self.inventory_index = AWX_INVENTORY_IDX[profile]
         self.host_filter = AWX_HOST_FILTER[profile]
 
-        chrome_options = webdriver.ChromeOptions()
-
-        for item in CHROME_OPTION:
-            chrome_options.add_argument(item)
-
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()),
-                                       options=chrome_options)
+        self.owns_driver = driver is None
+        self.driver = launch_chrome() if self.owns_driver else driver
+        self.waiter = StepWaiter(self.driver)
+        self.on_step = on_step or (lambda step: None)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.116 Safari/537.36'
         }
@@ -54,25 +266,21 @@ class AnsibleCrawler:
         Private function _
         @ AWX login process
         """
-        awx_id = 'jenkins'
-        awx_pw = 'dlswmd_1'
-        id_tag = self.driver.find_elements(By.ID, 'pf-login-username-id')
-        pw_tag = self.driver.find_elements(By.ID, 'pf-login-password-id')
-        login_btn = self.driver.find_elements(By.CLASS_NAME, 'pf-c-button')
-
-        id_tag[0].send_keys(awx_id)
-        pw_tag[0].send_keys(awx_pw)
-        login_btn[0].click()
+        awx_login(self.driver, waiter=self.waiter)
 
-        # Wait loading time
-        time.sleep(1)
-
-        # Login page에는 없는 css class를 이용해서 예외 처리
-        check_tag = self.driver.find_elements(By.CLASS_NAME, "pf-c-page__main")
-        if not check_tag:
-            raise AWXLoginFailException
-
-        self.driver.get(self.target_url + '/#/inventories/inventory/' + str(self.inventory_index) + '/sources/add')
+    def _open_inventory_form(self):
+        """
+        inventory source 추가 페이지로 이동
+        pool 의 session 이 만료되어 로그인 페이지가 보이면 다시 로그인 한다.
+        """
+        add_url = self.target_url + '/#/inventories/inventory/' + str(self.inventory_index) + '/sources/add'
+        self.driver.get(add_url)
+        form_or_login = EC.any_of(EC.presence_of_element_located((By.ID, 'host-filter')),
+                                  EC.presence_of_element_located((By.ID, 'pf-login-username-id')))
+        self.waiter.until("open_form", form_or_login)
+        if self.driver.find_elements(By.ID, 'pf-login-username-id'):
+            self._awx_login()
+            self.driver.get(add_url)
 
     def make_inventory(self):
         """
@@ -82,14 +290,18 @@ class AnsibleCrawler:
         ret_inventory = True
 
         try:
-            print(f'Login process')
-            self._awx_login()
+            self.on_step("LOGIN")
+            if self.owns_driver:
+                print(f'Login process')
+                self._awx_login()
+            self._open_inventory_form()
+
+            self.on_step("FORM_FILL")
 
             # Move to inventory page
             # index 2 is Dev-AWX inventory index
             # self.driver.get(self.target_url + '/#/inventories/inventory/2/sources/add')
-            self.driver.implicitly_wait(1)
-            input_list = self.driver.find_elements(By.CLASS_NAME, 'pf-c-form-control')
+            input_list = self.waiter.until("form_fill", count_of((By.CLASS_NAME, 'pf-c-form-control'), 3))
 
             tag_input_name = input_list[0]
             tag_input_name.send_keys(self.app_name)
@@ -97,10 +309,9 @@ class AnsibleCrawler:
             # Source 'SCM' 선택
             dropdown_src = Select(input_list[2])
             dropdown_src.select_by_value('scm')
-            self.driver.implicitly_wait(1)
 
-            btn_project = self.driver.find_elements(By.ID, 'project')
-            btn_project[0].click()
+            btn_project = self.waiter.until("select_source", EC.element_to_be_clickable((By.ID, 'project')))
+            btn_project.click()
 
             # select project input에 awx_project 이름 넣기, Search to project Name!
             project_wrapper = self.driver.find_elements(By.CLASS_NAME, 'pf-m-filter-group')
@@ -111,9 +322,8 @@ class AnsibleCrawler:
             project_wrapper_btn = project_wrapper[0].find_elements(By.CSS_SELECTOR, "button[aria-label='Search submit button']")
             project_wrapper_btn[0].click()
 
-            time.sleep(1)
-
-            radio_projects = self.driver.find_elements(By.CLASS_NAME, 'pf-c-data-list__item-content')
+            radio_projects = self.waiter.until(
+                "search_project", count_of((By.CLASS_NAME, 'pf-c-data-list__item-content'), 1))
             radio_projects[0].click()
             btn_select = self.driver.find_elements(By.CLASS_NAME, 'pf-m-primary')
             btn_select = btn_select[2]
@@ -124,9 +334,9 @@ class AnsibleCrawler:
             inventory/dev/host를 가지고 오지 못하는 경우도 있음..
             무조건 가장 첫번째 항복을 선택하도록
             '''
-            source_id = self.driver.find_element(By.ID, 'source_path')
             # 파싱 범위 제한, 항상 존재할 수 있는 마지막 항목을 수정
-            option_in_select = source_id.find_element(By.CSS_SELECTOR, "option[value='/ (project root)']")
+            option_in_select = self.waiter.until("source_path", EC.presence_of_element_located(
+                (By.CSS_SELECTOR, "#source_path option[value='/ (project root)']")))
 
             '''
             js로 속성, 텍스트 수정하는 로직
@@ -155,18 +365,26 @@ class AnsibleCrawler:
             input_host_filter.send_keys(self.host_filter)
 
             # save button click
+            self.on_step("SAVE")
             btn_select = self.driver.find_elements(By.CLASS_NAME, 'pf-m-primary')
             btn_select = btn_select[1]
             btn_select.click()
 
-            # Sleep for page loading time
-            time.sleep(1)
-            btns_sync = self.driver.find_elements(By.CLASS_NAME, "pf-m-secondary")
+            # 저장 후 입력 form 을 벗어나 상세 페이지로 이동할 때까지 대기
+            # (form 에도 pf-m-secondary 버튼이 있으므로 이동 전에 찾으면 form 의 버튼을 누르게 된다.)
+            self.waiter.until("save", EC.staleness_of(btn_select))
+            # 상세 페이지의 sync 버튼이 나타날 때까지 대기
+            btns_sync = self.waiter.until("sync", count_of((By.CLASS_NAME, "pf-m-secondary"), 2))
 
             # sync button click
+            self.on_step("SYNC")
             btn_sync = btns_sync[1]
             btn_sync.click()
 
+        except TimeoutException:
+            logging.error(f"crawler step timed out after {self.waiter.timings}", exc_info=True)
+            ret_inventory = False
+
         except AWXLoginFailException:
             logging.error(AWXLoginFailException, exc_info=True)
             ret_inventory = False
@@ -177,7 +395,9 @@ class AnsibleCrawler:
             ret_inventory = False
 
         finally:
-            self.driver.quit()
+            if self.owns_driver:
+                self.driver.quit()
+            self.logger.info(f'crawler step timings: {self.waiter.timings}')
             print('Quit crawling')
             return ret_inventory
 
@@ -185,5 +405,4 @@ class AnsibleCrawler:
 if __name__ == "__main__":
     crawler = AnsibleCrawler("nd-sre-api", "dev", "develop")
     crawler.driver.get(crawler.target_url)
-    time.sleep(1)
     ret = crawler.make_inventory()
\ No newline at end of file
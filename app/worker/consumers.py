@@ -0,0 +1,57 @@
+"""
+app/config.py 의 queue 설정으로 celery worker node 를 기동/종료
+run_celery_awx 에서 사용한다.
+
+    $ python -m app.worker.consumers show     # 실행될 명령만 출력
+    $ python -m app.worker.consumers start
+    $ python -m app.worker.consumers stop
+"""
+import os
+import shlex
+import sys
+from typing import List
+
+from app.config import get_settings
+from app.worker.tasks import awx_queue
+
+PIDFILE = "/var/run/celery/%n.pid"
+LOGFILE = "/var/log/celery/%n%I.log"
+
+
+def build_command(action: str) -> List[str]:
+    """
+    default node 는 celery queue, awx_<profile> node 는 awx.<profile> queue 를 소비한다.
+    """
+    settings = get_settings()
+    profiles = list(settings.celery_awx_autoscale.keys())
+    nodes = ["default"] + [f"awx_{profile}" for profile in profiles]
+
+    command = ["celery", "-A", "app.worker.tasks", "multi", action] + nodes
+    command += ["-l", "INFO", f"--pidfile={PIDFILE}", f"--logfile={LOGFILE}"]
+    if action != "start":
+        return command
+
+    command += ["-Q:default", "celery", "-c:default", str(settings.celery_concurrency)]
+    for profile, (maximum, minimum) in settings.celery_awx_autoscale.items():
+        node = f"awx_{profile}"
+        command += [f"-Q:{node}", awx_queue(profile), f"--autoscale:{node}={maximum},{minimum}"]
+
+    return command
+
+
+def main(argv: List[str]):
+    action = argv[1] if len(argv) > 1 else "show"
+    if action == "show":
+        print(shlex.join(build_command("start")))
+        return
+
+    actions = {"start": "start", "stop": "stopwait", "restart": "restart"}
+    if action not in actions:
+        sys.exit("usage: python -m app.worker.consumers [show|start|stop|restart]")
+
+    command = build_command(actions[action])
+    os.execvp(command[0], command)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,51 @@
+import logging
+import time
+from typing import Dict, Optional
+
+import redis
+
+
+class HostRateLimiter:
+    """
+    AWX host(profile) 별 초당 작업 수 제한
+    여러 worker node 가 같은 redis 의 1초 단위 counter 를 공유한다.
+    redis 장애 시에는 제한하지 않는다.
+    """
+
+    def __init__(self, url: str, limit: int, limits: Optional[Dict[str, int]] = None,
+                 prefix: str = "awx:rate"):
+        """
+        @param limit: profile 별 초당 허용량 기본값
+        @param limits: profile 별 초당 허용량
+        """
+        self.url = url
+        self.limit = limit
+        self.limits = limits or {}
+        self.prefix = prefix
+        self._client: Optional[redis.Redis] = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    def acquire(self, profile: str) -> bool:
+        """
+        이번 1초 구간에 profile 의 허용량이 남아 있으면 True
+        """
+        limit = self.limits.get(profile, self.limit)
+        if limit <= 0:
+            return True
+
+        key = f"{self.prefix}:{profile}:{int(time.time())}"
+        try:
+            pipe = self.client.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, 2)
+            count, _ = pipe.execute()
+        except redis.RedisError as error:
+            logging.info(f"Failed to check rate limit({profile}): {error}")
+            return True
+
+        return count <= limit
@@ -1,33 +1,169 @@
+import logging
 import time
 
-from celery import Celery, states
+from celery import Celery, states, uuid
+from celery.exceptions import Retry
+from celery.signals import worker_process_init, worker_process_shutdown
 
-from .awx import AnsibleCrawler
-from app.errors import AWXLoginFailException
+from .awx import AnsibleCrawler, chrome_driver_path, get_driver_pool
+from .ratelimit import HostRateLimiter
+from app.config import get_settings
+from app.errors import AWXLoginFailException, AWXProjectNotCreatedException
+from app.services import awx
+from app.services.idempotency import idempotency, request_key
+
+settings = get_settings()
 
 celery = Celery('task',
-                broker='redis://localhost:6379/0',
-                backend='redis://localhost:6379/0'
+                broker=settings.celery_broker_url,
+                backend=settings.celery_result_backend
                 )
 
 
+def awx_queue(profile: str) -> str:
+    return f"awx.{profile.lower()}"
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """
+    AWX 작업은 profile 별 queue 로 보내서 한 region 의 작업이 다른 region 을 막지 않도록 한다.
+    profile 없이 전달된 작업은 기본 queue 로 보낸다.
+    """
+    if name == "app.worker.tasks.make_sourced_inventory":
+        profile = (kwargs or {}).get("profile") or (args[1] if args and len(args) > 1 else None)
+        if profile:
+            return {"queue": awx_queue(profile)}
+
+    return None
+
+
+celery.conf.update(
+    worker_concurrency=settings.celery_concurrency,
+    worker_prefetch_multiplier=settings.celery_prefetch_multiplier,
+    task_track_started=True,
+    task_routes=(route_task,),
+    # priority lane: 같은 queue 안에서 interactive 작업을 bulk 작업보다 먼저 꺼낸다.
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+)
+
+rate_limiter = HostRateLimiter(celery.conf.broker_url,
+                               settings.awx_host_rate_limit,
+                               settings.awx_host_rate_limits)
+
+# host 별 rate limit 에 걸린 make_sourced_inventory 의 재시도 횟수와 간격(초)
+RATE_LIMIT_RETRIES = 60
+RATE_LIMIT_COUNTDOWN = 1
+# 중복 방지 key 의 pending 기록은 rate limit 재시도를 모두 기다린 뒤 실행하는 시간까지 유지한다.
+TASK_PENDING_TTL = settings.awx_idempotency_pending_ttl + RATE_LIMIT_RETRIES * RATE_LIMIT_COUNTDOWN
+
+# make_sourced_inventory 진행 상태, API 경로는 CREATE, crawler 경로는 LOGIN ~ SYNC
+PROGRESS_STATES = ("CREATE", "LOGIN", "FORM_FILL", "SAVE", "SYNC")
+
+
+@worker_process_init.connect
+def init_driver_pool(**kwargs):
+    """
+    crawler_warm_on_start 인 경우만 worker process 기동 시 chromedriver 경로 확인 및 chrome session 미리 실행
+    실패해도 worker 는 기동하고, session 은 crawler 를 처음 사용할 때 다시 만든다.
+    """
+    if not settings.crawler_warm_on_start:
+        return
+
+    try:
+        chrome_driver_path()
+        get_driver_pool().warm()
+    except Exception as error:
+        logging.warning(f"Failed to warm up crawler driver pool: {error}", exc_info=True)
+
+
+@worker_process_shutdown.connect
+def shutdown_driver_pool(**kwargs):
+    get_driver_pool().shutdown()
+
+
 @celery.task
 def add(x, y):
     time.sleep(10)
     return x + y
 
 
-@celery.task
-def make_sourced_inventory(app_name, profile, project):
-    crawler = AnsibleCrawler(app_name, profile, project)
-    crawler.driver.get(crawler.target_url)
+def _crawl_sourced_inventory(app_name, profile, project, on_step=None):
+    with get_driver_pool().acquire(profile) as driver:
+        crawler = AnsibleCrawler(app_name, profile, project, driver=driver, on_step=on_step)
+        response = crawler.make_inventory()
 
-    # Web refresh time
-    time.sleep(1)
+        # 실패한 session 은 pool 에서 폐기되도록 with 블록 안에서 예외 발생
+        if not response:
+            raise AWXLoginFailException
 
-    response = crawler.make_inventory()
+    return response
 
-    if not response:
-        raise AWXLoginFailException
 
-    return response
+@celery.task(bind=True, max_retries=RATE_LIMIT_RETRIES)
+def make_sourced_inventory(self, app_name, profile, project):
+    """
+    AWX REST API 로 sourced inventory 를 생성하고,
+    AWX 18.x 에서 source_path 를 거부하는 경우에만 selenium crawler 로 생성한다.
+    어떤 경로로 생성했는지 결과의 path (api|crawler) 에 기록
+    """
+    # POST /awx/inventory/source/tasks 에서 선점한 중복 방지 key
+    # 성공하면 결과 보관 기간 동안 같은 요청에 이 task id 를 반환하고, 실패하면 지운다.
+    # rate limit 재시도 중에는 유지하고, 재시도 횟수를 넘기면(MaxRetriesExceededError) 지운다.
+    key = request_key("task", app_name, profile)
+    try:
+        if not rate_limiter.acquire(profile):
+            raise self.retry(countdown=RATE_LIMIT_COUNTDOWN)
+
+        result = _make_sourced_inventory(self, app_name, profile, project)
+    except Retry:
+        raise
+    except Exception:
+        idempotency.release(key)
+        raise
+
+    idempotency.complete(key, self.request.id)
+    return result
+
+
+def _make_sourced_inventory(task, app_name, profile, project):
+    def _progress(step, path):
+        task.update_state(state=step, meta={"step": step, "path": path})
+
+    try:
+        _progress("CREATE", "api")
+        r = awx.create_awx_inventory_sources(app_name, profile, project)
+        return {"path": "api", "job": r.json().get("inventory_update")}
+    except AWXProjectNotCreatedException as error:
+        if "source_path" not in str(error):
+            raise
+
+        logging.info(f"AWX rejected source_path, fallback to crawler: {app_name}@{profile}")
+
+    _crawl_sourced_inventory(app_name, profile, project, on_step=lambda step: _progress(step, "crawler"))
+    return {"path": "crawler", "job": None}
+
+
+def enqueue_sourced_inventory(app_name, profile, project, lane: str = "interactive") -> str:
+    """
+    make_sourced_inventory 를 profile queue 에 등록하고 task id 를 반환
+    같은 (app_name, profile) 의 작업이 대기/실행 중이거나 최근에 성공했다면 새로 등록하지 않고 그 task id 를 반환
+    @param lane: interactive (사용자 요청) | bulk (backfill)
+    """
+    task_id = uuid()
+    key = request_key("task", app_name, profile)
+    record = idempotency.claim(key, task_id, pending_ttl=TASK_PENDING_TTL)
+    if record is not None:
+        return record["value"]
+
+    priority = settings.celery_priority_bulk if lane == "bulk" else settings.celery_priority_interactive
+    try:
+        make_sourced_inventory.apply_async(args=(app_name, profile, project), priority=priority, task_id=task_id)
+    except Exception:
+        idempotency.release(key)
+        raise
+
+    return task_id